@@ -0,0 +1,351 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# asyncSheetAccess.py -- asyncio access to my Google Sheets through the Sheets v4 REST endpoints,
+#                        plus a local aiohttp server in front of the fake Sheets backend
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.7+"
+__created__ = "2025-07-23"
+__updated__ = "2025-08-06"
+
+import asyncio
+from decimal import Decimal
+from sys import path
+from urllib.parse import quote
+import aiohttp
+from aiohttp import web
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import get_current_time, lg
+from mhsLogging import get_simple_logger
+from sheetAccess import get_credentials, FILL_CELL_VAL, BUDGET_QTRLY_ID_FILE
+from sheetTransport import FakeSheetsBackend, FakeHttpError, ErrorResponse
+from sheetQuota import RateLimiter, QUOTAS, READ, WRITE
+from sheetRegistry import SpreadsheetRegistry, REGISTRY
+from sheetCache import RangeCache, RANGE_CACHE_SIZE, RANGE_CACHE_TTL
+from sheetRanges import parse_a1, col_to_index
+from sheetBatch import coalesce_value_ranges, chunk_value_ranges, chunk_waves, merge_batch_responses, MAX_CHUNK_BYTES, MAX_CHUNK_RANGES
+
+SHEETS_API_URL:str = "https://sheets.googleapis.com/v4/spreadsheets"
+# requests in flight at the same time for ONE spreadsheet
+MAX_INFLIGHT_PER_SPREADSHEET:int = 64
+# open connections for ALL the spreadsheets
+MAX_CONNECTIONS:int = 256
+
+
+class AsyncHttpError(Exception):
+    """A failed REST call; has the same status attributes as googleapiclient.errors.HttpError."""
+    def __init__(self, status:int, message:str = "", headers:dict = None):
+        self.resp = ErrorResponse(status, headers)
+        self.status_code = status
+        self.reason = message or self.resp.reason
+        super().__init__(F"<AsyncHttpError {status}: {self.reason}>")
+
+
+class AsyncSheetAccess:
+    """
+    Awaitable version of MhsSheetAccess for code running in an asyncio event loop:
+    one aiohttp session for all the requests, with a limit on the requests in flight for each spreadsheet.
+    Use as:
+        async with AsyncSheetAccess() as asa:
+            asa.fill_cell(...)
+            await asa.send_sheets_data()
+    """
+    def __init__(self, p_logger:lg.Logger=None, p_spreadsheet_id:str=None, p_base_url:str=SHEETS_API_URL,
+                 p_token_source=None, p_max_inflight:int=MAX_INFLIGHT_PER_SPREADSHEET, p_max_connections:int=MAX_CONNECTIONS,
+                 p_cache_size:int=RANGE_CACHE_SIZE, p_cache_ttl:float=RANGE_CACHE_TTL, p_registry:SpreadsheetRegistry=None,
+                 p_quota:RateLimiter=None):
+        """
+        :param         p_logger: to use for the session
+        :param p_spreadsheet_id: to read & write; default is the Budget id from the file in the secrets folder
+        :param       p_base_url: of the 'spreadsheets' REST collection, e.g. the url of a FakeSheetsServer
+        :param   p_token_source: function returning an OAuth access token; default is the token of my saved credentials
+        :param   p_max_inflight: maximum number of requests in flight for each spreadsheet
+        :param p_max_connections: maximum number of open connections
+        :param     p_cache_size: maximum number of ranges kept by read_sheets_data()
+        :param      p_cache_ttl: seconds that a range read by read_sheets_data() is re-used; 0 to always read
+        :param       p_registry: to find the Budget spreadsheet id; default is the registry shared by the process
+        :param          p_quota: rate limits & retries of the API calls; default is the limiter shared by the process
+        """
+        self._lgr = p_logger if p_logger else get_simple_logger(self.__class__.__name__)
+        self._spreadsheet_id = p_spreadsheet_id
+        self._base_url = p_base_url.rstrip('/')
+        self._token_source = p_token_source if p_token_source else lambda: get_credentials(self._lgr).token
+        self._max_inflight = p_max_inflight
+        self._max_connections = p_max_connections
+        self._data = list()
+        self._cache = RangeCache(p_cache_size, p_cache_ttl)
+        self._registry = p_registry if p_registry else REGISTRY
+        self._quota = p_quota if p_quota else QUOTAS
+        self._semaphores = dict()
+        # spreadsheet id -> number of sends started or finished, and of sends in progress:
+        # a read that overlaps a send must NOT be cached
+        self._writes = dict()
+        self._sending = dict()
+        self._http = None
+        self._lgr.info(F"Launch {self.__class__.__name__} instance at {get_current_time()}\n")
+
+    def get_data(self) -> list:
+        return self._data
+
+    async def begin_session(self):
+        self._lgr.info(F"begin session at {get_current_time()}")
+        if self._http is None:
+            self._http = aiohttp.ClientSession(connector = aiohttp.TCPConnector(limit = self._max_connections),
+                                               raise_for_status = False)
+
+    async def end_session(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        self._lgr.debug(F"end session at {get_current_time()}")
+
+    async def __aenter__(self) -> "AsyncSheetAccess":
+        await self.begin_session()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.end_session()
+
+    def __get_budget_id(self) -> str:
+        """Get the budget id string from the registry, or the file in the secrets folder, unless an id was given to the constructor."""
+        if not self._spreadsheet_id:
+            self._spreadsheet_id = self._registry.resolve_id_file(BUDGET_QTRLY_ID_FILE)
+        return self._spreadsheet_id
+
+    def _semaphore(self, spreadsheet_id:str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(spreadsheet_id)
+        if sem is None:
+            sem = self._semaphores[spreadsheet_id] = asyncio.Semaphore(self._max_inflight)
+        return sem
+
+    async def _request(self, method:str, spreadsheet_id:str, p_path:str = "", params = None, body:dict = None) -> dict:
+        """
+        Send one REST call for the spreadsheet within the quota, waiting for a free slot if too many are in flight,
+        and retry it if it is throttled or fails on the server side.
+        """
+        kind = READ if method == "GET" else WRITE
+        return await self._quota.call_async(kind, lambda: self._call(method, spreadsheet_id, p_path, params, body))
+
+    async def _call(self, method:str, spreadsheet_id:str, p_path:str, params, body:dict) -> dict:
+        # the credentials may have to be read or refreshed, which blocks
+        token = await asyncio.get_running_loop().run_in_executor(None, self._token_source)
+        url = F"{self._base_url}/{quote(spreadsheet_id, safe = '')}{p_path}"
+        async with self._semaphore(spreadsheet_id):
+            async with self._http.request(method, url, params = params, json = body,
+                                          headers = {"Authorization": F"Bearer {token}"}) as resp:
+                if resp.status >= 400:
+                    try:
+                        message = (await resp.json()).get("error", {}).get("message", "")
+                    except (aiohttp.ContentTypeError, ValueError):
+                        message = await resp.text()
+                    raise AsyncHttpError(resp.status, message, dict(resp.headers))
+                return await resp.json()
+
+    def fill_cell(self, sheet:str, col:str, row:int, val:FILL_CELL_VAL):
+        """
+        CREATE the information to update a Google Sheets cell and add to the data list: no i/o, so NOT awaitable
+        :param sheet: particular sheet in my Google spreadsheet to update
+        :param   col: column to update
+        :param   row: to update
+        :param   val: str OR Decimal: value to fill with
+        """
+        value = val.to_eng_string() if isinstance(val, Decimal) else val
+        self._data.append({"range": sheet + '!' + col + str(row), "values": [[value]]})
+        if self._cache.watching():
+            try:
+                spreadsheet_id = self.__get_budget_id()
+            except OSError:
+                spreadsheet_id = None
+            if spreadsheet_id:
+                self._cache.invalidate_cell(spreadsheet_id, sheet, row - 1, col_to_index(col))
+
+    async def send_sheets_data(self, p_max_bytes:int=MAX_CHUNK_BYTES, p_max_ranges:int=MAX_CHUNK_RANGES,
+                               p_coalesce:bool=True) -> dict:
+        """
+        SEND the data list to my Google sheets document, in chunks sent concurrently if the data is large
+        :param  p_max_bytes: maximum size of the data in one request
+        :param p_max_ranges: maximum number of ranges in one request
+        :param   p_coalesce: merge adjacent cells in the same sheet into rectangular ranges before sending
+        :return: server response, combined from all the chunks, with any failed chunks listed under "errors"
+        """
+        self._lgr.debug( get_current_time() )
+        if self._http is None:
+            msg = "No Session started!"
+            self._lgr.exception(msg)
+            return {"PROBLEM": msg}
+
+        spreadsheet_id = self.__get_budget_id()
+        data = coalesce_value_ranges(self._data) if p_coalesce else self._data
+        chunks = chunk_value_ranges(data, p_max_bytes, p_max_ranges)
+        self._writes[spreadsheet_id] = self._writes.get(spreadsheet_id, 0) + 1
+        self._sending[spreadsheet_id] = self._sending.get(spreadsheet_id, 0) + 1
+        results = dict()
+        try:
+            # chunks that write the same cells are sent in order, so the last value filled is kept
+            for wave in chunk_waves(chunks):
+                sent = await asyncio.gather(*[self._request("POST", spreadsheet_id, "/values:batchUpdate",
+                                                            body = {"valueInputOption": "USER_ENTERED", "data": chunks[i]})
+                                              for i in wave], return_exceptions = True)
+                results.update(zip(wave, sent))
+        finally:
+            # a read that started during the send may have been answered before the write was applied
+            self._sending[spreadsheet_id] -= 1
+            self._writes[spreadsheet_id] += 1
+        responses = [(i, res) for i, res in sorted(results.items()) if not isinstance(res, BaseException)]
+        errors = [(i, res) for i, res in sorted(results.items()) if isinstance(res, BaseException)]
+        for index, ssde in errors:
+            self._lgr.error(F"chunk #{index} of {len(chunks)} FAILED: {ssde}")
+        if errors and not responses:
+            raise errors[0][1]
+
+        if self._cache:
+            for entry in data:
+                self._cache.invalidate(spreadsheet_id, parse_a1(entry["range"]))
+        response = merge_batch_responses(spreadsheet_id, chunks, responses, errors)
+        self._lgr.info(F"{response.get('totalUpdatedCells')} cells updated in {len(chunks)} request(s).")
+        return response
+
+    async def read_sheets_data(self, range_name:str) -> list:
+        """
+        READ data from my Google sheets document, or from the cache if the range was read recently
+        :return: server response
+        """
+        self._lgr.debug( get_current_time() )
+        if self._http is None:
+            msg = "No Session started!"
+            self._lgr.exception(msg)
+            return [msg]
+
+        spreadsheet_id = self.__get_budget_id()
+        rows = self._cache.get(spreadsheet_id, range_name)
+        if rows is not None:
+            self._lgr.info(F"{len(rows)} rows retrieved from the cache.")
+            return rows
+
+        writes = self._writes.get(spreadsheet_id, 0)
+        sending = self._sending.get(spreadsheet_id, 0)
+        try:
+            response = await self._request("GET", spreadsheet_id, "/values/" + quote(range_name, safe = ''))
+            rows = response.get("values", [])
+            self._lgr.info(F"{len(rows)} rows retrieved.")
+        except Exception as rsde:
+            self._lgr.error(rsde)
+            raise rsde
+
+        if not sending and self._writes.get(spreadsheet_id, 0) == writes:
+            self._cache.put(spreadsheet_id, range_name, rows)
+        return rows
+
+    def cache_stats(self) -> dict:
+        """Hit, miss, eviction & invalidation counts of the range cache used by read_sheets_data()."""
+        return self._cache.stats()
+# END class AsyncSheetAccess
+
+
+class FakeSheetsServer:
+    """
+    Serve a FakeSheetsBackend at the Sheets v4 REST endpoints used by AsyncSheetAccess, on a local port.
+    The latency of the backend is awaited, NOT slept, so the server handles many requests at the same time.
+    """
+    def __init__(self, backend:FakeSheetsBackend = None, **backend_args):
+        self.backend = backend if backend else FakeSheetsBackend(**backend_args)
+        self.base_url = None
+        self._runner = None
+        # requests being handled, and the most handled at the same time, per spreadsheet
+        self.in_flight = dict()
+        self.max_in_flight = dict()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v4/spreadsheets/{sid}/values:batchUpdate", self._values_batch_update)
+        app.router.add_get("/v4/spreadsheets/{sid}/values:batchGet", self._values_batch_get)
+        app.router.add_get("/v4/spreadsheets/{sid}/values/{range}", self._values_get)
+        app.router.add_put("/v4/spreadsheets/{sid}/values/{range}", self._values_update)
+        app.router.add_post(r"/v4/spreadsheets/{sid:[^/:]+}:batchUpdate", self._batch_update)
+        app.router.add_get(r"/v4/spreadsheets/{sid:[^/:]+}", self._get)
+        return app
+
+    async def start(self, host:str = "127.0.0.1", port:int = 0) -> str:
+        """Start serving; return the base url to give to AsyncSheetAccess; port 0 picks a free port."""
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = F"http://{host}:{port}/v4/spreadsheets"
+        return self.base_url
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeSheetsServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def _call(self, method:str, spreadsheet_id:str, body:dict, handler, *args) -> web.Response:
+        self.in_flight[spreadsheet_id] = self.in_flight.get(spreadsheet_id, 0) + 1
+        self.max_in_flight[spreadsheet_id] = max(self.max_in_flight.get(spreadsheet_id, 0), self.in_flight[spreadsheet_id])
+        try:
+            delay, error = self.backend.admit(method, body)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return web.json_response(self.backend.apply(error, spreadsheet_id, handler, *args))
+            except FakeHttpError as fhe:
+                return self._error(fhe.status_code, fhe.reason, fhe.resp.headers)
+            except ValueError as fve:
+                return self._error(400, str(fve))
+        finally:
+            self.in_flight[spreadsheet_id] -= 1
+
+    @staticmethod
+    def _error(status:int, message:str, headers:dict = None) -> web.Response:
+        # the error body of the Google APIs
+        return web.json_response({"error": {"code": status, "message": message}}, status = status, headers = headers)
+
+    async def _values_get(self, request:web.Request) -> web.Response:
+        range_name = request.match_info["range"]
+        major_dim = request.query.get("majorDimension", "ROWS")
+        return await self._call("values.get", request.match_info["sid"], None,
+                                lambda sheets: self.backend.read_range(sheets, range_name, major_dim))
+
+    async def _values_batch_get(self, request:web.Request) -> web.Response:
+        sid = request.match_info["sid"]
+        ranges = request.query.getall("ranges", [])
+        major_dim = request.query.get("majorDimension", "ROWS")
+        return await self._call("values.batchGet", sid, None,
+                                lambda sheets: {"spreadsheetId": sid, "valueRanges":
+                                                [self.backend.read_range(sheets, rng, major_dim) for rng in ranges]})
+
+    async def _values_update(self, request:web.Request) -> web.Response:
+        sid = request.match_info["sid"]
+        range_name = request.match_info["range"]
+        body = await request.json()
+        return await self._call("values.update", sid, body,
+                                lambda sheets: dict(self.backend.write_range(sheets, range_name, body.get("values", []),
+                                                                             body.get("majorDimension", "ROWS")),
+                                                    spreadsheetId = sid))
+
+    async def _values_batch_update(self, request:web.Request) -> web.Response:
+        sid = request.match_info["sid"]
+        body = await request.json()
+        return await self._call("values.batchUpdate", sid, body, self.backend.batch_update_values, sid, body)
+
+    async def _batch_update(self, request:web.Request) -> web.Response:
+        sid = request.match_info["sid"]
+        body = await request.json()
+        return await self._call("spreadsheets.batchUpdate", sid, body, self.backend.batch_update, sid, body)
+
+    async def _get(self, request:web.Request) -> web.Response:
+        sid = request.match_info["sid"]
+        return await self._call("spreadsheets.get", sid, None, self.backend.metadata, sid)
+# END class FakeSheetsServer
@@ -12,19 +12,36 @@ __author_email__   = "epistemik@gmail.com"
 __python_version__ = "3.6+"
 __google_api_python_client_version__ = "2.113.0"
 __created__ = "2019-04-07"
-__updated__ = "2025-07-02"
+__updated__ = "2025-08-06"
 
 import threading
+import time
+from contextlib import contextmanager
 from decimal import Decimal
 from sys import path
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from httplib2 import Http
 from typing import Union
 path.append("/home/marksa/git/Python/utils")
 from mhsUtils import get_current_time, osp, lg, BASE_PYTHON_FOLDER, JSON_LABEL
 from mhsLogging import get_simple_logger
+from sheetTransport import SheetsTransport
+from sheetServices import get_collection
+from sheetCredentials import CredentialManager
+from sheetLocks import LOCKS
+from sheetRegistry import SpreadsheetRegistry, RangeError, REGISTRY, REGISTRY_RECHECK_AGE
+from sheetShadow import SheetShadow
+from sheetBuffer import CellBuffer
+from sheetRequests import SheetRequestBatch
+from sheetStats import SheetStats, PHASE_CREDENTIALS, PHASE_BUILD, PHASE_SESSION, PHASE_BUDGET_ID, PHASE_BODY, \
+    PHASE_EXECUTE, PHASE_LOCK_WAIT, PHASE_LOCK_HOLD, REQUEST_CELLS, REQUEST_BYTES
+from sheetQuota import RateLimiter, QUOTAS, READ, WRITE
+from sheetWriteBehind import WriteBehindQueue, WRITE_BEHIND_CELLS, WRITE_BEHIND_MS, WRITE_BEHIND_MAX_QUEUED
+from sheetCache import RangeCache, RANGE_CACHE_SIZE, RANGE_CACHE_TTL
+from sheetRanges import parse_a1, col_to_index
+from sheetBatch import coalesce_value_ranges, chunk_value_ranges, chunk_ranges, send_chunks, chunk_waves, merge_batch_responses, \
+    written_bounds, entry_size, MAX_CHUNK_BYTES, MAX_CHUNK_RANGES, MAX_SEND_WORKERS, MAX_BATCH_GET_RANGES
 
 # see https://github.com/googleapis/google-api-python-client/issues/299
 # use: e.g. build("drive", "v3", http=http, cache_discovery=False)
@@ -55,63 +72,167 @@ BAL_2_SHEET:str      = "Balance 2"
 FILL_CELL_VAL = Union[str, Decimal]
 
 def get_credentials(lgr:lg.Logger=None) -> Credentials:
-    """Get the proper credentials needed to write to the Google spreadsheet."""
-    creds = None
-    if osp.exists(GGL_SHEETS_TOKEN):
-        if lgr: lgr.info(F"osp.exists({GGL_SHEETS_TOKEN})")
-        creds = Credentials.from_authorized_user_file(GGL_SHEETS_TOKEN, SHEETS_RW_SCOPE)
-
-    # if there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if lgr: lgr.info("creds is None or not creds.valid")
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            if lgr: lgr.debug("creds.refresh(Request())")
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SHEETS_RW_SCOPE)
-            creds = flow.run_local_server()
-            if lgr: lgr.debug("creds = flow.run_local_server()")
-        # save the credentials for the next run
-        with open(GGL_SHEETS_TOKEN, "w") as gst:
-            gst.write( creds.to_json() )
+    """
+    Get the proper credentials needed to write to the Google spreadsheet:
+    loaded from the token file once per process, then kept in memory and refreshed in the background.
+    """
+    return CredentialManager.shared(GGL_SHEETS_TOKEN, SHEETS_RW_SCOPE, CREDENTIALS_FILE, lgr).get()
+
+
+class GoogleSheetsTransport(SheetsTransport):
+    """Use a Sheets v4 service on the Google servers with my saved credentials; the service is built once per process."""
+    def __init__(self, p_logger:lg.Logger=None, p_stats:SheetStats=None):
+        self._lgr = p_logger
+        self._stats = p_stats if p_stats else SheetStats(False)
+        self._creds = None
+        # httplib2 is NOT thread-safe: each thread sending requests needs its own Http
+        self._local = threading.local()
 
-    return creds
+    def spreadsheets(self):
+        with self._stats.timer(PHASE_CREDENTIALS):
+            self._creds = get_credentials(self._lgr)
+        self._local = threading.local()
+        with self._stats.timer(PHASE_BUILD):
+            return get_collection("sheets", "v4", self._creds, "spreadsheets")
+
+    def execute(self, request):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(self._creds, http = Http())
+        return request.execute(http = http)
+# END class GoogleSheetsTransport
 
 
 class MhsSheetAccess:
     """Start a Google session, read/write to my Budget sheet, end the session."""
-    # prevent different instances/threads from writing at the same time
-    _lock = threading.Lock()
+    # per spreadsheet: prevent different instances/threads from writing at the same time, or reading during a write
+    _locks = LOCKS
 
-    def __init__(self, p_logger:lg.Logger=None):
+    def __init__(self, p_logger:lg.Logger=None, p_transport:SheetsTransport=None, p_spreadsheet_id:str=None,
+                 p_cache_size:int=RANGE_CACHE_SIZE, p_cache_ttl:float=RANGE_CACHE_TTL, p_registry:SpreadsheetRegistry=None,
+                 p_quota:RateLimiter=None, p_stats:SheetStats=None, p_cache:RangeCache=None):
+        """
+        :param         p_logger: to use for the session
+        :param      p_transport: supply the Sheets service, e.g. a FakeSheetsTransport; default is the Google servers
+        :param p_spreadsheet_id: to read & write; default is the Budget id from the file in the secrets folder
+        :param     p_cache_size: maximum number of ranges kept by read_sheets_data()
+        :param      p_cache_ttl: seconds that a range read by read_sheets_data() is re-used; 0 to always read
+        :param       p_registry: spreadsheet ids & sheet metadata; default is the registry shared by the process
+        :param          p_quota: rate limits & retries of the API calls; default is the limiter shared by the process
+        :param          p_stats: to record the time of each phase and the size of each request; default is to record nothing
+        :param          p_cache: range cache, e.g. shared by the instances of the workers of a server, so that they also
+                                 share the reads in progress; default is a new cache of p_cache_size & p_cache_ttl
+        """
         self._lgr = p_logger if p_logger else get_simple_logger(self.__class__.__name__)
-        self._data = list()
-        self._lgr.info(F"Launch {self.__class__.__name__} instance with lock '{str(self._lock)}' at {get_current_time()}\n")
+        self._stats = p_stats if p_stats else SheetStats(False)
+        self._transport = p_transport if p_transport else GoogleSheetsTransport(self._lgr, self._stats)
+        self._spreadsheet_id = p_spreadsheet_id
+        # filled cells, NOT yet in the form of the request body
+        self._data = CellBuffer()
+        self._shadow = None
+        self._write_behind = None
+        self._write_listeners = list()
+        self._cache = p_cache if p_cache is not None else RangeCache(p_cache_size, p_cache_ttl)
+        self._registry = p_registry if p_registry else REGISTRY
+        self._quota = p_quota if p_quota else QUOTAS
+        self._sheets = None
+        self.vals = None
+        self._lgr.info(F"Launch {self.__class__.__name__} instance with per-spreadsheet locks at {get_current_time()}\n")
 
     def get_data(self) -> list:
-        return self._data
+        """Value ranges of the filled cells, built on each call; in write-behind mode, those not yet sent."""
+        return self._write_behind.pending() if self._write_behind is not None else self._data.value_ranges()
+
+    def clear_data(self):
+        """Forget the filled cells, e.g. once they have been sent."""
+        self._data.clear()
 
-    # noinspection PyAttributeOutsideInit
     def begin_session(self):
-        # PREVENT starting a separate Session on the Google sheet
-        self._lock.acquire()
-        self._lgr.info(F"acquired lock at {get_current_time()}")
-        creds = get_credentials(self._lgr)
-        service = build("sheets", "v4", credentials = creds, cache_discovery = False)
-        self.vals = service.spreadsheets().values()
+        # the spreadsheet is locked only while data is actually being sent or read
+        self._lgr.info(F"begin session at {get_current_time()}")
+        with self._stats.timer(PHASE_SESSION):
+            self._sheets = self._transport.spreadsheets()
+        self.vals = self._sheets.values()
+        try:
+            # sheet names & grid sizes, to check ranges before sending them
+            self._registry.ensure(self._sheets, self.__get_budget_id(), self.__execute)
+        except Exception as bse:
+            self._lgr.warning(F"ranges will NOT be checked: could not get the sheet metadata: {bse}")
 
     def end_session(self):
-        # RELEASE the Session on the Google sheet
-        self._lock.release()
-        self._lgr.debug(F"released lock at {get_current_time()}")
+        if self._write_behind is not None:
+            self.close()
+        self._sheets = None
+        self.vals = None
+        self._lgr.debug(F"end session at {get_current_time()}")
+
+    @contextmanager
+    def session(self):
+        """
+        begin_session() ... end_session(), even if an exception is raised, e.g.
+            with mhs.session():
+                mhs.send_sheets_data()
+        """
+        self.begin_session()
+        try:
+            yield self
+        finally:
+            self.end_session()
+
+    def __execute(self, request, p_kind:str=READ, p_idempotent:bool=True):
+        """
+        Execute a request within the quota, retrying it if it is throttled or fails on the server side
+        :param p_idempotent: False for a request that must NOT be applied twice, e.g. a cutPaste: only retry it if throttled
+        """
+        def attempt():
+            with self._stats.timer(PHASE_EXECUTE):
+                return self._transport.execute(request)
+        return self._quota.call(p_kind, attempt, p_idempotent)
+
+    @contextmanager
+    def __locked(self, spreadsheet_id:str, p_write:bool=False):
+        """Hold the read or write lock of the spreadsheet, recording the time spent waiting for it and holding it."""
+        rwlock = self._locks.get(spreadsheet_id)
+        if not self._stats.enabled:
+            with rwlock.writing() if p_write else rwlock.reading():
+                yield
+            return
+        acquire, release = (rwlock.acquire_write, rwlock.release_write) if p_write else (rwlock.acquire_read, rwlock.release_read)
+        start = time.perf_counter()
+        acquire()
+        acquired = time.perf_counter()
+        self._stats.record(PHASE_LOCK_WAIT, acquired - start)
+        try:
+            yield
+        finally:
+            release()
+            self._stats.record(PHASE_LOCK_HOLD, time.perf_counter() - acquired)
 
     def __get_budget_id(self) -> str:
-        """Get the budget id string from the file in the secrets folder."""
-        with open(BUDGET_QTRLY_ID_FILE) as bfp:
-            fid = bfp.readline().strip()
+        """Get the budget id string from the registry, or the file in the secrets folder, unless an id was given to the constructor."""
+        if self._spreadsheet_id:
+            return self._spreadsheet_id
+        with self._stats.timer(PHASE_BUDGET_ID):
+            fid = self._registry.resolve_id_file(BUDGET_QTRLY_ID_FILE)
         self._lgr.debug(F"{get_current_time()} / Budget Id = {fid}\n")
+        self._spreadsheet_id = fid
         return fid
 
+    def __check_bounds(self, spreadsheet_id:str, bounds:list):
+        """Raise a RangeError for a range outside the known sheets; with new metadata if the registry may be out of date."""
+        try:
+            for bnds in bounds:
+                self._registry.check_bounds(spreadsheet_id, bnds)
+        except RangeError as cbe:
+            info = self._registry.info(spreadsheet_id)
+            if not self._sheets or not info or time.time() - info.stamp < REGISTRY_RECHECK_AGE:
+                self._lgr.error(cbe)
+                raise cbe
+            # the sheet may have been added or resized since the metadata was read
+            self._registry.refresh(self._sheets, spreadsheet_id, self.__execute)
+            for bnds in bounds:
+                self._registry.check_bounds(spreadsheet_id, bnds)
+
     def fill_cell(self, sheet:str, col:str, row:int, val:FILL_CELL_VAL):
         """
         CREATE the information to update a Google Sheets cell and add to the data list
@@ -120,39 +241,258 @@ class MhsSheetAccess:
         :param   row: to update
         :param   val: str OR Decimal: value to fill with
         """
-        self._lgr.debug( get_current_time() )
+        # called for every cell: no time stamp or message unless they will be logged
+        if self._lgr.isEnabledFor(lg.DEBUG):
+            self._lgr.debug(F"{get_current_time()} / fill_cell({sheet}!{col}{row}) = {val}")
         value = val.to_eng_string() if isinstance(val, Decimal) else val
-        cell = {"range": sheet + '!' + col + str(row), "values": [[value]]}
-        self._lgr.debug(F"fill_cell() = {cell}\n")
-        self._data.append(cell)
+        col_index = col_to_index(col)
+        if self._write_behind is not None:
+            self._write_behind.put(CellBuffer.cell_entry(sheet, row - 1, col_index, value))
+        else:
+            self._data.add(sheet, row - 1, col_index, value)
+        if self._cache.watching():
+            # the cache may be shared, and filled before this instance needed its spreadsheet id
+            try:
+                spreadsheet_id = self.__get_budget_id()
+            except OSError:
+                spreadsheet_id = None
+            if spreadsheet_id:
+                self._cache.invalidate_cell(spreadsheet_id, sheet, row - 1, col_index)
 
-    def send_sheets_data(self) -> dict:
+    def enable_delta(self, p_snapshot:str=None):
         """
-        SEND the data list to my Google sheets document
-        :return: server response
+        START delta mode: cells whose value is already known to be in the sheet are NOT sent again
+        :param p_snapshot: json file from save_delta() with the known cell values
+        """
+        self._shadow = SheetShadow()
+        if p_snapshot and osp.exists(p_snapshot):
+            self._shadow.load(p_snapshot)
+            self._lgr.info(F"loaded {len(self._shadow)} known cell values from '{p_snapshot}'")
+
+    def seed_delta(self, p_ranges:list) -> int:
+        """
+        READ the current values of the ranges that will be filled, with a single request, for delta mode
+        :param p_ranges: A1 ranges, e.g. ["Assets 1!B2:K40", "Balance 1!B2:M30"]
+        :return: number of known cell values
+        """
+        if self._shadow is None:
+            self.enable_delta()
+        if not self.vals:
+            msg = "No Session started!"
+            self._lgr.exception(msg)
+            return len(self._shadow)
+
+        # formulas as entered and numbers unformatted: the same form as fill_cell() values
+        spreadsheet_id = self.__get_budget_id()
+        with self.__locked(spreadsheet_id):
+            response = self.__execute(self.vals.batchGet(spreadsheetId = spreadsheet_id, ranges = p_ranges,
+                                                         valueRenderOption = "FORMULA"))
+        self._shadow.seed(response.get("valueRanges", []))
+        self._lgr.info(F"{len(self._shadow)} known cell values after reading {len(p_ranges)} range(s).")
+        return len(self._shadow)
+
+    def save_delta(self, p_snapshot:str):
+        """SAVE the known cell values of delta mode to a json file."""
+        if self._shadow is not None:
+            self._shadow.save(p_snapshot)
+
+    def add_write_listener(self, p_listener):
+        """
+        CALL p_listener(spreadsheet id, GridBounds) for the cells of each value range accepted by the server,
+        e.g. to keep a local copy of the sheets up to date; may be called from the write-behind thread
+        """
+        self._write_listeners.append(p_listener)
+
+    def enable_write_behind(self, p_max_cells:int=WRITE_BEHIND_CELLS, p_max_delay_ms:int=WRITE_BEHIND_MS,
+                            p_max_queued:int=WRITE_BEHIND_MAX_QUEUED):
+        """
+        START write-behind mode: fill_cell() only queues the cell and a background thread sends the queue
+        whenever it reaches p_max_cells cells or its oldest cell has waited p_max_delay_ms milliseconds.
+        Starts a session if needed; call flush() to wait for the queued cells and close() or end_session() to stop.
+        :param    p_max_cells: send when this many cells are queued
+        :param p_max_delay_ms: send when the oldest queued cell has waited this long
+        :param   p_max_queued: fill_cell() waits while this many cells are queued, e.g. if the network is down
+        """
+        if self._write_behind is not None:
+            return
+        if not self.vals:
+            self.begin_session()
+        queue = WriteBehindQueue(self.__send_batch, p_max_cells, p_max_delay_ms, p_max_queued, self._lgr)
+        # cells filled before write-behind mode started go in the first batch
+        for entry in self._data.value_ranges():
+            queue.put(entry)
+        self._data.clear()
+        self._write_behind = queue
+        self._lgr.info(F"write-behind mode: send every {p_max_cells} cells or {p_max_delay_ms} msec.")
+
+    def __send_batch(self, p_batch:list, p_resend:bool=True) -> list:
+        """
+        Send a write-behind batch; return the cells to send again. Cells outside the known sheets are dropped.
+        :param p_resend: send again at once if every cell is fine when checked again, e.g. the sheets were just refreshed
+        """
+        try:
+            _, failed = self.__send(p_batch, MAX_CHUNK_BYTES, MAX_CHUNK_RANGES, MAX_SEND_WORKERS, True)
+        except RangeError:
+            # sending the bad cells again cannot help, but the rest of the batch is fine
+            spreadsheet_id = self.__get_budget_id()
+            good = list()
+            bad = list()
+            for entry in p_batch:
+                try:
+                    self._registry.check_bounds(spreadsheet_id, written_bounds(entry))
+                    good.append(entry)
+                except RangeError:
+                    bad.append(entry)
+            if not bad:
+                # the metadata changed between the two checks: the cells are fine
+                self._lgr.warning(F"sending again write-behind batch of {len(p_batch)} cells after a range check failed.")
+                return self.__send_batch(p_batch, False) if p_resend else p_batch
+            self._lgr.error(F"DROPPED {len(bad)} write-behind cells with a bad range: {[entry['range'] for entry in bad]}")
+            return self.__send_batch(good) if good else []
+        return failed
+
+    def flush(self, p_timeout:float=None) -> bool:
+        """
+        WAIT until the cells queued in write-behind mode have been sent
+        :return: True if every cell was accepted; False after a failure or at the timeout
+        """
+        return self._write_behind.flush(p_timeout) if self._write_behind is not None else True
+
+    def close(self, p_timeout:float=None) -> bool:
+        """
+        STOP write-behind mode after sending the queued cells; any cells that could not be sent go back in the data list
+        :return: True if every cell was accepted
+        """
+        if self._write_behind is None:
+            return True
+        queue, self._write_behind = self._write_behind, None
+        done = queue.close(p_timeout)
+        remaining = queue.pending() + self._data.value_ranges()
+        self._data.clear()
+        for entry in remaining:
+            self._data.add_entry(entry)
+        self._lgr.info(F"write-behind mode stopped: {queue.stats()}")
+        return done
+
+    def send_sheets_data(self, p_max_bytes:int=MAX_CHUNK_BYTES, p_max_ranges:int=MAX_CHUNK_RANGES,
+                         p_workers:int=MAX_SEND_WORKERS, p_coalesce:bool=True) -> dict:
+        """
+        SEND the data list to my Google sheets document, in chunks sent concurrently if the data is large
+        :param  p_max_bytes: maximum size of the data in one request
+        :param p_max_ranges: maximum number of ranges in one request
+        :param    p_workers: maximum number of requests in flight at the same time
+        :param   p_coalesce: merge adjacent cells in the same sheet into rectangular ranges before sending
+        :return: server response, combined from all the chunks, with any failed chunks listed under "errors"
+                 and, in delta mode, the number of "unchangedCells" that were not sent;
+                 in write-behind mode, the counts of the queue after a flush()
         """
         self._lgr.debug( get_current_time() )
         if not self.vals:
             msg = "No Session started!"
             self._lgr.exception(msg)
             return {"PROBLEM": msg}
+        if self._write_behind is not None:
+            flushed = self.flush()
+            return dict(self._write_behind.stats(), flushed = flushed)
 
-        try:
+        response, _ = self.__send(self._data, p_max_bytes, p_max_ranges, p_workers, p_coalesce)
+        return response
+
+    def __send(self, data:Union[list, CellBuffer], p_max_bytes:int, p_max_ranges:int, p_workers:int, p_coalesce:bool) -> (dict, list):
+        """Send the value ranges, or the cells of a buffer; return the combined response and the entries of the chunks that failed."""
+        spreadsheet_id = self.__get_budget_id()
+
+        def send_chunk(chunk:list) -> dict:
             assets_body = {
                 "valueInputOption": "USER_ENTERED",
-                "data": self._data
+                "data": chunk
             }
-            response = self.vals.batchUpdate(spreadsheetId=self.__get_budget_id(), body=assets_body).execute()
-            self._lgr.info(F"{response.get('totalUpdatedCells')} cells updated.")
-        except Exception as ssde:
-            self._lgr.error(ssde)
-            raise ssde
+            if self._stats.enabled:
+                self._stats.record(REQUEST_CELLS, sum(len(row) for entry in chunk for row in entry.get("values", [])))
+                self._stats.record(REQUEST_BYTES, sum(entry_size(entry) for entry in chunk))
+            return self.__execute(self.vals.batchUpdate(spreadsheetId = spreadsheet_id, body = assets_body), WRITE)
 
-        return response
+        with self._stats.timer(PHASE_BODY):
+            coalesced = False
+            if isinstance(data, CellBuffer):
+                # delta mode checks the cells one by one: coalesce them after that
+                coalesced = p_coalesce and self._shadow is None
+                data = data.value_ranges(coalesced)
+            unchanged = 0
+            if self._shadow is not None:
+                data, unchanged = self._shadow.filter_unchanged(data)
+                self._lgr.info(F"delta mode: {unchanged} unchanged cells will NOT be sent.")
+            if p_coalesce and not coalesced:
+                data = coalesce_value_ranges(data)
+            self.__check_bounds(spreadsheet_id, [written_bounds(entry) for entry in data])
+            chunks = chunk_value_ranges(data, p_max_bytes, p_max_ranges)
+        with self.__locked(spreadsheet_id, p_write = True):
+            # a cell filled twice, e.g. without coalescing, must get its last value: overlapping chunks are sent in order
+            responses, errors = send_chunks(chunks, send_chunk, p_workers, chunk_waves(chunks))
+        for index, ssde in errors:
+            self._lgr.error(F"chunk #{index} of {len(chunks)} FAILED: {ssde}")
+        if errors and not responses:
+            raise errors[0][1]
+
+        # a range read while these cells were queued has the old values
+        if self._cache.watching():
+            for entry in data:
+                self._cache.invalidate(spreadsheet_id, parse_a1(entry["range"]))
+
+        response = merge_batch_responses(spreadsheet_id, chunks, responses, errors)
+        if self._shadow is not None:
+            # the sheet now has the values of the chunks that were accepted
+            for index, _ in responses:
+                for entry in chunks[index]:
+                    self._shadow.update_range(entry["range"], entry.get("values", []), entry.get("majorDimension", "ROWS"))
+            response["unchangedCells"] = unchanged
+        for listener in self._write_listeners:
+            for index, _ in responses:
+                for entry in chunks[index]:
+                    listener(spreadsheet_id, written_bounds(entry))
+        self._lgr.info(F"{response.get('totalUpdatedCells')} cells updated in {len(chunks)} request(s).")
+        return response, [entry for index, _ in errors for entry in chunks[index]]
+
+    def request_batch(self, p_spreadsheet_id:str=None) -> SheetRequestBatch:
+        """
+        New queue of value writes & structural operations, e.g. copy_paste() or find_replace(), on A1 ranges
+        :param p_spreadsheet_id: default is the spreadsheet of this instance
+        """
+        return SheetRequestBatch(p_spreadsheet_id if p_spreadsheet_id else self.__get_budget_id(), self._registry,
+                                 p_logger = self._lgr)
+
+    def send_requests(self, p_batch:SheetRequestBatch) -> dict:
+        """
+        SEND the operations of a request batch in as few batchUpdate calls as their order allows;
+        after a failure, the operations NOT yet sent stay in the batch
+        :return: number of calls & the reply to each operation, as from SheetRequestBatch.flush()
+        """
+        if not self.vals:
+            msg = "No Session started!"
+            self._lgr.exception(msg)
+            return {"PROBLEM": msg}
+        spreadsheet_id = p_batch.spreadsheet_id
+        # the gids of the sheet titles
+        self._registry.ensure(self._sheets, spreadsheet_id, self.__execute)
+        written = p_batch.written_bounds()
+        try:
+            with self.__locked(spreadsheet_id, p_write = True):
+                # a cutPaste or findReplace sent again after it was applied would NOT give the same result
+                return p_batch.flush(self._sheets, lambda request: self.__execute(request, WRITE),
+                                     lambda request: self.__execute(request, WRITE, False))
+        finally:
+            # also after a failure: the calls sent before it, or even the failed call, may have changed these cells
+            for bounds in written:
+                self._cache.invalidate(spreadsheet_id, bounds)
+                if self._shadow is not None:
+                    # pasted & replaced values are not known here
+                    self._shadow.forget(bounds)
+                for listener in self._write_listeners:
+                    listener(spreadsheet_id, bounds)
 
     def read_sheets_data(self, range_name:str) -> list:
         """
-        READ data from my Google sheets document
+        READ data from my Google sheets document, or from the cache if the range was read recently
         :return: server response
         """
         self._lgr.debug( get_current_time() )
@@ -161,21 +501,103 @@ class MhsSheetAccess:
             self._lgr.exception(msg)
             return [msg]
 
+        spreadsheet_id = self.__get_budget_id()
+
+        def read() -> list:
+            self.__check_bounds(spreadsheet_id, [parse_a1(range_name)])
+            with self.__locked(spreadsheet_id):
+                response = self.__execute(self.vals.get(spreadsheetId = spreadsheet_id, range = range_name))
+            values = response.get("values", [])
+            self._lgr.info(F"{len(values)} rows retrieved.")
+            return values
+
         try:
-            response = self.vals.get(spreadsheetId = self.__get_budget_id(), range = range_name).execute()
-            rows = response.get("values", [])
-            self._lgr.info(F"{len(rows)} rows retrieved.")
+            # from the cache, or one call shared by the threads that read the same range at the same time
+            return self._cache.load(spreadsheet_id, range_name, read)
         except Exception as rsde:
             self._lgr.error(rsde)
             raise rsde
 
-        return rows
+    def read_many(self, p_ranges:list, p_value_render:str=None, p_major_dim:str=None, p_fields:str=None,
+                  p_max_ranges:int=MAX_BATCH_GET_RANGES) -> dict:
+        """
+        READ many ranges with one values().batchGet request per spreadsheet, split if the list of ranges is very long
+        :param       p_ranges: A1 ranges in my Budget spreadsheet and/or (spreadsheet id, A1 range) pairs
+        :param p_value_render: valueRenderOption, e.g. "UNFORMATTED_VALUE"; default is "FORMATTED_VALUE"
+        :param    p_major_dim: majorDimension, i.e. "ROWS" or "COLUMNS"; default is "ROWS"
+        :param       p_fields: field mask for the response, e.g. "valueRanges(values)"
+        :param   p_max_ranges: maximum number of ranges in one request
+        :return: rows of each range, keyed by the requested range or pair
+        """
+        self._lgr.debug( get_current_time() )
+        if not self.vals:
+            msg = "No Session started!"
+            self._lgr.exception(msg)
+            return {"PROBLEM": msg}
+
+        # only plain reads are shared with the cache of read_sheets_data()
+        use_cache = p_value_render in (None, "FORMATTED_VALUE") and p_major_dim in (None, "ROWS")
+        results = dict()
+        wanted = dict()
+        for item in p_ranges:
+            spreadsheet_id, range_name = item if isinstance(item, tuple) else (self.__get_budget_id(), item)
+            wanted.setdefault(spreadsheet_id, dict()).setdefault(range_name, list()).append(item)
+
+        options = dict()
+        if p_value_render:
+            options["valueRenderOption"] = p_value_render
+        if p_major_dim:
+            options["majorDimension"] = p_major_dim
+        if p_fields:
+            options["fields"] = p_fields
+
+        for spreadsheet_id, items in wanted.items():
+            def fetch(range_names:list) -> dict:
+                self.__check_bounds(spreadsheet_id, [parse_a1(rng) for rng in range_names])
+
+                def get_chunk(chunk:list) -> dict:
+                    return self.__execute(self.vals.batchGet(spreadsheetId = spreadsheet_id, ranges = chunk, **options))
+
+                chunks = chunk_ranges(range_names, p_max_ranges)
+                with self.__locked(spreadsheet_id):
+                    responses, errors = send_chunks(chunks, get_chunk)
+                if errors:
+                    self._lgr.error(F"batchGet of {len(errors)} of {len(chunks)} request(s) FAILED: {errors[0][1]}")
+                    raise errors[0][1]
+                fetched = dict()
+                for index, response in responses:
+                    # value ranges are returned in the same order as the requested ranges
+                    for range_name, vrange in zip(chunks[index], response.get("valueRanges", [])):
+                        fetched[range_name] = vrange.get("values", [])
+                self._lgr.info(F"{len(range_names)} ranges retrieved from '{spreadsheet_id}' in {len(chunks)} request(s).")
+                return fetched
+
+            # through the cache: a write sent during the batchGet keeps its ranges out of the cache, as in read_sheets_data()
+            fetched = self._cache.load_many(spreadsheet_id, list(items), fetch) if use_cache else fetch(list(items))
+            for range_name, rows in fetched.items():
+                for item in items[range_name]:
+                    results[item] = [list(row) for row in rows]
+
+        return results
+
+    def stats(self) -> dict:
+        """
+        Histogram summary of each phase of the sessions, in seconds: credentials, build, session_open, budget_id,
+        build_body, execute, lock_wait & lock_hold; and of the cells & bytes of each request sent.
+        Empty unless a SheetStats was given to the constructor.
+        """
+        return self._stats.stats()
+
+    def cache_stats(self) -> dict:
+        """
+        Hit, miss, eviction & invalidation counts of the range cache used by read_sheets_data(),
+        and the number of reads 'collapsed' into a read of the same range already in progress.
+        """
+        return self._cache.stats()
 
     def test_read(self, range_name:str) -> list:
-        self.begin_session()
-        result = self.read_sheets_data(range_name)
-        self.end_session()
-        return result
+        with self.session():
+            return self.read_sheets_data(range_name)
 # END class MhsSheetAccess
 
 
@@ -0,0 +1,287 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetBatch.py -- coalesce, split, send & merge the value-range batches written by MhsSheetAccess
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-15"
+__updated__ = "2025-08-06"
+
+import json
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from sheetRanges import GridBounds, parse_a1, format_a1
+
+# stay well below the 10MB request limit; Google recommends a maximum of 2MB per request
+MAX_CHUNK_BYTES:int  = 2 * 1024 * 1024
+MAX_CHUNK_RANGES:int = 1000
+MAX_SEND_WORKERS:int = 4
+# values().batchGet is a GET request: the ranges go in the URL, which the servers limit to a few KB
+MAX_BATCH_GET_RANGES:int = 100
+MAX_BATCH_GET_CHARS:int  = 6000
+# a value range with more cells than this is compared with the others range by range instead of cell by cell
+MAX_INDEXED_CELLS:int = 1000
+
+
+def cell_of(entry:dict):
+    """The (sheet, ZERO-based row, ZERO-based col, value) of a single-cell value range, else None."""
+    values = entry.get("values")
+    if not values or len(values) != 1 or len(values[0]) != 1:
+        return None
+    try:
+        bounds = parse_a1(entry["range"])
+    except (KeyError, ValueError):
+        return None
+    if bounds.start_row is None or bounds.start_col is None \
+            or bounds.end_row != bounds.start_row + 1 or bounds.end_col != bounds.start_col + 1:
+        return None
+    return bounds.sheet, bounds.start_row, bounds.start_col, values[0][0]
+
+
+def coalesce_cells(cells) -> list:
+    """
+    Merge single cells into the largest filled rectangles, one value range with a 2-D array of values per rectangle
+    :param cells: (sheet, ZERO-based row, ZERO-based col, value) in the order they were filled;
+                  if a cell is filled more than once, the LAST value is kept, as the server would do
+    :return: value ranges, sheets in the order they were first seen
+    """
+    grids = dict()
+    for sheet, row, col, val in cells:
+        grids.setdefault(sheet, dict())[(row, col)] = val
+
+    data = list()
+    for sheet, grid in grids.items():
+        used = set()
+        for row, col in sorted(grid):
+            if (row, col) in used:
+                continue
+            # grow to the right along the row, then down as long as every cell of the next row is available
+            width = 1
+            while (row, col + width) in grid and (row, col + width) not in used:
+                width += 1
+            height = 1
+            while all((row + height, col + c) in grid and (row + height, col + c) not in used for c in range(width)):
+                height += 1
+            block = list()
+            for r in range(row, row + height):
+                block.append([grid[(r, c)] for c in range(col, col + width)])
+                used.update((r, c) for c in range(col, col + width))
+            data.append({"range": format_a1(GridBounds(sheet, row, row + height, col, col + width)), "values": block})
+    return data
+
+
+def coalesce_value_ranges(data:list) -> list:
+    """
+    Merge the single-cell value ranges in data into rectangular blocks;
+    any other value range is kept in place, and cells are only merged with cells on the same side of it.
+    """
+    coalesced = list()
+    cells = list()
+    for entry in data:
+        cell = cell_of(entry)
+        if cell:
+            cells.append(cell)
+            continue
+        if cells:
+            coalesced.extend(coalesce_cells(cells))
+            cells = list()
+        coalesced.append(entry)
+    if cells:
+        coalesced.extend(coalesce_cells(cells))
+    return coalesced
+
+
+def written_bounds(entry:dict) -> GridBounds:
+    """The cells that a value range will actually write, which may extend past its A1 range."""
+    bounds = parse_a1(entry["range"])
+    values = entry.get("values", [])
+    if entry.get("majorDimension", "ROWS") == "COLUMNS":
+        height, width = max(map(len, values), default = 0), len(values)
+    else:
+        height, width = len(values), max(map(len, values), default = 0)
+    row0 = bounds.start_row or 0
+    col0 = bounds.start_col or 0
+    return GridBounds(bounds.sheet, row0, row0 + max(height, 1), col0, col0 + max(width, 1))
+
+
+def entry_size(entry:dict) -> int:
+    """Bytes used by a value range in the serialized request body, including the separator."""
+    return len(json.dumps(entry, separators = (',', ':'))) + 1
+
+
+def split_entry(entry:dict, max_bytes:int) -> list:
+    """Split a value range that is too big for one chunk into blocks of rows; leave it alone if that is not possible."""
+    values = entry.get("values", [])
+    if len(values) < 2 or entry.get("majorDimension", "ROWS") != "ROWS":
+        return [entry]
+    try:
+        bounds = parse_a1(entry["range"])
+    except ValueError:
+        return [entry]
+    if bounds.start_row is None:
+        return [entry]
+    # average size of a row -> rows per block
+    rows_per_block = max(1, int(len(values) * max_bytes / entry_size(entry)))
+    blocks = list()
+    for first in range(0, len(values), rows_per_block):
+        rows = values[first:first + rows_per_block]
+        width = max((len(row) for row in rows), default = 1)
+        end_col = bounds.end_col if bounds.end_col is not None else (bounds.start_col or 0) + width
+        block_bounds = GridBounds(bounds.sheet, bounds.start_row + first, bounds.start_row + first + len(rows),
+                                  bounds.start_col, end_col)
+        blocks.append(dict(entry, range = format_a1(block_bounds), values = rows))
+    return blocks
+
+
+def chunk_value_ranges(data:list, max_bytes:int = MAX_CHUNK_BYTES, max_ranges:int = MAX_CHUNK_RANGES) -> list:
+    """
+    Split a list of value ranges into chunks for separate batchUpdate requests, keeping the original order
+    :param       data: value ranges, i.e. {"range": ..., "values": [[...]]}
+    :param  max_bytes: maximum size of the serialized data in one chunk
+    :param max_ranges: maximum number of ranges in one chunk
+    :return: list of chunks
+    """
+    chunks = list()
+    current = list()
+    current_bytes = 0
+    for item in data:
+        size = entry_size(item)
+        pieces = split_entry(item, max_bytes) if size > max_bytes else [item]
+        for piece in pieces:
+            size = entry_size(piece) if len(pieces) > 1 else size
+            if current and (current_bytes + size > max_bytes or len(current) >= max_ranges):
+                chunks.append(current)
+                current = list()
+                current_bytes = 0
+            current.append(piece)
+            current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_ranges(ranges:list, max_ranges:int = MAX_BATCH_GET_RANGES, max_chars:int = MAX_BATCH_GET_CHARS) -> list:
+    """Split a list of A1 ranges into groups small enough for the URL of one values().batchGet request."""
+    chunks = list()
+    current = list()
+    current_chars = 0
+    for rng in ranges:
+        size = len("&ranges=") + len(quote(rng, safe = ""))
+        if current and (current_chars + size > max_chars or len(current) >= max_ranges):
+            chunks.append(current)
+            current = list()
+            current_chars = 0
+        current.append(rng)
+        current_chars += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_waves(chunks:list) -> list:
+    """
+    Group chunks of value ranges into waves, to send one wave after the other:
+    a chunk that writes a cell written by an earlier chunk goes in a later wave, so the LAST value filled is kept
+    :return: lists of chunk indices, in the order to send them
+    """
+    cell_levels = dict()
+    # (bounds, wave) of every range, and of the ranges too big to index by cell
+    all_ranges = list()
+    big_ranges = list()
+    waves = list()
+    for index, chunk in enumerate(chunks):
+        chunk_bounds = [written_bounds(entry) for entry in chunk]
+        level = 0
+        for bounds in chunk_bounds:
+            big = _area(bounds) > MAX_INDEXED_CELLS
+            for bnds, lvl in all_ranges if big else big_ranges:
+                if lvl >= level and bnds.overlaps(bounds):
+                    level = lvl + 1
+            if not big:
+                for cell in _cells(bounds):
+                    lvl = cell_levels.get(cell, -1)
+                    if lvl >= level:
+                        level = lvl + 1
+        for bounds in chunk_bounds:
+            all_ranges.append((bounds, level))
+            if _area(bounds) > MAX_INDEXED_CELLS:
+                big_ranges.append((bounds, level))
+            else:
+                for cell in _cells(bounds):
+                    cell_levels[cell] = level
+        if level == len(waves):
+            waves.append(list())
+        waves[level].append(index)
+    return waves
+
+
+def _area(bounds:GridBounds) -> int:
+    return (bounds.end_row - bounds.start_row) * (bounds.end_col - bounds.start_col)
+
+
+def _cells(bounds:GridBounds):
+    return ((bounds.sheet, r, c) for r in range(bounds.start_row, bounds.end_row) for c in range(bounds.start_col, bounds.end_col))
+
+
+def send_chunks(chunks:list, send_fxn, max_workers:int = MAX_SEND_WORKERS, waves:list = None) -> (list, list):
+    """
+    Send the chunks concurrently with a bounded pool of threads
+    :param      chunks: from chunk_value_ranges()
+    :param    send_fxn: sends one chunk and returns the server response
+    :param max_workers: maximum number of concurrent requests
+    :param       waves: lists of chunk indices to send one list after the other, e.g. from chunk_waves(); default is all at once
+    :return: (chunk index, response) for the successful chunks & (chunk index, exception) for the failed chunks
+    """
+    results = list()
+    for wave in waves if waves is not None else [range(len(chunks))]:
+        if len(wave) <= 1 or max_workers <= 1:
+            results.extend(_send_one(send_fxn, i, chunks[i]) for i in wave)
+        else:
+            with ThreadPoolExecutor(max_workers = min(max_workers, len(wave))) as pool:
+                results.extend(pool.map(lambda i: _send_one(send_fxn, i, chunks[i]), wave))
+    responses = [(i, result) for i, result, ok in results if ok]
+    errors = [(i, result) for i, result, ok in results if not ok]
+    return responses, errors
+
+
+def _send_one(send_fxn, index:int, chunk:list) -> (int, object, bool):
+    try:
+        return index, send_fxn(chunk), True
+    except Exception as sce:
+        return index, sce, False
+
+
+def merge_batch_responses(spreadsheet_id:str, chunks:list, responses:list, errors:list) -> dict:
+    """
+    Combine the responses to the separate batchUpdate requests into one response like that of a single request
+    :return: batchUpdate response plus the number of chunks and a description of each failed chunk
+    """
+    merged = {
+        "spreadsheetId": spreadsheet_id,
+        "totalUpdatedRows": 0,
+        "totalUpdatedColumns": 0,
+        "totalUpdatedCells": 0,
+        "totalUpdatedSheets": 0,
+        "responses": list(),
+        "chunks": len(chunks),
+        "errors": list()
+    }
+    sheets = set()
+    for _, resp in sorted(responses, key = lambda ir: ir[0]):
+        merged["totalUpdatedRows"]  += resp.get("totalUpdatedRows", 0)
+        merged["totalUpdatedCells"] += resp.get("totalUpdatedCells", 0)
+        merged["totalUpdatedColumns"] = max(merged["totalUpdatedColumns"], resp.get("totalUpdatedColumns", 0))
+        for item in resp.get("responses", []):
+            merged["responses"].append(item)
+            if "updatedRange" in item:
+                sheets.add(item["updatedRange"].rpartition('!')[0])
+    merged["totalUpdatedSheets"] = len(sheets)
+    for index, err in sorted(errors, key = lambda ie: ie[0]):
+        chunk = chunks[index]
+        merged["errors"].append({"chunk": index, "ranges": len(chunk), "first": chunk[0].get("range"),
+                                 "last": chunk[-1].get("range"), "error": repr(err)})
+    return merged
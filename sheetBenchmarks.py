@@ -0,0 +1,480 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetBenchmarks.py -- time MhsSheetAccess operations against the in-process fake Sheets backend
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.7+"
+__created__ = "2025-07-14"
+__updated__ = "2025-08-06"
+
+import asyncio
+import cProfile
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+from sheetAccess import MhsSheetAccess, BAL_1_SHEET, lg
+from sheetRanges import index_to_col
+from sheetBatch import coalesce_value_ranges
+from mhsUtils import get_current_time
+from sheetTransport import FakeSheetsBackend, FakeSheetsTransport
+from sheetServices import ServiceRegistry
+from sheetRegistry import SpreadsheetRegistry
+from sheetQuota import RateLimiter
+from sheetMirror import SheetMirror
+from sheetStats import SheetStats
+from asyncSheetAccess import AsyncSheetAccess, FakeSheetsServer
+
+BENCH_SPREADSHEET_ID:str = "bench-spreadsheet"
+BENCH_COLS:int = 20
+
+
+def bench_logger() -> lg.Logger:
+    lgr = lg.getLogger("sheetBenchmarks")
+    lgr.setLevel(lg.WARNING)
+    return lgr
+
+
+def make_fake(p_rows:int, p_cols:int = BENCH_COLS, **backend_args) -> FakeSheetsBackend:
+    """A fake backend with a Budget spreadsheet big enough for p_rows x p_cols cells in the Balance sheet."""
+    backend = FakeSheetsBackend(**backend_args)
+    backend.add_sheet(BENCH_SPREADSHEET_ID, BAL_1_SHEET, p_rows + 1, p_cols)
+    return backend
+
+
+def bench_access(p_backend:FakeSheetsBackend, p_spreadsheet_id:str = BENCH_SPREADSHEET_ID, **access_args) -> MhsSheetAccess:
+    """Access to a fake spreadsheet, with a registry kept in memory only and, unless given, no rate limit."""
+    access_args.setdefault("p_quota", RateLimiter(0, 0, base_delay = 0.01))
+    return MhsSheetAccess(bench_logger(), FakeSheetsTransport(p_backend), p_spreadsheet_id,
+                          p_registry = SpreadsheetRegistry(None), **access_args)
+
+
+def fill_cells(p_mhs:MhsSheetAccess, p_cells:int, p_cols:int = BENCH_COLS):
+    """Fill a block of p_cells cells, column by column, as the budget scripts do."""
+    rows = p_cells // p_cols
+    for c in range(p_cols):
+        col = index_to_col(c)
+        for r in range(1, rows + 1):
+            p_mhs.fill_cell(BAL_1_SHEET, col, r, str(r * c))
+
+
+def bench_fill_and_send(p_cells:int = 100_000, p_latency:float = 0.05, p_profile:bool = False) -> dict:
+    """Time fill_cell() and send_sheets_data() for p_cells cells; optionally print a profile of the whole run."""
+    backend = make_fake(p_cells // BENCH_COLS, latency = p_latency)
+    mhs = bench_access(backend)
+    profiler = cProfile.Profile() if p_profile else None
+    if profiler:
+        profiler.enable()
+
+    start = time.perf_counter()
+    fill_cells(mhs, p_cells)
+    filled = time.perf_counter()
+    mhs.begin_session()
+    response = mhs.send_sheets_data()
+    mhs.end_session()
+    sent = time.perf_counter()
+
+    if profiler:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    return {"cells": p_cells, "fill_secs": filled - start, "send_secs": sent - filled,
+            "updated": response.get("totalUpdatedCells"), "requests": sum(backend.calls.values()),
+            "bytes_sent": backend.bytes_received}
+
+
+def bench_chunked_send(p_cells:int = 50_000, p_latency:float = 0.05, p_latency_per_kb:float = 0.002) -> dict:
+    """Compare one giant batchUpdate with size-limited chunks sent by a pool of workers."""
+    results = dict()
+    for label, max_bytes, max_ranges, workers in (("single", 1 << 30, 1 << 30, 1), ("chunked", 256 * 1024, 1000, 8)):
+        backend = make_fake(p_cells // BENCH_COLS, latency = p_latency, latency_per_kb = p_latency_per_kb)
+        mhs = bench_access(backend)
+        fill_cells(mhs, p_cells)
+        mhs.begin_session()
+        start = time.perf_counter()
+        response = mhs.send_sheets_data(p_max_bytes = max_bytes, p_max_ranges = max_ranges, p_workers = workers,
+                                        p_coalesce = False)
+        results[label] = {"send_secs": time.perf_counter() - start, "requests": response["chunks"],
+                          "updated": response["totalUpdatedCells"]}
+        mhs.end_session()
+    return results
+
+
+def bench_coalesce(p_cells:int = 50_000, p_latency:float = 0.05, p_latency_per_kb:float = 0.002) -> dict:
+    """Payload size, number of ranges and fake-backend time for a column refresh, with and without coalescing."""
+    results = dict()
+    for label, coalesce in (("before", False), ("after", True)):
+        backend = make_fake(p_cells // BENCH_COLS, latency = p_latency, latency_per_kb = p_latency_per_kb)
+        mhs = bench_access(backend)
+        fill_cells(mhs, p_cells)
+        mhs.begin_session()
+        start = time.perf_counter()
+        response = mhs.send_sheets_data(p_coalesce = coalesce)
+        results[label] = {"send_secs": time.perf_counter() - start, "payload_bytes": backend.bytes_received,
+                          "ranges": len(response["responses"]), "requests": response["chunks"],
+                          "updated": response["totalUpdatedCells"]}
+        mhs.end_session()
+    return results
+
+
+def bench_session_open(p_opens:int = 20) -> dict:
+    """Average time to get a Sheets service: build() every time vs the registry, from an empty disk cache & a warm one."""
+    creds = AnonymousCredentials()
+    start = time.perf_counter()
+    for _ in range(p_opens):
+        build("sheets", "v4", credentials = creds, cache_discovery = False).spreadsheets().values()
+    results = {"build_each_time": (time.perf_counter() - start) / p_opens}
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        registry = ServiceRegistry(cache_dir, bench_logger())
+        start = time.perf_counter()
+        registry.get_collection("sheets", "v4", creds, "spreadsheets").values()
+        results["registry_cold"] = time.perf_counter() - start
+        # a new process: nothing in memory, the discovery document is on disk
+        registry.clear()
+        start = time.perf_counter()
+        registry.get_collection("sheets", "v4", creds, "spreadsheets").values()
+        results["registry_new_process"] = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(p_opens):
+            registry.get_collection("sheets", "v4", creds, "spreadsheets").values()
+        results["registry_warm"] = (time.perf_counter() - start) / p_opens
+    return results
+
+
+def bench_contention(p_threads:int = 16, p_spreadsheets:int = 4, p_ops:int = 8, p_latency:float = 0.02) -> dict:
+    """
+    p_threads threads, each with its own session on one of p_spreadsheets spreadsheets, doing 3 reads for each write:
+    one lock for the whole session of every thread, as before, vs the per-spreadsheet reader/writer locks.
+    """
+    backend = FakeSheetsBackend(latency = p_latency)
+    ids = [F"{BENCH_SPREADSHEET_ID}-{i}" for i in range(p_spreadsheets)]
+    for sid in ids:
+        backend.add_sheet(sid, BAL_1_SHEET, 100, BENCH_COLS)
+
+    def work(p_index:int, p_class_lock):
+        mhs = bench_access(backend, ids[p_index % p_spreadsheets], p_cache_ttl = 0)
+        if p_class_lock:
+            p_class_lock.acquire()
+        try:
+            with mhs.session():
+                for op in range(p_ops):
+                    if op % 4 == 3:
+                        mhs.fill_cell(BAL_1_SHEET, index_to_col(op), p_index + 1, str(op))
+                        mhs.send_sheets_data()
+                    else:
+                        mhs.read_sheets_data(BAL_1_SHEET + "!A1:T20")
+        finally:
+            if p_class_lock:
+                p_class_lock.release()
+
+    results = dict()
+    for label, class_lock in (("class_lock", threading.Lock()), ("per_spreadsheet_rw", None)):
+        threads = [threading.Thread(target = work, args = (i, class_lock)) for i in range(p_threads)]
+        start = time.perf_counter()
+        for thr in threads:
+            thr.start()
+        for thr in threads:
+            thr.join()
+        results[label] = time.perf_counter() - start
+    return results
+
+
+def bench_async_reads(p_reads:int = 400, p_latency:float = 0.05, p_max_inflight:int = 64) -> dict:
+    """Time p_reads reads of different ranges from one event loop, with AsyncSheetAccess and a local fake server."""
+    backend = make_fake(p_reads, latency = p_latency)
+
+    async def run() -> float:
+        async with FakeSheetsServer(backend) as server:
+            async with AsyncSheetAccess(bench_logger(), BENCH_SPREADSHEET_ID, server.base_url, lambda: "fake-token",
+                                        p_max_inflight, p_quota = RateLimiter(0, 0)) as asa:
+                start = time.perf_counter()
+                await asyncio.gather(*[asa.read_sheets_data(F"{BAL_1_SHEET}!A{r}:T{r}") for r in range(1, p_reads + 1)])
+                return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return {"reads": p_reads, "max_inflight": p_max_inflight, "secs": elapsed,
+            "sequential_secs": p_reads * p_latency, "requests": backend.calls["values.get"]}
+
+
+def check_async_access(p_latency:float = 0.02, p_max_inflight:int = 4, p_reads:int = 20) -> dict:
+    """
+    CHECK AsyncSheetAccess against a local fake server: cells read back after a send, a read after a write
+    returns the new value and NOT a cached one, and no more than p_max_inflight requests go to the spreadsheet at once
+    :raise AssertionError: if any check fails
+    """
+    backend = make_fake(p_reads, latency = p_latency)
+    range_name = F"{BAL_1_SHEET}!A1:B2"
+
+    async def run() -> dict:
+        async with FakeSheetsServer(backend) as server:
+            async with AsyncSheetAccess(bench_logger(), BENCH_SPREADSHEET_ID, server.base_url, lambda: "fake-token",
+                                        p_max_inflight, p_quota = RateLimiter(0, 0)) as asa:
+                for row, col, val in ((1, "A", "a1"), (1, "B", "b1"), (2, "A", "a2"), (2, "B", "b2")):
+                    asa.fill_cell(BAL_1_SHEET, col, row, val)
+                await asa.send_sheets_data()
+                asa.get_data().clear()
+                rows = await asa.read_sheets_data(range_name)
+                if rows != [["a1", "b1"], ["a2", "b2"]]:
+                    raise AssertionError(F"read back {rows} after the send")
+                # cached now
+                await asa.read_sheets_data(range_name)
+
+                asa.fill_cell(BAL_1_SHEET, "A", 1, "new")
+                await asa.send_sheets_data()
+                asa.get_data().clear()
+                rows = await asa.read_sheets_data(range_name)
+                if rows[0][0] != "new":
+                    raise AssertionError(F"read {rows} from the cache after a write")
+
+                # a read during a send must NOT leave the old value in the cache
+                asa.fill_cell(BAL_1_SHEET, "A", 1, "newer")
+                await asyncio.gather(asa.send_sheets_data(), asa.read_sheets_data(range_name))
+                asa.get_data().clear()
+                rows = await asa.read_sheets_data(range_name)
+                if rows[0][0] != "newer":
+                    raise AssertionError(F"read {rows} from the cache after a read during a write")
+
+                await asyncio.gather(*[asa.read_sheets_data(F"{BAL_1_SHEET}!C{r}:T{r}") for r in range(1, p_reads + 1)])
+                peak = server.max_in_flight.get(BENCH_SPREADSHEET_ID, 0)
+                if peak > p_max_inflight:
+                    raise AssertionError(F"{peak} requests in flight with a limit of {p_max_inflight}")
+                return {"max_in_flight": peak, "limit": p_max_inflight, "cache": asa.cache_stats()}
+
+    return asyncio.run(run())
+
+
+def bench_write_behind(p_cells:int = 50_000, p_latency:float = 0.05, p_max_cells:int = 5000) -> dict:
+    """Time the producer of p_cells cells in write-behind mode, i.e. without waiting for the network, then the flush."""
+    backend = make_fake(p_cells // BENCH_COLS, latency = p_latency)
+    mhs = bench_access(backend)
+    with mhs.session():
+        mhs.enable_write_behind(p_max_cells, p_max_delay_ms = 200)
+        start = time.perf_counter()
+        fill_cells(mhs, p_cells)
+        filled = time.perf_counter()
+        flushed = mhs.flush()
+        done = time.perf_counter()
+        stats = mhs.send_sheets_data()
+    return {"cells": p_cells, "fill_secs": filled - start, "flush_secs": done - filled, "flushed": flushed,
+            "batches": stats.get("batches"), "sent": stats.get("sent"), "requests": backend.calls["values.batchUpdate"],
+            "left": len(mhs.get_data())}
+
+
+def bench_quota(p_threads:int = 8, p_ops:int = 25, p_per_min:float = 1200.0, p_error_rate:float = 0.2,
+                p_latency:float = 0.01) -> dict:
+    """
+    p_threads threads read & write through one RateLimiter while the fake backend throttles p_error_rate of the calls:
+    every operation should succeed, at close to the quota.
+    """
+    backend = make_fake(p_threads, latency = p_latency, error_rate = p_error_rate, error_statuses = (429, 503), seed = 7)
+    quota = RateLimiter(p_per_min, p_per_min, base_delay = 0.05, max_delay = 1.0, p_logger = bench_logger(), seed = 7)
+    failures = list()
+
+    def work(p_index:int):
+        mhs = bench_access(backend, p_cache_ttl = 0, p_quota = quota)
+        mhs.begin_session()
+        try:
+            for op in range(p_ops):
+                if op % 2:
+                    mhs.fill_cell(BAL_1_SHEET, index_to_col(op % BENCH_COLS), p_index + 1, str(op))
+                    mhs.send_sheets_data()
+                else:
+                    mhs.read_sheets_data(BAL_1_SHEET + "!A1:T5")
+        except Exception as bqe:
+            failures.append(bqe)
+        finally:
+            mhs.end_session()
+
+    threads = [threading.Thread(target = work, args = (i,)) for i in range(p_threads)]
+    start = time.perf_counter()
+    for thr in threads:
+        thr.start()
+    for thr in threads:
+        thr.join()
+    elapsed = time.perf_counter() - start
+    ops = p_threads * p_ops
+    return dict(quota.stats(), ops = ops, failures = len(failures), secs = elapsed,
+                ops_per_min = ops / elapsed * 60, quota_per_min = p_per_min * 2)
+
+
+def bench_mirror(p_rows:int = 10_000, p_latency:float = 0.05) -> dict:
+    """Full sync of a p_rows x BENCH_COLS mirror, a column total, then a sync after writing one cell."""
+    backend = make_fake(p_rows, latency = p_latency)
+    mhs = bench_access(backend, p_cache_ttl = 0)
+    fill_cells(mhs, p_rows * BENCH_COLS)
+    with mhs.session():
+        mhs.send_sheets_data()
+        mhs.clear_data()
+        mirror = SheetMirror(mhs)
+        table = mirror.add_range(F"{BAL_1_SHEET}!A1:{index_to_col(BENCH_COLS - 1)}{p_rows}", p_header = False)
+        start = time.perf_counter()
+        mirror.sync()
+        synced = time.perf_counter()
+        total = table.total("C")
+        summed = time.perf_counter()
+        mhs.fill_cell(BAL_1_SHEET, "C", p_rows // 2, "0")
+        mhs.send_sheets_data()
+        resync_start = time.perf_counter()
+        changed = mirror.sync()
+        table.total("C")
+        done = time.perf_counter()
+    return {"rows": p_rows, "sync_secs": synced - start, "total_secs": summed - synced, "total": total,
+            "resync_secs": done - resync_start, "windows": len(table.windows), "windows_changed": changed}
+
+
+def legacy_fill_cell(p_data:list, p_lgr:lg.Logger, sheet:str, col:str, row:int, val):
+    """fill_cell() as it was with a list of dicts, for bench_cell_buffer()."""
+    p_lgr.debug( get_current_time() )
+    value = val.to_eng_string() if isinstance(val, Decimal) else val
+    cell = {"range": sheet + '!' + col + str(row), "values": [[value]]}
+    p_lgr.debug(F"fill_cell() = {cell}\n")
+    p_data.append(cell)
+
+
+def bench_cell_buffer(p_cells:int = 200_000) -> dict:
+    """Time & peak memory to fill p_cells cells and build the coalesced request data: list of dicts vs CellBuffer."""
+    rows = p_cells // BENCH_COLS
+    lgr = bench_logger()
+    cols = [index_to_col(c) for c in range(BENCH_COLS)]
+
+    def legacy():
+        data = list()
+        for col in cols:
+            for r in range(1, rows + 1):
+                legacy_fill_cell(data, lgr, BAL_1_SHEET, col, r, Decimal(r))
+        return lambda: coalesce_value_ranges(data)
+
+    def buffered():
+        mhs = bench_access(make_fake(rows), p_cache_ttl = 0)
+        for col in cols:
+            for r in range(1, rows + 1):
+                mhs.fill_cell(BAL_1_SHEET, col, r, Decimal(r))
+        # what send_sheets_data() builds
+        return lambda: mhs._data.value_ranges(p_coalesce = True)
+
+    results = dict()
+    for label, fill in (("list_of_dicts", legacy), ("cell_buffer", buffered)):
+        for measure_memory in (False, True):
+            if measure_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            build = fill()
+            fill_secs = time.perf_counter() - start
+            if measure_memory:
+                fill_peak = tracemalloc.get_traced_memory()[1]
+            data = build()
+            total_secs = time.perf_counter() - start
+            if measure_memory:
+                results[label].update(fill_peak_mb = fill_peak / 2**20, peak_mb = tracemalloc.get_traced_memory()[1] / 2**20)
+                tracemalloc.stop()
+            else:
+                results[label] = {"fill_secs": fill_secs, "fill_and_build_secs": total_secs, "ranges": len(data)}
+            del build, data
+    return results
+
+
+def bench_stats_overhead(p_sessions:int = 200, p_cells:int = 2000) -> dict:
+    """Time p_sessions sessions of p_cells cells each, with the phase stats disabled & enabled, and show the stats."""
+    results = dict()
+    for label, enabled in (("disabled", False), ("enabled", True)):
+        stats = SheetStats(enabled)
+        backend = make_fake(p_cells // BENCH_COLS)
+        start = time.perf_counter()
+        for _ in range(p_sessions):
+            mhs = bench_access(backend, p_stats = stats)
+            fill_cells(mhs, p_cells)
+            with mhs.session():
+                mhs.send_sheets_data()
+                mhs.read_sheets_data(BAL_1_SHEET + "!A1:T10")
+        results[label] = {"secs": time.perf_counter() - start}
+        if enabled:
+            results[label]["stats"] = {name: {"count": s["count"], "p50": s["p50"], "p99": s["p99"]}
+                                       for name, s in mhs.stats().items()}
+    results["overhead_pct"] = 100.0 * (results["enabled"]["secs"] / results["disabled"]["secs"] - 1)
+    return results
+
+
+def bench_request_batch(p_operations:int = 60, p_latency:float = 0.05) -> dict:
+    """Time copyPaste, findReplace & value writes on separate rows: one batchUpdate per operation vs a SheetRequestBatch."""
+    results = dict()
+    for label in ("one_call_each", "request_batch"):
+        backend = make_fake(p_operations * 2, latency = p_latency)
+        mhs = bench_access(backend)
+        with mhs.session():
+            start = time.perf_counter()
+            batch = mhs.request_batch()
+            for num in range(p_operations):
+                row = 2 * num + 1
+                kind = num % 3
+                if kind == 0:
+                    batch.write(F"{BAL_1_SHEET}!A{row}:C{row}", [[str(num), "X", "=1+2"]])
+                elif kind == 1:
+                    batch.copy_paste(F"{BAL_1_SHEET}!A{row - 2}:C{row - 2}", F"{BAL_1_SHEET}!E{row}")
+                else:
+                    batch.find_replace("X", "Z", F"{BAL_1_SHEET}!A{row - 4}:H{row}")
+                if label == "one_call_each":
+                    mhs.send_requests(batch)
+            if len(batch):
+                response = mhs.send_requests(batch)
+                results[label] = {"calls": response["calls"]}
+            else:
+                results[label] = {"calls": p_operations}
+            results[label]["secs"] = time.perf_counter() - start
+    return results
+
+
+def bench_single_flight(p_threads:int = 32, p_rounds:int = 5, p_latency:float = 0.1) -> dict:
+    """p_threads threads read the same range at the same moment, p_rounds times, with a write between rounds."""
+    backend = make_fake(100, latency = p_latency)
+    mhs = bench_access(backend)
+    range_name = BAL_1_SHEET + "!A1:T50"
+    with mhs.session():
+        start = time.perf_counter()
+        for num in range(p_rounds):
+            barrier = threading.Barrier(p_threads)
+
+            def worker():
+                barrier.wait()
+                mhs.read_sheets_data(range_name)
+            threads = [threading.Thread(target = worker) for _ in range(p_threads)]
+            for thrd in threads:
+                thrd.start()
+            for thrd in threads:
+                thrd.join()
+            mhs.fill_cell(BAL_1_SHEET, "A", 1, str(num))
+            mhs.send_sheets_data()
+            mhs.clear_data()
+        secs = time.perf_counter() - start
+    stats = mhs.cache_stats()
+    return {"reads": p_threads * p_rounds, "api_reads": backend.calls.get("values.get", 0), "collapsed": stats["collapsed"],
+            "secs": secs}
+
+
+def run_benchmarks():
+    print(F"fill & send: {bench_fill_and_send()}")
+    print(F"chunked send: {bench_chunked_send()}")
+    print(F"coalesce: {bench_coalesce()}")
+    print(F"session open: {bench_session_open()}")
+    print(F"contention: {bench_contention()}")
+    print(F"async reads: {bench_async_reads()}")
+    print(F"async check: {check_async_access()}")
+    print(F"write-behind: {bench_write_behind()}")
+    print(F"quota: {bench_quota()}")
+    print(F"mirror: {bench_mirror()}")
+    print(F"cell buffer: {bench_cell_buffer()}")
+    print(F"stats overhead: {bench_stats_overhead()}")
+    print(F"request batch: {bench_request_batch()}")
+    print(F"single flight: {bench_single_flight()}")
+
+
+if __name__ == "__main__":
+    run_benchmarks()
+    exit()
@@ -0,0 +1,93 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetBuffer.py -- compact buffer of the cells filled by MhsSheetAccess, turned into value ranges only when sent
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-29"
+__updated__ = "2025-07-29"
+
+import sys
+from array import array
+from sheetRanges import index_to_col
+from sheetBatch import cell_of, coalesce_cells
+
+
+class CellBuffer:
+    """
+    Filled cells as parallel arrays: sheet number, ZERO-based row & column, and a list of the values.
+    Each sheet name is stored once. Value ranges that are NOT single cells are kept, in order, with their position.
+    """
+    __slots__ = ("_sheet_names", "_sheet_ids", "_sheets", "_rows", "_cols", "_values", "_entries")
+
+    def __init__(self):
+        self._sheet_names = list()
+        self._sheet_ids = dict()
+        self._sheets = array('I')
+        self._rows = array('I')
+        self._cols = array('I')
+        self._values = list()
+        # (number of cells before it, value range)
+        self._entries = list()
+
+    def __len__(self) -> int:
+        return len(self._values) + len(self._entries)
+
+    def add(self, sheet:str, row:int, col:int, value):
+        """Add a cell by ZERO-based row & column."""
+        sid = self._sheet_ids.get(sheet)
+        if sid is None:
+            sid = self._sheet_ids[sheet] = len(self._sheet_names)
+            self._sheet_names.append(sys.intern(sheet))
+        self._sheets.append(sid)
+        self._rows.append(row)
+        self._cols.append(col)
+        self._values.append(value)
+
+    def add_entry(self, entry:dict):
+        """Add a value range: stored as a cell if it is one."""
+        cell = cell_of(entry)
+        if cell:
+            self.add(*cell)
+        else:
+            self._entries.append((len(self._values), entry))
+
+    def clear(self):
+        self._sheet_names.clear()
+        self._sheet_ids.clear()
+        # arrays have no clear()
+        del self._sheets[:], self._rows[:], self._cols[:]
+        self._values.clear()
+        self._entries.clear()
+
+    def cells(self, start:int = 0, end:int = None):
+        """(sheet, ZERO-based row, ZERO-based col, value) of the cells from start to end, in the order they were added."""
+        names = self._sheet_names
+        end = len(self._values) if end is None else end
+        for i in range(start, end):
+            yield names[self._sheets[i]], self._rows[i], self._cols[i], self._values[i]
+
+    @staticmethod
+    def cell_entry(sheet:str, row:int, col:int, value) -> dict:
+        return {"range": sheet + '!' + index_to_col(col) + str(row + 1), "values": [[value]]}
+
+    def value_ranges(self, p_coalesce:bool = False) -> list:
+        """
+        BUILD the value ranges of the request body, in the order they were added
+        :param p_coalesce: merge adjacent cells into blocks, as coalesce_value_ranges() does, WITHOUT a value range per cell
+        """
+        data = list()
+        done = 0
+        for position, entry in self._entries + [(len(self._values), None)]:
+            if position > done:
+                cells = self.cells(done, position)
+                data.extend(coalesce_cells(cells) if p_coalesce else [self.cell_entry(*cell) for cell in cells])
+                done = position
+            if entry is not None:
+                data.append(entry)
+        return data
+# END class CellBuffer
@@ -0,0 +1,232 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetCache.py -- bounded read-through cache of the ranges read from my Google Sheets
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-17"
+__updated__ = "2025-08-06"
+
+import threading
+import time
+from collections import OrderedDict
+from sheetRanges import GridBounds, parse_a1, format_a1
+
+RANGE_CACHE_SIZE:int  = 128
+# seconds that a cached range stays valid
+RANGE_CACHE_TTL:float = 30.0
+
+
+class _Flight:
+    """A read in progress: the threads that want the same range wait for its result."""
+    __slots__ = ("bounds", "done", "rows", "error", "stale")
+
+    def __init__(self, bounds:GridBounds):
+        self.bounds = bounds
+        self.done = threading.Event()
+        self.rows = None
+        self.error = None
+        # an overlapping write was sent during the read: its result may be older than the write
+        self.stale = False
+
+
+class RangeCache:
+    """
+    Rows read from each range, by (spreadsheet id, normalised A1 range), with a time-to-live and LRU eviction.
+    Concurrent loads of the same range share ONE read: see load().
+    Any write that overlaps a cached range, or a range being read, must call invalidate().
+    """
+    def __init__(self, max_entries:int = RANGE_CACHE_SIZE, ttl:float = RANGE_CACHE_TTL, clock = time.monotonic):
+        """
+        :param max_entries: the least recently used range is evicted to make room for a new one
+        :param         ttl: seconds before a range must be read again; 0 to disable the cache
+        :param       clock: for testing
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expiry time, bounds, rows)
+        self._entries = OrderedDict()
+        # (spreadsheet id, sheet) -> keys of the cached ranges in that sheet
+        self._by_sheet = dict()
+        # key -> _Flight of the reads in progress
+        self._flights = dict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.collapsed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def watching(self) -> bool:
+        """Is there anything that a write must invalidate: cached ranges or reads in progress?"""
+        return bool(self._entries or self._flights)
+
+    @staticmethod
+    def make_key(spreadsheet_id:str, range_name:str) -> (str, str):
+        return spreadsheet_id, format_a1(parse_a1(range_name))
+
+    def get(self, spreadsheet_id:str, range_name:str):
+        """The cached rows of the range, or None if not cached or expired."""
+        if not self.enabled:
+            return None
+        key = self.make_key(spreadsheet_id, range_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # copies, so the caller cannot change the cached rows
+            return [list(row) for row in entry[2]]
+
+    def put(self, spreadsheet_id:str, range_name:str, rows:list):
+        if not self.enabled:
+            return
+        key = self.make_key(spreadsheet_id, range_name)
+        bounds = parse_a1(range_name)
+        with self._lock:
+            self._store(key, bounds, rows)
+
+    def _store(self, key:(str, str), bounds:GridBounds, rows:list):
+        """Add an entry; call with the lock held."""
+        if key in self._entries:
+            self._remove(key)
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._entries[key] = (self._clock() + self.ttl, bounds, [list(row) for row in rows])
+        self._by_sheet.setdefault((key[0], bounds.sheet), set()).add(key)
+
+    def load(self, spreadsheet_id:str, range_name:str, read_fxn) -> list:
+        """
+        The rows of the range: from the cache, or from read_fxn() and then cached.
+        If the same range is already being read by another thread, wait for that read instead of making another:
+        all the threads get its result, or its exception.
+        A read that overlaps a write sent before it finishes is NOT cached, and later loads do not wait for it.
+        :param read_fxn: read_fxn() -> rows, e.g. makes the API call
+        """
+        return self.load_many(spreadsheet_id, [range_name], lambda _: {range_name: read_fxn()})[range_name]
+
+    def load_many(self, spreadsheet_id:str, range_names:list, read_fxn) -> dict:
+        """
+        Same as load() for ranges read together, e.g. with one batchGet
+        :param read_fxn: read_fxn(range names) -> {range name: rows} for the ranges NOT cached nor being read by another thread
+        :return: {range name: rows}
+        """
+        results = dict()
+        # key -> (range name, _Flight) of the ranges read here; range name -> _Flight of the others
+        own = dict()
+        others = dict()
+        for range_name in range_names:
+            rows = self.get(spreadsheet_id, range_name)
+            if rows is not None:
+                results[range_name] = rows
+                continue
+            key = self.make_key(spreadsheet_id, range_name)
+            with self._lock:
+                if key in own:
+                    # another name of a range read here
+                    others[range_name] = own[key][1]
+                elif key in self._flights:
+                    others[range_name] = self._flights[key]
+                    self.collapsed += 1
+                else:
+                    own[key] = (range_name, _Flight(parse_a1(range_name)))
+                    self._flights[key] = own[key][1]
+
+        if own:
+            try:
+                fetched = read_fxn([name for name, _ in own.values()])
+                for name, flight in own.values():
+                    flight.rows = fetched.get(name, [])
+            except Exception as lde:
+                for _, flight in own.values():
+                    flight.error = lde
+                raise
+            finally:
+                with self._lock:
+                    for key, (_, flight) in own.items():
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+                        # under the same lock as invalidate(): a write sent after the read can NOT be missed
+                        if flight.error is None and not flight.stale and self.enabled:
+                            self._store(key, flight.bounds, flight.rows)
+                for _, flight in own.values():
+                    flight.done.set()
+            for name, flight in own.values():
+                results[name] = flight.rows
+
+        for range_name, flight in others.items():
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            results[range_name] = [list(row) for row in flight.rows]
+        return results
+
+    def _remove(self, key:(str, str)):
+        _, bounds, _ = self._entries.pop(key)
+        keys = self._by_sheet.get((key[0], bounds.sheet))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_sheet[(key[0], bounds.sheet)]
+
+    def invalidate(self, spreadsheet_id:str, bounds:GridBounds) -> int:
+        """
+        Remove every cached range that overlaps the written bounds; return the number removed.
+        Reads in progress of overlapping ranges are NOT cached and are not shared with later loads.
+        """
+        if not self.watching():
+            return 0
+        with self._lock:
+            for key, flight in list(self._flights.items()):
+                if key[0] == spreadsheet_id and flight.bounds.overlaps(bounds):
+                    flight.stale = True
+                    del self._flights[key]
+            keys = self._by_sheet.get((spreadsheet_id, bounds.sheet))
+            if not keys:
+                return 0
+            stale = [key for key in keys if self._entries[key][1].overlaps(bounds)]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def invalidate_cell(self, spreadsheet_id:str, sheet:str, row:int, col:int) -> int:
+        """Remove every cached range that includes the ZERO-based cell."""
+        if not self.watching():
+            return 0
+        return self.invalidate(spreadsheet_id, GridBounds(sheet, row, row + 1, col, col + 1))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_sheet.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl,
+                    "hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions, "expirations": self.expirations, "invalidations": self.invalidations,
+                    "collapsed": self.collapsed, "in_flight": len(self._flights)}
+# END class RangeCache
@@ -0,0 +1,152 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetCredentials.py -- keep Google credentials in memory and refresh them in the background before they expire
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-20"
+__updated__ = "2025-07-20"
+
+import datetime as dt
+import os
+import threading
+from sys import path
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from google_auth_oauthlib.flow import InstalledAppFlow
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import osp, lg
+
+# refresh this many seconds before the access token expires
+REFRESH_MARGIN:float = 300.0
+# wait before trying again after a failed background refresh
+REFRESH_RETRY:float = 30.0
+
+
+class CredentialManager:
+    """
+    Load the credentials for a token file ONCE, share them between threads,
+    and refresh them on a background timer shortly before they expire.
+    The token file is re-written, atomically, only when the token has changed.
+    """
+    _managers = dict()
+    _managers_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, token_file:str, scopes:list, credentials_file:str, p_logger:lg.Logger = None) -> "CredentialManager":
+        """The process-wide manager for the token file."""
+        with cls._managers_lock:
+            manager = cls._managers.get(token_file)
+            if manager is None:
+                manager = cls(token_file, scopes, credentials_file, p_logger)
+                cls._managers[token_file] = manager
+            return manager
+
+    def __init__(self, token_file:str, scopes:list, credentials_file:str, p_logger:lg.Logger = None,
+                 p_margin:float = REFRESH_MARGIN):
+        """
+        :param       token_file: json file with the authorized user token
+        :param           scopes: needed by the token
+        :param credentials_file: client secrets, to log in if there is no valid token
+        :param         p_margin: seconds before expiry to refresh the token
+        """
+        self.token_file = token_file
+        self.scopes = scopes
+        self.credentials_file = credentials_file
+        self.margin = p_margin
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._creds = None
+        self._saved_json = None
+        self._timer = None
+        self._lock = threading.RLock()
+        self.refreshes = 0
+
+    def get(self) -> Credentials:
+        """Valid credentials, normally straight from memory."""
+        creds = self._creds
+        if creds is not None and creds.valid:
+            return creds
+        with self._lock:
+            if self._creds is None:
+                self._load()
+            elif not self._creds.valid:
+                # the background refresh did not run in time, e.g. the machine was asleep
+                self._refresh()
+            return self._creds
+
+    def _load(self):
+        """Get the credentials from the token file or, if that fails, let the user log in."""
+        creds = None
+        if osp.exists(self.token_file):
+            self._lgr.info(F"osp.exists({self.token_file})")
+            creds = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+            self._saved_json = creds.to_json()
+
+        # if there are no (valid) credentials available, let the user log in.
+        if not creds or not creds.valid:
+            self._lgr.info("creds is None or not creds.valid")
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+                self.refreshes += 1
+                self._lgr.debug("creds.refresh(Request())")
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.scopes)
+                creds = flow.run_local_server()
+                self._lgr.debug("creds = flow.run_local_server()")
+        self._creds = creds
+        self._save()
+        self._schedule()
+
+    def _refresh(self):
+        self._creds.refresh(Request())
+        self.refreshes += 1
+        self._lgr.info(F"refreshed the token, now expires at {self._creds.expiry}")
+        self._save()
+        self._schedule()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as bre:
+                self._lgr.error(F"background token refresh FAILED: {bre}")
+                self._schedule(REFRESH_RETRY)
+
+    def _schedule(self, p_delay:float = None):
+        """Start a timer to refresh the token 'margin' seconds before it expires."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if p_delay is None:
+            if not self._creds.expiry or not self._creds.refresh_token:
+                return
+            # google-auth keeps the expiry as a naive UTC datetime
+            now = dt.datetime.now(dt.timezone.utc).replace(tzinfo = None)
+            p_delay = max(0.0, (self._creds.expiry - now).total_seconds() - self.margin)
+        self._timer = threading.Timer(p_delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _save(self):
+        """Write the token file if the token has changed, atomically so a reader never sees a partial file."""
+        creds_json = self._creds.to_json()
+        if creds_json == self._saved_json:
+            return
+        tmp_file = F"{self.token_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as tfp:
+            tfp.write(creds_json)
+        os.replace(tmp_file, self.token_file)
+        self._saved_json = creds_json
+        self._lgr.debug(F"saved the token to '{self.token_file}'")
+
+    def close(self):
+        """Stop the background refresh."""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+# END class CredentialManager
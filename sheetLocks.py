@@ -0,0 +1,93 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetLocks.py -- reader/writer locks, one per Google spreadsheet, shared by all the threads of the process
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-22"
+__updated__ = "2025-07-22"
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Many readers OR one writer at a time.
+    A waiting writer blocks new readers, so a steady stream of reads cannot starve the writes.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
+
+    def __repr__(self) -> str:
+        return F"<{self.__class__.__name__} readers={self._readers} writer={self._writer} waiting={self._writers_waiting}>"
+# END class ReadWriteLock
+
+
+class SpreadsheetLocks:
+    """One ReadWriteLock per spreadsheet id, created on first use."""
+    def __init__(self):
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def get(self, spreadsheet_id:str) -> ReadWriteLock:
+        rwlock = self._locks.get(spreadsheet_id)
+        if rwlock is None:
+            with self._lock:
+                rwlock = self._locks.setdefault(spreadsheet_id, ReadWriteLock())
+        return rwlock
+# END class SpreadsheetLocks
+
+
+# shared by all the MhsSheetAccess instances in the process
+LOCKS = SpreadsheetLocks()
@@ -0,0 +1,316 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetMirror.py -- local copy of ranges of my Google Sheets as typed NumPy columns, re-synced by windows of rows
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-28"
+__updated__ = "2025-07-28"
+
+import hashlib
+import json
+import threading
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from sheetAccess import MhsSheetAccess
+from sheetRanges import GridBounds, parse_a1, format_a1, index_to_col
+
+# rows read & parsed together; a write inside a window makes the next sync() read the whole window again
+MIRROR_WINDOW_ROWS:int = 100
+# the mirror needs the raw numbers, not the text shown in the sheet
+MIRROR_VALUE_RENDER:str = "UNFORMATTED_VALUE"
+
+NUMERIC:str = "numeric"
+DECIMAL:str = "decimal"
+TEXT:str    = "text"
+
+
+def parse_numeric(raw:np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Parse an array of cell strings as float64 all at once: '$1,234.50', '(12.00)' and '15%' are understood
+    :return: the values, NaN for empty and non-numeric cells; mask of the non-empty cells that are NOT numbers
+    """
+    cleaned = np.char.strip(np.char.replace(np.char.replace(raw, ",", ""), "$", ""))
+    # accounting format for negative numbers
+    negative = np.char.startswith(cleaned, "(") & np.char.endswith(cleaned, ")")
+    cleaned = np.where(negative, np.char.strip(cleaned, "()"), cleaned)
+    percent = np.char.endswith(cleaned, "%")
+    cleaned = np.where(percent, np.char.rstrip(cleaned, "%"), cleaned)
+    empty = cleaned == ""
+    cleaned = np.where(empty, "nan", cleaned)
+    try:
+        values = cleaned.astype(np.float64)
+        bad = np.zeros(len(raw), dtype = bool)
+    except ValueError:
+        # some cells are text: only now look at the cells one by one
+        values = np.empty(len(raw), dtype = np.float64)
+        bad = np.zeros(len(raw), dtype = bool)
+        for i, txt in enumerate(cleaned):
+            try:
+                values[i] = float(txt)
+            except ValueError:
+                values[i] = np.nan
+                bad[i] = True
+    values = np.where(negative, -values, values)
+    values = np.where(percent, values / 100.0, values)
+    return values, bad
+
+
+def parse_decimal(raw:np.ndarray) -> np.ndarray:
+    """Exact values for money columns: Decimal objects, None for empty or non-numeric cells."""
+    result = np.empty(len(raw), dtype = object)
+    for i, txt in enumerate(raw):
+        txt = txt.replace(",", "").replace("$", "").strip()
+        negative = txt.startswith("(") and txt.endswith(")")
+        txt = txt.strip("()")
+        percent = txt.endswith("%")
+        try:
+            val = Decimal(txt.rstrip("%")) if txt else None
+        except InvalidOperation:
+            val = None
+        if val is not None:
+            val = -val if negative else val
+            val = val / 100 if percent else val
+        result[i] = val
+    return result
+
+
+class _Window:
+    """The rows of one window of a table: the cell strings, their hash and the parsed columns, by column index."""
+    def __init__(self, bounds:GridBounds):
+        self.bounds = bounds
+        self.digest = None
+        self.raw = None
+        # (float64 values, mask of the text cells) of each column
+        self.numeric = list()
+        self._decimal = dict()
+
+    def decimal(self, col:int) -> np.ndarray:
+        arr = self._decimal.get(col)
+        if arr is None:
+            arr = self._decimal[col] = parse_decimal(self.raw[:, col])
+        return arr
+
+
+class MirrorTable:
+    """
+    One range of a sheet as typed columns: float64 for numbers, Decimal objects for the columns named as such,
+    and str for the others. The columns are built from the parsed windows only when the table is used.
+    """
+    def __init__(self, range_name:str, p_header:bool = True, p_decimal_cols:tuple = (), p_window_rows:int = MIRROR_WINDOW_ROWS):
+        """
+        :param     range_name: A1 range with a last row, e.g. "All Inc 1!B1:Q400"
+        :param       p_header: the first row of the range has the names of the columns; default names are the column letters
+        :param p_decimal_cols: names of the columns to keep as Decimal
+        :param  p_window_rows: rows in each window
+        """
+        bounds = parse_a1(range_name)
+        if bounds.end_row is None or bounds.end_col is None:
+            raise ValueError(F"Range '{range_name}' of a mirror table must have a last row and column!")
+        self.range_name = range_name
+        self.bounds = bounds
+        self.decimal_cols = set(p_decimal_cols)
+        start = bounds.start_row or 0
+        start_col = bounds.start_col or 0
+        self.width = bounds.end_col - start_col
+        self.header_bounds = GridBounds(bounds.sheet, start, start + 1, start_col, bounds.end_col) if p_header else None
+        self.names = [index_to_col(c) for c in range(start_col, bounds.end_col)]
+        first = start + 1 if p_header else start
+        self.windows = [_Window(GridBounds(bounds.sheet, r, min(r + p_window_rows, bounds.end_row), start_col, bounds.end_col))
+                        for r in range(first, bounds.end_row, p_window_rows)]
+        self._columns = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(w.bounds.end_row - w.bounds.start_row for w in self.windows)
+
+    def set_header(self, rows:list):
+        row = rows[0] if rows else []
+        names = [str(row[c]).strip() if c < len(row) and str(row[c]).strip() else index_to_col((self.bounds.start_col or 0) + c)
+                 for c in range(self.width)]
+        with self._lock:
+            if names != self.names:
+                self.names = names
+                self._columns = None
+
+    def load_window(self, window:_Window, rows:list) -> bool:
+        """Parse the rows of a window if they have changed; return True if they had."""
+        digest = hashlib.blake2b(json.dumps(rows, separators = (',', ':')).encode("utf-8"), digest_size = 16).digest()
+        if digest == window.digest:
+            return False
+        height = window.bounds.end_row - window.bounds.start_row
+        grid = np.full((height, self.width), "", dtype = object)
+        for r, row in enumerate(rows[:height]):
+            for c, val in enumerate(row[:self.width]):
+                grid[r, c] = val if isinstance(val, str) else repr(val) if isinstance(val, float) else str(val)
+        grid = grid.astype(str)
+        numeric = [parse_numeric(grid[:, c]) for c in range(self.width)]
+        with self._lock:
+            window.raw = grid
+            window.numeric = numeric
+            window._decimal = dict()
+            window.digest = digest
+            self._columns = None
+        return True
+
+    def kind(self, col:int) -> str:
+        """NUMERIC, DECIMAL or TEXT: a column with text in ANY window is a text column."""
+        if self.names[col] in self.decimal_cols:
+            return DECIMAL
+        return TEXT if any(w.numeric[col][1].any() for w in self.windows if w.raw is not None) else NUMERIC
+
+    def columns(self) -> dict:
+        """name -> array with all the rows of the column; empty until every window has been read."""
+        with self._lock:
+            if self._columns is None:
+                built = dict()
+                if all(w.raw is not None for w in self.windows):
+                    for col, name in enumerate(self.names):
+                        kind = self.kind(col)
+                        if kind == DECIMAL:
+                            built[name] = np.concatenate([w.decimal(col) for w in self.windows])
+                        elif kind == NUMERIC:
+                            built[name] = np.concatenate([w.numeric[col][0] for w in self.windows])
+                        else:
+                            built[name] = np.concatenate([w.raw[:, col] for w in self.windows])
+                self._columns = built
+            return self._columns
+
+    def column(self, name:str) -> np.ndarray:
+        return self.columns()[name]
+
+    def select(self, p_mask:np.ndarray, p_names:list = None) -> dict:
+        """The rows where p_mask is True, e.g. table.select(table.column("Total") > 1000)"""
+        cols = self.columns()
+        return {name: cols[name][p_mask] for name in (p_names if p_names else cols)}
+
+    def total(self, name:str, p_mask:np.ndarray = None):
+        """Sum of a numeric (ignoring empty cells) or Decimal column, optionally of the rows where p_mask is True."""
+        col = self.column(name)
+        if p_mask is not None:
+            col = col[p_mask]
+        if col.dtype == object:
+            return sum((v for v in col if v is not None), Decimal(0))
+        return float(np.nansum(col))
+
+    def group_total(self, key_name:str, value_name:str) -> dict:
+        """Sum of a numeric column for each value of the key column, e.g. the total of each account."""
+        keys, inverse = np.unique(self.column(key_name), return_inverse = True)
+        values = self.column(value_name)
+        if values.dtype == object:
+            totals = [Decimal(0)] * len(keys)
+            for k, v in zip(inverse, values):
+                if v is not None:
+                    totals[k] += v
+            return dict(zip(keys.tolist(), totals))
+        sums = np.bincount(inverse, weights = np.nan_to_num(values), minlength = len(keys))
+        return dict(zip(keys.tolist(), sums.tolist()))
+
+    def overlaps(self, bounds:GridBounds) -> list:
+        """The windows that include any cell of the bounds, i.e. must be read again after a write there."""
+        return [w for w in self.windows if w.bounds.overlaps(bounds)]
+# END class MirrorTable
+
+
+class SheetMirror:
+    """
+    Local copy of selected ranges of a spreadsheet, read with MhsSheetAccess.read_many().
+    sync() reads only the windows that were never read or that MhsSheetAccess has written since the last sync();
+    sync(p_full = True) reads everything but parses again only the windows whose content has changed.
+    """
+    def __init__(self, p_access:MhsSheetAccess, p_spreadsheet_id:str = None, p_window_rows:int = MIRROR_WINDOW_ROWS,
+                 p_value_render:str = MIRROR_VALUE_RENDER):
+        """
+        :param         p_access: to read the sheets, with a session started before sync(); writes it sends mark windows to re-read
+        :param p_spreadsheet_id: of the ranges; default is the spreadsheet of p_access
+        :param    p_window_rows: rows in each window of a table
+        :param   p_value_render: valueRenderOption of the reads
+        """
+        self._access = p_access
+        self._spreadsheet_id = p_spreadsheet_id
+        self.window_rows = p_window_rows
+        self.value_render = p_value_render
+        self._tables = dict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.windows_read = 0
+        self.windows_parsed = 0
+        p_access.add_write_listener(self._on_write)
+
+    def add_range(self, range_name:str, p_header:bool = True, p_decimal_cols:tuple = ()) -> MirrorTable:
+        """Mirror a range; it is read by the next sync()."""
+        table = MirrorTable(range_name, p_header, p_decimal_cols, self.window_rows)
+        with self._lock:
+            self._tables[range_name] = table
+            self._dirty.update((range_name, i) for i in range(len(table.windows)))
+            if table.header_bounds:
+                self._dirty.add((range_name, None))
+        return table
+
+    def table(self, range_name:str) -> MirrorTable:
+        return self._tables[range_name]
+
+    def _on_write(self, spreadsheet_id:str, bounds:GridBounds):
+        if self._spreadsheet_id and spreadsheet_id != self._spreadsheet_id:
+            return
+        with self._lock:
+            for name, table in self._tables.items():
+                if table.header_bounds and table.header_bounds.overlaps(bounds):
+                    self._dirty.add((name, None))
+                for i, window in enumerate(table.windows):
+                    if window.bounds.overlaps(bounds):
+                        self._dirty.add((name, i))
+
+    def _range_item(self, bounds:GridBounds):
+        range_name = format_a1(bounds)
+        return (self._spreadsheet_id, range_name) if self._spreadsheet_id else range_name
+
+    def sync(self, p_full:bool = False) -> int:
+        """
+        READ the windows that may have changed, all in one batchGet, and parse those that did change
+        :param p_full: read every window, e.g. to see changes made by someone else in the sheet
+        :return: number of windows that had changed
+        """
+        with self._lock:
+            if p_full:
+                wanted = {(name, None) for name, table in self._tables.items() if table.header_bounds}
+                wanted.update((name, i) for name, table in self._tables.items() for i in range(len(table.windows)))
+            else:
+                wanted = set(self._dirty)
+            self._dirty.difference_update(wanted)
+        if not wanted:
+            return 0
+
+        items = dict()
+        for name, index in wanted:
+            table = self._tables[name]
+            bounds = table.header_bounds if index is None else table.windows[index].bounds
+            items[(name, index)] = self._range_item(bounds)
+        try:
+            results = self._access.read_many(list(items.values()), p_value_render = self.value_render)
+            if "PROBLEM" in results:
+                raise RuntimeError(results["PROBLEM"])
+        except Exception:
+            # try these windows again next time
+            with self._lock:
+                self._dirty.update(wanted)
+            raise
+
+        # headers first: new column names make every window of the table change
+        for (name, index), item in items.items():
+            if index is None:
+                self._tables[name].set_header(results.get(item, []))
+        changed = 0
+        for (name, index), item in items.items():
+            if index is not None:
+                table = self._tables[name]
+                if table.load_window(table.windows[index], results.get(item, [])):
+                    changed += 1
+        self.windows_read += len(items)
+        self.windows_parsed += changed
+        return changed
+# END class SheetMirror
@@ -0,0 +1,275 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetQuota.py -- keep the Sheets API calls of the process under the per-minute quotas and retry throttled calls
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-25"
+__updated__ = "2025-08-06"
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from sys import path
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import lg
+
+# Sheets v4 quotas per user per minute: https://developers.google.com/sheets/api/limits
+READ_QUOTA_PER_MIN:float  = 60.0
+WRITE_QUOTA_PER_MIN:float = 60.0
+# never slow down below this fraction of the quota
+MIN_RATE_FRACTION:float = 0.1
+# after a throttled call the rate is multiplied by this ...
+RATE_DECREASE:float = 0.5
+# ... and each successful call adds back this fraction of the quota
+RATE_INCREASE:float = 0.02
+# seconds after a decrease during which more throttled calls, sent before the decrease, do not decrease again
+DECREASE_COOLDOWN:float = 2.0
+
+# truncated exponential backoff, as recommended by Google
+RETRY_TRIES:int = 6
+RETRY_BASE_DELAY:float = 1.0
+RETRY_MAX_DELAY:float = 64.0
+RETRY_STATUSES:tuple = (408, 429, 500, 502, 503, 504)
+THROTTLE_STATUSES:tuple = (429,)
+
+READ:str  = "read"
+WRITE:str = "write"
+
+
+def error_status(exc:Exception) -> int:
+    """Http status of an HttpError, FakeHttpError or AsyncHttpError; None for other exceptions."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(exc:Exception) -> float:
+    """Seconds requested by the Retry-After header of the error response, or None."""
+    resp = getattr(exc, "resp", None)
+    value = resp.get("retry-after") if resp is not None and hasattr(resp, "get") else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retriable(exc:Exception, idempotent:bool = True) -> bool:
+    """
+    Can the call that raised exc be sent again?
+    :param idempotent: False for a call that must NOT be applied twice, e.g. a cutPaste or findReplace:
+                       only retry a throttled call, which the server did NOT apply
+    """
+    status = error_status(exc)
+    if not idempotent:
+        return status in THROTTLE_STATUSES
+    if status is not None:
+        return status in RETRY_STATUSES
+    # lost connection, timeout, ...
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: 'rate' tokens per second up to 'burst' tokens.
+    The rate adapts: cut when the server throttles, raised slowly back to the ceiling after each success.
+    """
+    def __init__(self, per_minute:float, burst:float = None, clock = time.monotonic):
+        """
+        :param per_minute: ceiling of the rate; 0 for no limit
+        :param      burst: tokens that can be used at once; default is 1/4 minute of the ceiling
+        :param      clock: for testing
+        """
+        self.ceiling = per_minute / 60.0
+        self.rate = self.ceiling
+        self.burst = burst if burst is not None else max(1.0, per_minute / 4)
+        self._clock = clock
+        self._tokens = self.burst
+        self._stamp = clock()
+        self._last_decrease = None
+        self._lock = threading.Lock()
+        self.throttles = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ceiling > 0
+
+    def _refill(self, now:float):
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, tokens:float = 1.0) -> float:
+        """Take tokens NOW, going into debt if needed; return the seconds to wait before using them."""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens:float = 1.0) -> float:
+        """Wait until tokens are available; return the seconds waited."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        if self.enabled and self.rate < self.ceiling:
+            with self._lock:
+                self._refill(self._clock())
+                self.rate = min(self.ceiling, self.rate + self.ceiling * RATE_INCREASE)
+
+    def on_throttle(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = self._clock()
+            self.throttles += 1
+            if self._last_decrease is not None and now - self._last_decrease < DECREASE_COOLDOWN:
+                return
+            self._refill(now)
+            self.rate = max(self.ceiling * MIN_RATE_FRACTION, self.rate * RATE_DECREASE)
+            # the server is out of quota: nothing saved up is usable
+            self._tokens = min(self._tokens, 0.0)
+            self._last_decrease = now
+# END class TokenBucket
+
+
+class RateLimiter:
+    """
+    One token bucket for the read calls and one for the write calls, shared by every thread & instance that uses it,
+    plus the retry policy for calls that are throttled or fail on the server side.
+    """
+    def __init__(self, read_per_min:float = READ_QUOTA_PER_MIN, write_per_min:float = WRITE_QUOTA_PER_MIN,
+                 tries:int = RETRY_TRIES, base_delay:float = RETRY_BASE_DELAY, max_delay:float = RETRY_MAX_DELAY,
+                 p_logger:lg.Logger = None, seed:int = None):
+        """
+        :param  read_per_min: read quota; 0 for no limit
+        :param write_per_min: write quota; 0 for no limit
+        :param         tries: maximum number of tries of a call
+        :param    base_delay: seconds before the first retry, doubled for each retry
+        :param     max_delay: maximum seconds between tries
+        :param          seed: for a repeatable jitter
+        """
+        self.buckets = {READ: TokenBucket(read_per_min), WRITE: TokenBucket(write_per_min)}
+        self.tries = tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.waited = 0.0
+
+    def backoff(self, attempt:int, exc:Exception = None) -> float:
+        """Seconds before try # attempt + 1: the Retry-After of the error if any, else 'full jitter' exponential backoff."""
+        requested = retry_after(exc) if exc is not None else None
+        if requested is not None:
+            return min(requested, self.max_delay)
+        with self._lock:
+            return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def count(self, calls:int = 0, retries:int = 0, waited:float = 0.0):
+        with self._lock:
+            self.calls += calls
+            self.retries += retries
+            self.waited += waited
+
+    def record(self, kind:str, exc:Exception = None):
+        """Adapt the rate of the bucket to the result of a call."""
+        bucket = self.buckets[kind]
+        if exc is None:
+            bucket.on_success()
+        elif error_status(exc) in THROTTLE_STATUSES:
+            bucket.on_throttle()
+
+    def retry_delay(self, kind:str, exc:Exception, attempt:int, idempotent:bool = True) -> float:
+        """
+        RECORD the failure of try # attempt of a call
+        :return: seconds to wait before the next try, or None if the call must NOT be retried
+        """
+        self.record(kind, exc)
+        if attempt >= self.tries or not is_retriable(exc, idempotent):
+            return None
+        delay = self.backoff(attempt - 1, exc)
+        self.count(retries = 1)
+        self._lgr.warning(F"{kind} call failed with {exc}: try #{attempt + 1} of {self.tries} in {delay:.2f} seconds.")
+        return delay
+
+    def call(self, kind:str, fxn, idempotent:bool = True):
+        """
+        Run fxn() when the quota allows, retrying it if it fails in a way that may not happen again
+        :param       kind: READ or WRITE
+        :param        fxn: makes one API call
+        :param idempotent: False if the call must NOT be applied twice: then it is retried only when throttled,
+                           NOT after a server error or timeout, which may come after the call was applied
+        :return: result of fxn()
+        """
+        bucket = self.buckets[kind]
+        attempt = 0
+        while True:
+            self.count(calls = 1, waited = bucket.acquire())
+            try:
+                result = fxn()
+            except Exception as exc:
+                attempt += 1
+                delay = self.retry_delay(kind, exc, attempt, idempotent)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.record(kind)
+            return result
+
+    async def call_async(self, kind:str, coro_fxn, idempotent:bool = True):
+        """
+        Same as call() in an asyncio event loop: the waits do NOT block the loop
+        :param coro_fxn: returns a coroutine that makes one API call
+        """
+        bucket = self.buckets[kind]
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            self.count(calls = 1, waited = wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                result = await coro_fxn()
+            except Exception as exc:
+                attempt += 1
+                delay = self.retry_delay(kind, exc, attempt, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.record(kind)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "retries": self.retries, "waited": self.waited,
+                    "read_rate_per_min": self.buckets[READ].rate * 60, "write_rate_per_min": self.buckets[WRITE].rate * 60,
+                    "throttles": sum(b.throttles for b in self.buckets.values())}
+# END class RateLimiter
+
+
+# shared by all the MhsSheetAccess & AsyncSheetAccess instances in the process
+QUOTAS = RateLimiter()
@@ -0,0 +1,159 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetRanges.py -- parse, format & compare A1 notation ranges for my Google Sheets
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-14"
+__updated__ = "2025-07-14"
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# e.g. 'All Inc 1'!C12:E20 | Calculations!P36 | Record!A:A | Balance 1!3:3
+A1_CELL_RX = re.compile(r"^\$?([A-Za-z]*)\$?([0-9]*)$")
+
+
+class GridBounds(NamedTuple):
+    """
+    ZERO-based, END-exclusive bounds of an A1 range, like a Sheets API GridRange.
+    Any of the bounds may be None to indicate an open-ended range, e.g. 'Sheet!A:A'.
+    """
+    sheet:str
+    start_row:Optional[int]
+    end_row:Optional[int]
+    start_col:Optional[int]
+    end_col:Optional[int]
+
+    def contains(self, row:int, col:int) -> bool:
+        """Does this range include the ZERO-based cell (row, col)?"""
+        return (self.start_row is None or row >= self.start_row) and (self.end_row is None or row < self.end_row) \
+            and (self.start_col is None or col >= self.start_col) and (self.end_col is None or col < self.end_col)
+
+    def overlaps(self, other:"GridBounds") -> bool:
+        """Do the two ranges share at least one cell?"""
+        if self.sheet != other.sheet:
+            return False
+        return _spans_overlap(self.start_row, self.end_row, other.start_row, other.end_row) \
+            and _spans_overlap(self.start_col, self.end_col, other.start_col, other.end_col)
+
+
+def _spans_overlap(start1:Optional[int], end1:Optional[int], start2:Optional[int], end2:Optional[int]) -> bool:
+    lo1 = 0 if start1 is None else start1
+    lo2 = 0 if start2 is None else start2
+    return (end2 is None or lo1 < end2) and (end1 is None or lo2 < end1)
+
+
+@lru_cache(maxsize = 1024)
+def col_to_index(col:str) -> int:
+    """Convert a column label, e.g. 'C' or 'AB', to a ZERO-based column index."""
+    index = 0
+    for ch in col.upper():
+        if not 'A' <= ch <= 'Z':
+            raise ValueError(F"Bad column label '{col}'!")
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    if index == 0:
+        raise ValueError("Empty column label!")
+    return index - 1
+
+
+@lru_cache(maxsize = 1024)
+def index_to_col(index:int) -> str:
+    """Convert a ZERO-based column index to a column label, e.g. 2 -> 'C'."""
+    if index < 0:
+        raise ValueError(F"Bad column index '{index}'!")
+    label = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        label = chr(ord('A') + rem) + label
+    return label
+
+
+def split_sheet(range_name:str) -> (str, str):
+    """Split an A1 range into the UNQUOTED sheet title and the cell part (which may be empty)."""
+    range_name = range_name.strip()
+    if range_name.startswith("'"):
+        # quoted title: any embedded quote is doubled
+        pos = 1
+        while True:
+            pos = range_name.find("'", pos)
+            if pos < 0:
+                raise ValueError(F"Unbalanced quotes in range '{range_name}'!")
+            if range_name[pos+1:pos+2] == "'":
+                pos += 2
+                continue
+            break
+        sheet = range_name[1:pos].replace("''", "'")
+        rest = range_name[pos+1:]
+        if rest and not rest.startswith('!'):
+            raise ValueError(F"Bad range '{range_name}'!")
+        return sheet, rest[1:]
+    sheet, _, cells = range_name.rpartition('!')
+    if not sheet:
+        # no '!' -> the whole string is a sheet title
+        return cells, ""
+    return sheet, cells
+
+
+def quote_sheet(sheet:str) -> str:
+    """Quote a sheet title if the API requires it, e.g. All Inc 1 -> 'All Inc 1'."""
+    if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", sheet) and not re.fullmatch(r"[A-Za-z]{1,3}[0-9]+", sheet):
+        return sheet
+    return "'" + sheet.replace("'", "''") + "'"
+
+
+def _parse_cell(cell:str, range_name:str) -> (Optional[int], Optional[int]):
+    match = A1_CELL_RX.match(cell)
+    if not match or not (match.group(1) or match.group(2)):
+        raise ValueError(F"Bad cell reference '{cell}' in range '{range_name}'!")
+    col = col_to_index(match.group(1)) if match.group(1) else None
+    row = int(match.group(2)) - 1 if match.group(2) else None
+    if row is not None and row < 0:
+        raise ValueError(F"Bad row in range '{range_name}'!")
+    return row, col
+
+
+@lru_cache(maxsize = 4096)
+def parse_a1(range_name:str) -> GridBounds:
+    """Parse an A1 range, e.g. 'All Inc 1'!C12:E20, into ZERO-based, END-exclusive GridBounds."""
+    sheet, cells = split_sheet(range_name)
+    if not sheet:
+        raise ValueError(F"No sheet title in range '{range_name}'!")
+    if not cells:
+        return GridBounds(sheet, None, None, None, None)
+    first, _, last = cells.partition(':')
+    row1, col1 = _parse_cell(first, range_name)
+    row2, col2 = _parse_cell(last, range_name) if last else (row1, col1)
+    # a single cell or a pair of cells -> a closed rectangle; otherwise open-ended in the missing dimension
+    if row1 is not None and row2 is not None and row1 > row2:
+        row1, row2 = row2, row1
+    if col1 is not None and col2 is not None and col1 > col2:
+        col1, col2 = col2, col1
+    return GridBounds(sheet, row1, None if row2 is None else row2 + 1, col1, None if col2 is None else col2 + 1)
+
+
+def format_a1(bounds:GridBounds, p_quote:bool = False) -> str:
+    """Format GridBounds as an A1 range; a single cell is formatted as e.g. 'Sheet!C12'."""
+    sheet = quote_sheet(bounds.sheet) if p_quote else bounds.sheet
+    start = (index_to_col(bounds.start_col) if bounds.start_col is not None else "") \
+        + (str(bounds.start_row + 1) if bounds.start_row is not None else "")
+    end = (index_to_col(bounds.end_col - 1) if bounds.end_col is not None else "") \
+        + (str(bounds.end_row) if bounds.end_row is not None else "")
+    if not start and not end:
+        return sheet
+    if bounds.end_row == (None if bounds.start_row is None else bounds.start_row + 1) \
+            and bounds.end_col == (None if bounds.start_col is None else bounds.start_col + 1) \
+            and bounds.start_row is not None and bounds.start_col is not None:
+        return sheet + '!' + start
+    return sheet + '!' + start + ':' + end
+
+
+def normalize_a1(range_name:str) -> str:
+    """Canonical form of an A1 range so that e.g. 'Calculations'!p36 and Calculations!P36:P36 compare equal."""
+    return format_a1(parse_a1(range_name))
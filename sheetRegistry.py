@@ -0,0 +1,221 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetRegistry.py -- spreadsheet ids, sheet gids & grid sizes of my Google Sheets, resolved once and cached on disk
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-21"
+__updated__ = "2025-08-06"
+
+import json
+import os
+import threading
+import time
+from sys import path
+from typing import NamedTuple, Optional
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import osp, lg, BASE_PYTHON_FOLDER
+from sheetRanges import GridBounds, parse_a1, format_a1
+
+REGISTRY_FILE:str = osp.join(BASE_PYTHON_FOLDER, "google" + osp.sep + "sheets" + osp.sep + "registry.json")
+# seconds before the sheet metadata of a spreadsheet is read again
+REGISTRY_MAX_AGE:float = 24 * 60 * 60.0
+# a range that fails the check is checked again with new metadata if the metadata is older than this
+REGISTRY_RECHECK_AGE:float = 60.0
+# only what the registry records
+METADATA_FIELDS:str = "spreadsheetId,properties.title,sheets.properties(sheetId,title,index,gridProperties(rowCount,columnCount))"
+
+
+class SheetInfo(NamedTuple):
+    title:str
+    gid:int
+    index:int
+    rows:int
+    cols:int
+
+
+class SpreadsheetInfo(NamedTuple):
+    spreadsheet_id:str
+    title:str
+    sheets:dict
+    # time.time() of the spreadsheets().get
+    stamp:float
+
+
+class RangeError(ValueError):
+    """A range that the server would reject: unknown sheet or outside the grid."""
+
+
+class SpreadsheetRegistry:
+    """
+    Map spreadsheet titles and id files to spreadsheet ids, and sheet titles to gids & grid sizes.
+    Filled by one field-masked spreadsheets().get per spreadsheet and saved in a json file with a time stamp.
+    """
+    def __init__(self, registry_file:Optional[str] = REGISTRY_FILE, max_age:float = REGISTRY_MAX_AGE,
+                 p_logger:lg.Logger = None):
+        """
+        :param registry_file: json file to keep the registry between runs; None to keep it in memory only
+        :param       max_age: seconds before the metadata of a spreadsheet is stale
+        """
+        self.registry_file = registry_file
+        self.max_age = max_age
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._ids = dict()
+        # modification time of each id file when its id was read
+        self._id_stamps = dict()
+        self._spreadsheets = dict()
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # persistence
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.registry_file or not osp.exists(self.registry_file):
+                return
+            try:
+                with open(self.registry_file) as rfp:
+                    saved = json.load(rfp)
+            except (OSError, ValueError) as lre:
+                self._lgr.warning(F"ignoring bad registry file '{self.registry_file}': {lre}")
+                return
+            self._ids.update(saved.get("ids", {}))
+            self._id_stamps.update(saved.get("id_stamps", {}))
+            for sid, info in saved.get("spreadsheets", {}).items():
+                sheets = {title: SheetInfo(title, *vals) for title, vals in info["sheets"].items()}
+                self._spreadsheets[sid] = SpreadsheetInfo(sid, info["title"], sheets, info["stamp"])
+
+    def save(self):
+        """Write the registry file atomically."""
+        if not self.registry_file:
+            return
+        with self._lock:
+            saved = {"ids": self._ids, "id_stamps": self._id_stamps,
+                     "spreadsheets": {sid: {"title": info.title, "stamp": info.stamp,
+                                            "sheets": {s.title: [s.gid, s.index, s.rows, s.cols] for s in info.sheets.values()}}
+                                      for sid, info in self._spreadsheets.items()}}
+            os.makedirs(osp.dirname(self.registry_file), exist_ok = True)
+            tmp_file = F"{self.registry_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as rfp:
+                json.dump(saved, rfp)
+            os.replace(tmp_file, self.registry_file)
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # spreadsheet ids
+
+    def register_id(self, name:str, spreadsheet_id:str):
+        """Record the id of a spreadsheet under a name, e.g. its title or the path of its id file."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._ids.get(name) != spreadsheet_id:
+                self._ids[name] = spreadsheet_id
+                self.save()
+
+    def id_for(self, name:str) -> Optional[str]:
+        """Spreadsheet id registered under the name, or for the spreadsheet with that title."""
+        self._ensure_loaded()
+        sid = self._ids.get(name)
+        if sid is None:
+            for info in list(self._spreadsheets.values()):
+                if info.title == name:
+                    return info.spreadsheet_id
+        return sid
+
+    def resolve_id_file(self, id_file:str) -> str:
+        """Spreadsheet id from the first line of an id file, which is read again only if the file was modified."""
+        sid = self.id_for(id_file)
+        try:
+            mtime = os.stat(id_file).st_mtime
+        except OSError:
+            if sid is None:
+                raise
+            self._lgr.warning(F"using the registered id: cannot read id file '{id_file}'")
+            return sid
+        if sid is None or self._id_stamps.get(id_file) != mtime:
+            with open(id_file) as ifp:
+                sid = ifp.readline().strip()
+            with self._lock:
+                self._ids[id_file] = sid
+                self._id_stamps[id_file] = mtime
+                self.save()
+        return sid
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # sheet metadata
+
+    def info(self, spreadsheet_id:str) -> Optional[SpreadsheetInfo]:
+        """Metadata of the spreadsheet, or None if it was never read."""
+        self._ensure_loaded()
+        return self._spreadsheets.get(spreadsheet_id)
+
+    def is_fresh(self, spreadsheet_id:str) -> bool:
+        info = self.info(spreadsheet_id)
+        return info is not None and time.time() - info.stamp < self.max_age
+
+    def refresh(self, spreadsheets, spreadsheet_id:str, execute = None) -> SpreadsheetInfo:
+        """
+        READ the metadata of a spreadsheet with a single field-masked spreadsheets().get
+        :param    spreadsheets: a service.spreadsheets() resource
+        :param         execute: runs the request, e.g. SheetsTransport.execute; default is request.execute()
+        """
+        request = spreadsheets.get(spreadsheetId = spreadsheet_id, fields = METADATA_FIELDS)
+        response = execute(request) if execute else request.execute()
+        sheets = dict()
+        for sheet in response.get("sheets", []):
+            props = sheet.get("properties", {})
+            grid = props.get("gridProperties", {})
+            sheets[props["title"]] = SheetInfo(props["title"], props.get("sheetId", 0), props.get("index", 0),
+                                               grid.get("rowCount", 0), grid.get("columnCount", 0))
+        info = SpreadsheetInfo(spreadsheet_id, response.get("properties", {}).get("title", ""), sheets, time.time())
+        self._ensure_loaded()
+        with self._lock:
+            self._spreadsheets[spreadsheet_id] = info
+            self.save()
+        self._lgr.info(F"registered {len(sheets)} sheets of '{info.title}'")
+        return info
+
+    def ensure(self, spreadsheets, spreadsheet_id:str, execute = None) -> SpreadsheetInfo:
+        """Metadata of the spreadsheet, read again only if missing or stale."""
+        if self.is_fresh(spreadsheet_id):
+            return self.info(spreadsheet_id)
+        return self.refresh(spreadsheets, spreadsheet_id, execute)
+
+    def gid(self, spreadsheet_id:str, sheet_title:str) -> Optional[int]:
+        info = self.info(spreadsheet_id)
+        sheet = info.sheets.get(sheet_title) if info else None
+        return sheet.gid if sheet else None
+
+    def check_range(self, spreadsheet_id:str, range_name:str):
+        """
+        Raise a RangeError if the range is NOT in a known sheet or NOT inside its grid.
+        Nothing is checked if the metadata of the spreadsheet is not in the registry.
+        """
+        self.check_bounds(spreadsheet_id, parse_a1(range_name))
+
+    def check_bounds(self, spreadsheet_id:str, bounds:GridBounds):
+        """Same as check_range() for parsed bounds."""
+        info = self.info(spreadsheet_id)
+        if info is None:
+            return
+        range_name = format_a1(bounds)
+        sheet = info.sheets.get(bounds.sheet)
+        if sheet is None:
+            raise RangeError(F"No sheet '{bounds.sheet}' in spreadsheet '{info.title}' for range '{range_name}'!")
+        if (bounds.end_row or 0) > sheet.rows or (bounds.end_col or 0) > sheet.cols:
+            raise RangeError(F"Range '{range_name}' exceeds the grid of sheet '{sheet.title}': "
+                             F"max rows = {sheet.rows}, max columns = {sheet.cols}!")
+# END class SpreadsheetRegistry
+
+
+# shared by all the MhsSheetAccess instances in the process
+REGISTRY = SpreadsheetRegistry()
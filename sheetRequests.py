@@ -0,0 +1,283 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetRequests.py -- compile A1 ranges to GridRanges and send queued sheet operations in as few batchUpdates as possible
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-08-05"
+__updated__ = "2025-08-06"
+
+from sys import path
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import lg
+from sheetRanges import GridBounds, parse_a1
+from sheetRegistry import SpreadsheetRegistry, RangeError, REGISTRY
+
+# operations sent with spreadsheets().values().batchUpdate
+VALUES:str = "values"
+# operations sent with spreadsheets().batchUpdate
+STRUCTURE:str = "structure"
+# footprint of an operation on every sheet, e.g. a findReplace in all sheets or a request of unknown effect
+ALL_SHEETS = GridBounds(None, None, None, None, None)
+
+
+def _touch(bounds1:GridBounds, bounds2:GridBounds) -> bool:
+    if bounds1.sheet is None or bounds2.sheet is None:
+        return True
+    return bounds1.overlaps(bounds2)
+
+
+def _any_touch(list1:list, list2:list) -> bool:
+    return any(_touch(b1, b2) for b1 in list1 for b2 in list2)
+
+
+def _paste_bounds(source:GridBounds, dest:GridBounds) -> GridBounds:
+    """Cells written by a paste of source at the top-left of dest: the size of source, or of dest if that is bigger."""
+    def span(src_start, src_end, dst_start, dst_end):
+        start = dst_start or 0
+        if src_end is None or dst_end is None:
+            return start, None
+        return start, max(dst_end, start + src_end - (src_start or 0))
+    rows = span(source.start_row, source.end_row, dest.start_row, dest.end_row)
+    cols = span(source.start_col, source.end_col, dest.start_col, dest.end_col)
+    return GridBounds(dest.sheet, rows[0], rows[1], cols[0], cols[1])
+
+
+class SheetOperation:
+    """A queued operation: how to build its request, and the cells it reads & writes, to order it with the others."""
+    __slots__ = ("kind", "build", "reads", "writes", "position")
+
+    def __init__(self, kind:str, build, reads:list, writes:list, position:int):
+        """
+        :param   kind: VALUES or STRUCTURE
+        :param  build: build(batch) -> value range or request, once the gids are known
+        :param  reads: GridBounds that the operation reads
+        :param writes: GridBounds that the operation changes
+        """
+        self.kind = kind
+        self.build = build
+        self.reads = reads
+        self.writes = writes
+        self.position = position
+
+    def depends_on(self, other:"SheetOperation") -> bool:
+        """Must this operation run after the other, queued before it?"""
+        return _any_touch(other.writes, self.reads + self.writes) or _any_touch(other.reads, self.writes)
+# END class SheetOperation
+
+
+class SheetRequestBatch:
+    """
+    Queue value writes and structural operations on A1 ranges of one spreadsheet, e.g.
+        batch = SheetRequestBatch(spreadsheet_id)
+        batch.copy_paste("'All Inc 1'!A68:Q76", "Calculations!A44")
+        batch.write("Calculations!P47", [["$7022.77"]])
+        batch.find_replace('X', 'Z')
+        result = batch.flush(service.spreadsheets())
+    then flush() them in as few batchUpdate calls as possible: an operation moves into an earlier call of the same kind
+    unless it reads or writes cells that an operation queued before it, and not yet sent, writes or reads.
+    """
+    def __init__(self, p_spreadsheet_id:str, p_registry:SpreadsheetRegistry = None, p_value_input:str = "USER_ENTERED",
+                 p_logger:lg.Logger = None):
+        """
+        :param       p_registry: sheet titles -> gids; default is the registry shared by the process
+        :param    p_value_input: valueInputOption of the value writes
+        """
+        self.spreadsheet_id = p_spreadsheet_id
+        self._registry = p_registry if p_registry else REGISTRY
+        self._value_input = p_value_input
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._ops = list()
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def clear(self):
+        self._ops.clear()
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # compile A1 ranges
+
+    def gid(self, sheet_title:str) -> int:
+        """Id of the sheet, from the cached metadata of the spreadsheet."""
+        gid = self._registry.gid(self.spreadsheet_id, sheet_title)
+        if gid is None:
+            raise RangeError(F"No sheet '{sheet_title}' known in spreadsheet '{self.spreadsheet_id}'!")
+        return gid
+
+    def grid_range(self, p_range:(str, GridBounds)) -> dict:
+        """GridRange of an A1 range, e.g. Calculations!P36:Q40 -> sheetId & ZERO-based, END-exclusive indices."""
+        bounds = parse_a1(p_range) if isinstance(p_range, str) else p_range
+        grid = {"sheetId": self.gid(bounds.sheet)}
+        for key, value in (("startRowIndex", bounds.start_row), ("endRowIndex", bounds.end_row),
+                           ("startColumnIndex", bounds.start_col), ("endColumnIndex", bounds.end_col)):
+            if value is not None:
+                grid[key] = value
+        return grid
+
+    def grid_coordinate(self, p_range:(str, GridBounds)) -> dict:
+        """GridCoordinate of the top-left cell of an A1 range."""
+        bounds = parse_a1(p_range) if isinstance(p_range, str) else p_range
+        return {"sheetId": self.gid(bounds.sheet), "rowIndex": bounds.start_row or 0, "columnIndex": bounds.start_col or 0}
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # queue operations
+
+    def _queue(self, kind:str, build, reads:list, writes:list) -> int:
+        self._ops.append(SheetOperation(kind, build, reads, writes, len(self._ops)))
+        return len(self._ops) - 1
+
+    def write(self, range_name:str, values:list, p_major_dim:str = "ROWS") -> int:
+        """
+        QUEUE a write of values to a range
+        :return: position of the operation, i.e. of its reply in the result of flush()
+        """
+        bounds = parse_a1(range_name)
+        rows = len(values)
+        cols = max((len(row) for row in values), default = 0)
+        if p_major_dim == "COLUMNS":
+            rows, cols = cols, rows
+        written = GridBounds(bounds.sheet, bounds.start_row or 0, (bounds.start_row or 0) + rows,
+                             bounds.start_col or 0, (bounds.start_col or 0) + cols)
+        entry = {"range": range_name, "majorDimension": p_major_dim, "values": values}
+        return self._queue(VALUES, lambda _: entry, [], [written])
+
+    def copy_paste(self, p_source:str, p_destination:str, p_paste_type:str = "PASTE_NORMAL",
+                   p_orientation:str = "NORMAL") -> int:
+        """QUEUE a copy of a range to another, or to the top-left cell of where to paste."""
+        source = parse_a1(p_source)
+        dest = parse_a1(p_destination)
+        return self._queue(STRUCTURE, lambda batch: {"copyPaste": {
+            "source": batch.grid_range(source), "destination": batch.grid_range(dest),
+            "pasteType": p_paste_type, "pasteOrientation": p_orientation}}, [source], [_paste_bounds(source, dest)])
+
+    def cut_paste(self, p_source:str, p_destination:str, p_paste_type:str = "PASTE_NORMAL") -> int:
+        """QUEUE a move of a range to the top-left cell of p_destination."""
+        source = parse_a1(p_source)
+        dest = parse_a1(p_destination)
+        return self._queue(STRUCTURE, lambda batch: {"cutPaste": {
+            "source": batch.grid_range(source), "destination": batch.grid_coordinate(dest), "pasteType": p_paste_type}},
+            [source], [source, _paste_bounds(source, GridBounds(dest.sheet, dest.start_row, None, dest.start_col, None))])
+
+    def find_replace(self, p_find:str, p_replacement:str, p_range:str = None, p_match_case:bool = False,
+                     p_entire_cell:bool = False, p_regex:bool = False, p_formulas:bool = False) -> int:
+        """
+        QUEUE a find & replace
+        :param p_range: A1 range or sheet title; default is all the sheets
+        """
+        bounds = parse_a1(p_range) if p_range else ALL_SHEETS
+
+        def build(batch:SheetRequestBatch) -> dict:
+            params = {"find": p_find, "replacement": p_replacement, "matchCase": p_match_case,
+                      "matchEntireCell": p_entire_cell, "searchByRegex": p_regex, "includeFormulas": p_formulas}
+            if bounds is ALL_SHEETS:
+                params["allSheets"] = True
+            elif bounds.start_row is None and bounds.end_row is None and bounds.start_col is None and bounds.end_col is None:
+                params["sheetId"] = batch.gid(bounds.sheet)
+            else:
+                params["range"] = batch.grid_range(bounds)
+            return {"findReplace": params}
+        return self._queue(STRUCTURE, build, [bounds], [bounds])
+
+    def add_request(self, p_request:dict, p_reads:list = None, p_writes:list = None) -> int:
+        """
+        QUEUE any spreadsheets().batchUpdate request
+        :param  p_reads: A1 ranges that the request reads
+        :param p_writes: A1 ranges that the request changes; default is every sheet, so it is never moved past another operation
+        """
+        reads = [parse_a1(rng) for rng in p_reads] if p_reads else []
+        writes = [parse_a1(rng) for rng in p_writes] if p_writes is not None else [ALL_SHEETS]
+        return self._queue(STRUCTURE, lambda _: p_request, reads, writes)
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # plan & send
+
+    def plan(self) -> list:
+        """
+        Group the queued operations into calls: each operation goes in the first call of its kind
+        after every call with an operation it depends on, or in the same call, after it, if that call is of its kind
+        :return: (kind, [SheetOperation]) of each call, in the order to send them
+        """
+        calls = list()
+        placed = dict()
+        for op in self._ops:
+            lowest = 0
+            for prior in self._ops[:op.position]:
+                if op.depends_on(prior):
+                    index = placed[prior.position]
+                    lowest = max(lowest, index if calls[index][0] == op.kind else index + 1)
+            for index in range(lowest, len(calls)):
+                if calls[index][0] == op.kind:
+                    break
+            else:
+                calls.append((op.kind, list()))
+                index = len(calls) - 1
+            calls[index][1].append(op)
+            placed[op.position] = index
+        return calls
+
+    def written_bounds(self) -> list:
+        """Bounds changed by the queued operations, with every sheet of the spreadsheet for those that can change any."""
+        info = self._registry.info(self.spreadsheet_id)
+        bounds = list()
+        for op in self._ops:
+            for written in op.writes:
+                if written.sheet is not None:
+                    bounds.append(written)
+                elif info is not None:
+                    bounds.extend(GridBounds(title, None, None, None, None) for title in info.sheets)
+        return bounds
+
+    def flush(self, spreadsheets, execute = None, execute_structure = None) -> dict:
+        """
+        SEND the queued operations and clear the queue; if a call fails, the operations of the calls before it,
+        which were applied, are removed from the queue and the others stay in it, with new positions
+        :param      spreadsheets: a service.spreadsheets() resource
+        :param           execute: runs each request, e.g. with the quota & retries; default is request.execute()
+        :param execute_structure: runs each spreadsheets().batchUpdate, which may NOT be idempotent, e.g. a cutPaste,
+                                  so should only be retried when throttled; default is execute
+        :return: number of "calls" and a "replies" list with the reply to each operation, by position in the queue
+        """
+        run = execute if execute else (lambda req: req.execute())
+        run_structure = execute_structure if execute_structure else run
+        self._registry.ensure(spreadsheets, self.spreadsheet_id, run)
+        for op in self._ops:
+            for bounds in op.reads + op.writes:
+                if bounds.sheet is not None:
+                    self._registry.check_bounds(self.spreadsheet_id, bounds)
+        calls = self.plan()
+        # compile everything first: a bad sheet title sends nothing
+        bodies = [[op.build(self) for op in ops] for _, ops in calls]
+
+        replies = [None] * len(self._ops)
+        sent = set()
+        try:
+            for (kind, ops), items in zip(calls, bodies):
+                if kind == VALUES:
+                    response = run(spreadsheets.values().batchUpdate(spreadsheetId = self.spreadsheet_id, body = {
+                        "valueInputOption": self._value_input, "data": items}))
+                    results = response.get("responses", [])
+                else:
+                    response = run_structure(spreadsheets.batchUpdate(spreadsheetId = self.spreadsheet_id, body = {"requests": items}))
+                    results = response.get("replies", [])
+                for op, result in zip(ops, results):
+                    replies[op.position] = result
+                sent.update(op.position for op in ops)
+        except Exception:
+            # the calls already sent must NOT be sent again by the next flush(): only the others stay queued
+            self._ops = [op for op in self._ops if op.position not in sent]
+            for position, op in enumerate(self._ops):
+                op.position = position
+            self._lgr.error(F"{len(sent)} operations sent to '{self.spreadsheet_id}' before a call FAILED: "
+                            F"{len(self._ops)} stay queued.")
+            raise
+        self._lgr.info(F"{len(self._ops)} operations sent to '{self.spreadsheet_id}' in {len(calls)} call(s): "
+                       F"{[(kind, len(ops)) for kind, ops in calls]}")
+        self._ops.clear()
+        return {"spreadsheetId": self.spreadsheet_id, "calls": len(calls), "replies": replies}
+
+# END class SheetRequestBatch
@@ -0,0 +1,147 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetServices.py -- process-wide registry of Google API service objects, built from cached discovery documents
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-19"
+__updated__ = "2025-07-19"
+
+import json
+import os
+import threading
+from sys import path
+from googleapiclient.discovery import build_from_document, DISCOVERY_URI, V2_DISCOVERY_URI
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.version import __version__ as CLIENT_VERSION
+from httplib2 import Http
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import osp, lg, BASE_PYTHON_FOLDER
+
+DISCOVERY_CACHE_DIR:str = osp.join(BASE_PYTHON_FOLDER, "google" + osp.sep + "sheets" + osp.sep + "discovery")
+
+
+def credentials_key(creds) -> tuple:
+    """Same key for credentials of the same authorized user, even if loaded or refreshed separately."""
+    refresh_token = getattr(creds, "refresh_token", None)
+    if refresh_token:
+        return type(creds).__name__, getattr(creds, "client_id", None), refresh_token
+    return type(creds).__name__, id(creds)
+
+
+class ServiceRegistry:
+    """
+    Build each (api, version, credentials) service ONCE and re-use it.
+    Discovery documents are parsed once per process and kept on disk by client library version.
+    """
+    def __init__(self, cache_dir:str = DISCOVERY_CACHE_DIR, p_logger:lg.Logger = None):
+        self.cache_dir = cache_dir
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._documents = dict()
+        self._services = dict()
+        self._collections = dict()
+        self._lock = threading.Lock()
+
+    def document_file(self, api:str, version:str) -> str:
+        return osp.join(self.cache_dir, F"{api}.{version}.{CLIENT_VERSION}.json")
+
+    def get_document(self, api:str, version:str) -> dict:
+        """Discovery document from memory, else the disk cache, else the client library or the discovery service."""
+        with self._lock:
+            doc = self._documents.get((api, version))
+            if doc is None:
+                doc = self._load_document(api, version)
+                self._documents[(api, version)] = doc
+            return doc
+
+    def _load_document(self, api:str, version:str) -> dict:
+        doc_file = self.document_file(api, version)
+        if osp.exists(doc_file):
+            try:
+                with open(doc_file) as dfp:
+                    return json.load(dfp)
+            except (OSError, ValueError) as lde:
+                self._lgr.warning(F"discarding bad discovery cache file '{doc_file}': {lde}")
+
+        content = get_static_doc(api, version)
+        if content is None:
+            content = self._fetch_document(api, version)
+        doc = json.loads(content)
+
+        # save atomically: another process may be reading the same file
+        try:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            tmp_file = F"{doc_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as dfp:
+                dfp.write(content)
+            os.replace(tmp_file, doc_file)
+            self._lgr.info(F"saved '{api}' '{version}' discovery document revision {doc.get('revision')} to '{doc_file}'")
+        except OSError as sde:
+            self._lgr.warning(F"could not save discovery document to '{doc_file}': {sde}")
+        return doc
+
+    @staticmethod
+    def _fetch_document(api:str, version:str) -> str:
+        http = Http()
+        for uri in (DISCOVERY_URI, V2_DISCOVERY_URI):
+            resp, content = http.request(uri.format(api = api, apiVersion = version))
+            if resp.status < 400:
+                return content.decode("utf-8") if isinstance(content, bytes) else content
+        raise ValueError(F"No discovery document for api '{api}' version '{version}'!")
+
+    def get_service(self, api:str, version:str, credentials):
+        """The service for the api, version & credentials, built on first use."""
+        key = (api, version, credentials_key(credentials))
+        service = self._services.get(key)
+        if service is None:
+            doc = self.get_document(api, version)
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    service = build_from_document(doc, credentials = credentials)
+                    self._services[key] = service
+                    self._lgr.info(F"built '{api}' '{version}' service")
+        return service
+
+    def get_collection(self, api:str, version:str, credentials, name:str):
+        """
+        A top-level collection of the service, e.g. service.spreadsheets(), also built once:
+        making the resource object for a collection parses its part of the discovery document again.
+        """
+        key = (api, version, credentials_key(credentials), name)
+        collection = self._collections.get(key)
+        if collection is None:
+            service = self.get_service(api, version, credentials)
+            with self._lock:
+                collection = self._collections.get(key)
+                if collection is None:
+                    collection = getattr(service, name)()
+                    self._collections[key] = collection
+        return collection
+
+    def clear(self, p_documents:bool = True):
+        """Forget the services and, optionally, the parsed documents; the disk cache is kept."""
+        with self._lock:
+            self._services.clear()
+            self._collections.clear()
+            if p_documents:
+                self._documents.clear()
+# END class ServiceRegistry
+
+
+# shared by all the MhsSheetAccess instances in the process
+SERVICES = ServiceRegistry()
+
+
+def get_service(api:str, version:str, credentials):
+    """Get a service from the process-wide registry, e.g. get_service("sheets", "v4", creds)."""
+    return SERVICES.get_service(api, version, credentials)
+
+
+def get_collection(api:str, version:str, credentials, name:str):
+    """Get a collection from the process-wide registry, e.g. get_collection("sheets", "v4", creds, "spreadsheets")."""
+    return SERVICES.get_collection(api, version, credentials, name)
@@ -0,0 +1,169 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetShadow.py -- local copy of the last known values of my Google Sheets cells, to send only the changes
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-16"
+__updated__ = "2025-08-05"
+
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from sheetRanges import parse_a1, GridBounds
+from sheetBatch import cell_of
+
+
+def normalize_value(val) -> str:
+    """
+    Comparison key for a cell value: numbers, numeric strings & Decimals all go through Decimal,
+    as fill_cell() does with to_eng_string(), so e.g. Decimal('12.50'), '12.5' and 12.5 are the same value.
+    """
+    if val is None:
+        return ""
+    if isinstance(val, bool):
+        return "TRUE" if val else "FALSE"
+    if isinstance(val, Decimal):
+        num = val
+    elif isinstance(val, (int, float)):
+        num = Decimal(str(val))
+    else:
+        try:
+            num = Decimal(str(val).strip())
+        except InvalidOperation:
+            return str(val)
+    if not num.is_finite():
+        return str(val)
+    return num.normalize().to_eng_string()
+
+
+class SheetShadow:
+    """The last known value of each cell, by (sheet, ZERO-based row, ZERO-based col)."""
+    def __init__(self):
+        self._cells = dict()
+        self.stamp = None
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def matches(self, sheet:str, row:int, col:int, val) -> bool:
+        """Is the cell already known to hold this value?"""
+        known = self._cells.get((sheet, row, col))
+        return known is not None and known == normalize_value(val)
+
+    def update(self, sheet:str, row:int, col:int, val):
+        self._cells[(sheet, row, col)] = normalize_value(val)
+
+    def forget(self, bounds:GridBounds) -> int:
+        """Drop the known values of the cells in bounds, e.g. after a paste whose values are not known; return the number dropped."""
+        stale = [key for key in self._cells if key[0] == bounds.sheet and bounds.contains(key[1], key[2])]
+        for key in stale:
+            del self._cells[key]
+        return len(stale)
+
+    def update_range(self, range_name:str, values:list, major_dimension:str = "ROWS", p_fill_empty:bool = False):
+        """
+        Record the values of a range that was read or written
+        :param    p_fill_empty: record the cells of a closed range that are missing from values as empty,
+                                e.g. after a read, where the server drops trailing empty cells
+        """
+        bounds = parse_a1(range_name)
+        row0 = bounds.start_row or 0
+        col0 = bounds.start_col or 0
+        if major_dimension == "COLUMNS":
+            height = max(map(len, values), default = 0)
+            values = [[col[r] if r < len(col) else None for col in values] for r in range(height)]
+        for r, row in enumerate(values):
+            for c, val in enumerate(row):
+                # null values are skipped by the server
+                if val is not None:
+                    self._cells[(bounds.sheet, row0 + r, col0 + c)] = normalize_value(val)
+        if p_fill_empty and None not in bounds:
+            for r in range(bounds.start_row, bounds.end_row):
+                for c in range(bounds.start_col, bounds.end_col):
+                    self._cells.setdefault((bounds.sheet, r, c), "")
+        self.stamp = time.time()
+
+    def filter_unchanged(self, data:list) -> (list, int):
+        """
+        Drop the single-cell value ranges that would not change the sheet
+        :param data: value ranges in the order they will be sent
+        :return: the value ranges to send & the number of cells dropped
+        """
+        # a cell filled again later, with no other kind of range in between, only needs its last value
+        keep = set()
+        last = dict()
+        for index, entry in enumerate(data):
+            cell = cell_of(entry)
+            if cell:
+                last[cell[:3]] = index
+            else:
+                keep.update(last.values())
+                last.clear()
+        keep.update(last.values())
+
+        # compare with the values the sheet will have when each range is applied
+        pending = dict()
+        result = list()
+        dropped = 0
+        for index, entry in enumerate(data):
+            cell = cell_of(entry)
+            if not cell:
+                result.append(entry)
+                # NOT tracked cell by cell: forget about these cells until the next read or send
+                pending.update((key, None) for key in self._cells_in(entry))
+                continue
+            key = cell[:3]
+            known = pending[key] if key in pending else self._cells.get(key)
+            value = normalize_value(cell[3])
+            if index not in keep or known == value:
+                dropped += 1
+                continue
+            pending[key] = value
+            result.append(entry)
+        return result, dropped
+
+    @staticmethod
+    def _cells_in(entry:dict) -> list:
+        try:
+            bounds = parse_a1(entry["range"])
+        except (KeyError, ValueError):
+            return []
+        values = entry.get("values", [])
+        if entry.get("majorDimension", "ROWS") == "COLUMNS":
+            height, width = max(map(len, values), default = 0), len(values)
+        else:
+            height, width = len(values), max(map(len, values), default = 0)
+        row0 = bounds.start_row or 0
+        col0 = bounds.start_col or 0
+        return [(bounds.sheet, row0 + r, col0 + c) for r in range(height) for c in range(width)]
+
+    def seed(self, value_ranges:list):
+        """Record the value ranges from a values().batchGet response."""
+        for vrange in value_ranges:
+            self.update_range(vrange["range"], vrange.get("values", []), vrange.get("majorDimension", "ROWS"), True)
+
+    def save(self, snapshot_file:str):
+        """Write the known values to a json file, atomically so a failed write never leaves a partial snapshot."""
+        sheets = dict()
+        for (sheet, row, col), val in self._cells.items():
+            sheets.setdefault(sheet, list()).append([row, col, val])
+        tmp_file = snapshot_file + ".tmp"
+        with open(tmp_file, "w") as sfp:
+            json.dump({"stamp": self.stamp, "cells": sheets}, sfp)
+        os.replace(tmp_file, snapshot_file)
+
+    def load(self, snapshot_file:str):
+        """Add the known values from a json file made by save()."""
+        with open(snapshot_file) as sfp:
+            snapshot = json.load(sfp)
+        for sheet, cells in snapshot.get("cells", {}).items():
+            for row, col, val in cells:
+                self._cells[(sheet, row, col)] = val
+        self.stamp = snapshot.get("stamp")
+# END class SheetShadow
@@ -0,0 +1,187 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetStats.py -- latency & size histograms of the phases of MhsSheetAccess sessions, with an optional metrics file
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-30"
+__updated__ = "2025-07-30"
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from sys import path
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import get_current_time, osp, lg
+
+# phases timed by MhsSheetAccess, in seconds
+PHASE_CREDENTIALS:str = "credentials"
+PHASE_BUILD:str       = "build"
+PHASE_SESSION:str     = "session_open"
+PHASE_BUDGET_ID:str   = "budget_id"
+PHASE_BODY:str        = "build_body"
+PHASE_EXECUTE:str     = "execute"
+PHASE_LOCK_WAIT:str   = "lock_wait"
+PHASE_LOCK_HOLD:str   = "lock_hold"
+# sizes of each request
+REQUEST_CELLS:str = "request_cells"
+REQUEST_BYTES:str = "request_bytes"
+
+# upper bounds of the histogram buckets: doubling from 1 microsecond to about 12 days, or from 1 cell/byte up
+SECONDS_BOUNDS:list = [1e-6 * 2 ** i for i in range(40)]
+COUNT_BOUNDS:list   = [float(2 ** i) for i in range(40)]
+STATS_DUMP_INTERVAL:float = 60.0
+
+
+class Histogram:
+    """Count, total, min, max and a count for each bucket, so percentiles can be estimated within a factor of 2."""
+    def __init__(self, bounds:list):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value:float):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, fraction:float) -> float:
+        """Upper bound of the bucket with the value at this fraction of the count, but never more than the max."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, num in enumerate(self.buckets):
+            seen += num
+            if seen >= rank and num:
+                return min(self.bounds[index] if index < len(self.bounds) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else None,
+                "min": self.min, "max": self.max,
+                "p50": self.percentile(0.5), "p90": self.percentile(0.9), "p99": self.percentile(0.99)}
+# END class Histogram
+
+
+class _NullTimer:
+    """Used when the stats are disabled: costs one method call and nothing else."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("_stats", "_name", "_start")
+
+    def __init__(self, stats:"SheetStats", name:str):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self._stats.record(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class SheetStats:
+    """
+    A histogram for each phase or size, by name; may be shared by several MhsSheetAccess instances and threads.
+    When disabled, timer() returns NULL_TIMER and record() returns at once.
+    """
+    def __init__(self, p_enabled:bool = True, p_dump_file:str = None, p_dump_interval:float = STATS_DUMP_INTERVAL,
+                 p_logger:lg.Logger = None):
+        """
+        :param       p_enabled: False to record nothing
+        :param     p_dump_file: json file to write the stats to every p_dump_interval seconds, in a background thread
+        :param p_dump_interval: seconds between writes of p_dump_file
+        """
+        self.enabled = p_enabled
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._histograms = dict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._dumper = None
+        if p_enabled and p_dump_file:
+            self.start_dump(p_dump_file, p_dump_interval)
+
+    def timer(self, name:str):
+        """Context manager that records the seconds spent in its block under name."""
+        return _Timer(self, name) if self.enabled else NULL_TIMER
+
+    def record(self, name:str, value:float):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram(SECONDS_BOUNDS if name not in (REQUEST_CELLS, REQUEST_BYTES)
+                                                          else COUNT_BOUNDS)
+            hist.add(value)
+
+    def stats(self) -> dict:
+        """Summary of each histogram: count, total, mean, min, max & percentiles."""
+        with self._lock:
+            return {name: hist.summary() for name, hist in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def dump(self, p_file:str):
+        """Write the stats to a json file, atomically."""
+        tmp_file = F"{p_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as sfp:
+            json.dump({"time": get_current_time(), "stats": self.stats()}, sfp, indent = 1)
+        os.replace(tmp_file, p_file)
+
+    def start_dump(self, p_file:str, p_interval:float = STATS_DUMP_INTERVAL):
+        """Write the stats to p_file every p_interval seconds until close()."""
+        if self._dumper:
+            return
+        folder = osp.dirname(p_file)
+        if folder:
+            os.makedirs(folder, exist_ok = True)
+
+        def run():
+            while not self._stop.wait(p_interval):
+                try:
+                    self.dump(p_file)
+                except OSError as sde:
+                    self._lgr.warning(F"could not write the stats to '{p_file}': {sde}")
+            # the last stats, at close()
+            self.dump(p_file)
+
+        self._dumper = threading.Thread(target = run, name = "stats-dump", daemon = True)
+        self._dumper.start()
+
+    def close(self):
+        """Stop the periodic dump, after a last write of the file."""
+        if self._dumper:
+            self._stop.set()
+            self._dumper.join()
+            self._dumper = None
+# END class SheetStats
@@ -0,0 +1,432 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetTransport.py -- pluggable transports for MhsSheetAccess, including an in-process fake Sheets v4 backend
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-14"
+__updated__ = "2025-08-06"
+
+import copy
+import json
+import random
+import threading
+import time
+from collections import Counter
+from sheetRanges import GridBounds, parse_a1, format_a1
+
+# the real API rejects request bodies larger than this
+DEFAULT_MAX_PAYLOAD_BYTES:int = 10 * 1024 * 1024
+# size of a new sheet in a new Google spreadsheet
+DEFAULT_ROW_COUNT:int = 1000
+DEFAULT_COL_COUNT:int = 26
+
+
+class SheetsTransport:
+    """
+    Supply the Sheets v4 'spreadsheets' resource for a session and execute the requests made with it.
+    Subclasses MUST implement spreadsheets(); execute() may be overridden to customize the http handling.
+    """
+    def spreadsheets(self):
+        """Return an object with the same interface as service.spreadsheets() from googleapiclient."""
+        raise NotImplementedError
+
+    def execute(self, request):
+        """Run a request made from the spreadsheets() resource and return the parsed response."""
+        return request.execute()
+# END class SheetsTransport
+
+
+class ErrorResponse:
+    """Mimic the httplib2 response attached to a googleapiclient HttpError: the status & headers of a failed request."""
+    def __init__(self, status:int, headers:dict = None):
+        self.status = status
+        self.reason = FakeHttpError.REASONS.get(status, "Error")
+        self._headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+    def get(self, key:str, default = None):
+        return self._headers.get(key.lower(), default)
+
+    def __getitem__(self, key:str):
+        return self._headers[key.lower()]
+
+    @property
+    def headers(self) -> dict:
+        return dict(self._headers)
+
+
+class FakeHttpError(Exception):
+    """Raised by the fake backend; has the same status attributes as googleapiclient.errors.HttpError."""
+    REASONS = {400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 429: "Too Many Requests",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+    def __init__(self, status:int, message:str = "", headers:dict = None):
+        self.resp = ErrorResponse(status, headers)
+        self.status_code = status
+        self.reason = message or self.resp.reason
+        super().__init__(F"<FakeHttpError {status}: {self.reason}>")
+
+
+class _FakeSheet:
+    """One sheet of a fake spreadsheet: cells stored sparsely by ZERO-based (row, col)."""
+    def __init__(self, sheet_id:int, title:str, index:int, rows:int, cols:int):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.rows = rows
+        self.cols = cols
+        self.cells = dict()
+
+    def properties(self) -> dict:
+        return {"sheetId": self.sheet_id, "title": self.title, "index": self.index, "sheetType": "GRID",
+                "gridProperties": {"rowCount": self.rows, "columnCount": self.cols}}
+
+
+class FakeSheetsBackend:
+    """
+    In-memory Google spreadsheets with the behaviour of the Sheets v4 API that MhsSheetAccess relies on.
+    Adjustable latency, payload limit and injected http errors so sessions can be profiled without a network.
+    """
+    def __init__(self, latency:float = 0.0, latency_per_kb:float = 0.0, max_payload_bytes:int = DEFAULT_MAX_PAYLOAD_BYTES,
+                 error_rate:float = 0.0, error_statuses:tuple = (429, 500), seed:int = None):
+        """
+        :param           latency: seconds added to every request
+        :param    latency_per_kb: seconds added for each KB of request body
+        :param max_payload_bytes: larger request bodies are rejected with a 413
+        :param        error_rate: fraction of requests that fail at random with one of error_statuses
+        :param    error_statuses: http statuses used for random errors
+        :param              seed: for a repeatable sequence of random errors
+        """
+        self.latency = latency
+        self.latency_per_kb = latency_per_kb
+        self.max_payload_bytes = max_payload_bytes
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.calls = Counter()
+        self.bytes_received = 0
+        self._spreadsheets = dict()
+        self._titles = dict()
+        self._errors = list()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # set up the fake data
+
+    def add_sheet(self, spreadsheet_id:str, title:str, rows:int = DEFAULT_ROW_COUNT, cols:int = DEFAULT_COL_COUNT) -> int:
+        """Create a sheet in the spreadsheet, creating the spreadsheet if needed; return the new sheet id."""
+        with self._lock:
+            return self._add_sheet(spreadsheet_id, title, rows, cols).sheet_id
+
+    def _add_sheet(self, spreadsheet_id:str, title:str, rows:int, cols:int) -> _FakeSheet:
+        sheets = self._spreadsheets.setdefault(spreadsheet_id, dict())
+        if title in sheets:
+            raise FakeHttpError(400, F"A sheet with the name \"{title}\" already exists.")
+        sheet = _FakeSheet(len(sheets) * 1000 + 1, title, len(sheets), rows, cols)
+        sheets[title] = sheet
+        return sheet
+
+    def set_title(self, spreadsheet_id:str, title:str):
+        with self._lock:
+            self._titles[spreadsheet_id] = title
+
+    def inject_error(self, status:int, count:int = 1, retry_after:float = None):
+        """The next 'count' requests fail with the given http status, optionally with a Retry-After header."""
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+        with self._lock:
+            self._errors.extend([(status, headers)] * count)
+
+    def get_cell(self, spreadsheet_id:str, sheet:str, row:int, col:int):
+        """Value of a ZERO-based cell, or None if it was never filled."""
+        return self._spreadsheets[spreadsheet_id][sheet].cells.get((row, col))
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes_received = 0
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # request handling
+
+    def call(self, method:str, spreadsheet_id:str, body:dict, handler, *args):
+        """Apply latency, payload limit and injected errors, then run handler(*args) under the backend lock."""
+        delay, error = self.admit(method, body)
+        if delay > 0:
+            time.sleep(delay)
+        return self.apply(error, spreadsheet_id, handler, *args)
+
+    def admit(self, method:str, body:dict) -> (float, FakeHttpError):
+        """
+        Count a request and decide its fate WITHOUT waiting, so an async server can do the waiting itself
+        :return: seconds of latency, and the error to raise afterwards or None
+        """
+        size = len(json.dumps(body)) if body is not None else 0
+        with self._lock:
+            self.calls[method] += 1
+            self.bytes_received += size
+            error = self._errors.pop(0) if self._errors else None
+            if not error and self.error_rate and self._random.random() < self.error_rate:
+                error = (self._random.choice(self.error_statuses), None)
+        if error:
+            error = FakeHttpError(error[0], headers = error[1])
+        elif size > self.max_payload_bytes:
+            error = FakeHttpError(413, F"Request payload size exceeds the limit: {self.max_payload_bytes} bytes.")
+        return self.latency + self.latency_per_kb * size / 1024, error
+
+    def apply(self, error:FakeHttpError, spreadsheet_id:str, handler, *args):
+        """Raise the error from admit(), if any, else run handler(*args) under the backend lock."""
+        if error:
+            raise error
+        with self._lock:
+            if spreadsheet_id not in self._spreadsheets:
+                raise FakeHttpError(404, "Requested entity was not found.")
+            return handler(self._spreadsheets[spreadsheet_id], *args)
+
+    @staticmethod
+    def _sheet(sheets:dict, bounds:GridBounds) -> _FakeSheet:
+        sheet = sheets.get(bounds.sheet)
+        if sheet is None:
+            raise FakeHttpError(400, F"Unable to parse range: {format_a1(bounds, True)}")
+        return sheet
+
+    @staticmethod
+    def _check_grid(sheet:_FakeSheet, bounds:GridBounds):
+        if (bounds.end_row or 0) > sheet.rows or (bounds.end_col or 0) > sheet.cols:
+            raise FakeHttpError(400, F"Range ({format_a1(bounds, True)}) exceeds grid limits. "
+                                     F"Max rows: {sheet.rows}, max columns: {sheet.cols}")
+
+    def read_range(self, sheets:dict, range_name:str, major_dimension:str = "ROWS") -> dict:
+        bounds = parse_a1(range_name)
+        sheet = self._sheet(sheets, bounds)
+        self._check_grid(sheet, bounds)
+        row0 = bounds.start_row or 0
+        col0 = bounds.start_col or 0
+        row_end = sheet.rows if bounds.end_row is None else bounds.end_row
+        col_end = sheet.cols if bounds.end_col is None else bounds.end_col
+        grid = [[sheet.cells.get((r, c), "") for c in range(col0, col_end)] for r in range(row0, row_end)]
+        if major_dimension == "COLUMNS":
+            grid = [list(col) for col in zip(*grid)]
+        # like the real API: drop trailing empty cells and rows
+        values = list()
+        for line in grid:
+            while line and line[-1] == "":
+                line.pop()
+            values.append(line)
+        while values and not values[-1]:
+            values.pop()
+        result = {"range": format_a1(GridBounds(bounds.sheet, row0, row_end, col0, col_end), True),
+                  "majorDimension": major_dimension}
+        if values:
+            result["values"] = values
+        return result
+
+    def _write_target(self, sheets:dict, range_name:str, values:list, major_dimension:str) -> (_FakeSheet, GridBounds, list):
+        """Sheet, bounds & rows of values of a write, checked against the grid."""
+        bounds = parse_a1(range_name)
+        sheet = self._sheet(sheets, bounds)
+        if major_dimension == "COLUMNS":
+            height = max(map(len, values), default = 0)
+            values = [[col[r] if r < len(col) else None for col in values] for r in range(height)]
+        row0 = bounds.start_row or 0
+        col0 = bounds.start_col or 0
+        width = max((len(row) for row in values), default = 0)
+        written = GridBounds(bounds.sheet, row0, row0 + len(values), col0, col0 + width)
+        self._check_grid(sheet, written)
+        return sheet, written, values
+
+    def write_range(self, sheets:dict, range_name:str, values:list, major_dimension:str = "ROWS") -> dict:
+        sheet, written, values = self._write_target(sheets, range_name, values, major_dimension)
+        row0, col0 = written.start_row, written.start_col
+        height = written.end_row - row0
+        width = written.end_col - col0
+        updated = 0
+        for r, row in enumerate(values):
+            for c, val in enumerate(row):
+                # null values are skipped, as in the real API
+                if val is None:
+                    continue
+                sheet.cells[(row0 + r, col0 + c)] = val if isinstance(val, str) else str(val)
+                updated += 1
+        return {"updatedRange": format_a1(GridBounds(written.sheet, row0, row0 + max(height, 1), col0, col0 + max(width, 1)), True),
+                "updatedRows": height, "updatedColumns": width, "updatedCells": updated}
+
+    def metadata(self, sheets:dict, spreadsheet_id:str) -> dict:
+        return {"spreadsheetId": spreadsheet_id, "properties": {"title": self._titles.get(spreadsheet_id, spreadsheet_id)},
+                "sheets": [{"properties": sheet.properties()} for sheet in sorted(sheets.values(), key = lambda sh: sh.index)]}
+
+    def batch_update_values(self, sheets:dict, spreadsheet_id:str, body:dict) -> dict:
+        # validate everything first, sheets & grid limits: the real API applies all of the data or none of it
+        for item in body.get("data", []):
+            self._write_target(sheets, item["range"], item.get("values", []), item.get("majorDimension", "ROWS"))
+        responses = [dict(self.write_range(sheets, item["range"], item.get("values", []), item.get("majorDimension", "ROWS")),
+                          spreadsheetId = spreadsheet_id) for item in body.get("data", [])]
+        return {"spreadsheetId": spreadsheet_id,
+                "totalUpdatedRows": sum(r["updatedRows"] for r in responses),
+                "totalUpdatedColumns": max((r["updatedColumns"] for r in responses), default = 0),
+                "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+                "totalUpdatedSheets": len({parse_a1(r["updatedRange"]).sheet for r in responses}),
+                "responses": responses}
+
+    def batch_update(self, sheets:dict, spreadsheet_id:str, body:dict) -> dict:
+        """All the requests are applied, or none, as by the server: they work on a copy that replaces the sheets at the end."""
+        work = copy.deepcopy(sheets)
+        # addSheet adds to the spreadsheet itself
+        self._spreadsheets[spreadsheet_id] = work
+        try:
+            replies = list()
+            for request in body.get("requests", []):
+                (kind, params), = request.items()
+                handler = getattr(self, "_req_" + kind, None)
+                if handler is None:
+                    raise FakeHttpError(400, F"Request type '{kind}' is not supported by the fake backend.")
+                replies.append(handler(work, spreadsheet_id, params))
+            sheets.clear()
+            sheets.update(work)
+        finally:
+            self._spreadsheets[spreadsheet_id] = sheets
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # spreadsheets().batchUpdate() request types
+
+    @staticmethod
+    def _sheet_by_id(sheets:dict, sheet_id:int) -> _FakeSheet:
+        for sheet in sheets.values():
+            if sheet.sheet_id == sheet_id:
+                return sheet
+        raise FakeHttpError(400, F"No grid with id: {sheet_id}")
+
+    def _grid_cells(self, sheets:dict, grid_range:dict) -> (_FakeSheet, range, range):
+        sheet = self._sheet_by_id(sheets, grid_range.get("sheetId", 0))
+        rows = range(grid_range.get("startRowIndex", 0), grid_range.get("endRowIndex", sheet.rows))
+        cols = range(grid_range.get("startColumnIndex", 0), grid_range.get("endColumnIndex", sheet.cols))
+        return sheet, rows, cols
+
+    def _req_addSheet(self, sheets:dict, spreadsheet_id:str, params:dict) -> dict:
+        props = params.get("properties", {})
+        grid = props.get("gridProperties", {})
+        sheet = self._add_sheet(spreadsheet_id, props.get("title", F"Sheet{len(sheets) + 1}"),
+                                grid.get("rowCount", DEFAULT_ROW_COUNT), grid.get("columnCount", DEFAULT_COL_COUNT))
+        if "sheetId" in props:
+            sheet.sheet_id = props["sheetId"]
+        return {"addSheet": {"properties": sheet.properties()}}
+
+    def _req_updateSpreadsheetProperties(self, *_) -> dict:
+        return {}
+
+    def _req_copyPaste(self, sheets:dict, _, params:dict) -> dict:
+        self._paste(sheets, params["source"], params["destination"], p_cut = False)
+        return {}
+
+    def _req_cutPaste(self, sheets:dict, _, params:dict) -> dict:
+        dest = params["destination"]
+        self._paste(sheets, params["source"], {"sheetId": dest.get("sheetId", 0), "startRowIndex": dest.get("rowIndex", 0),
+                                               "startColumnIndex": dest.get("columnIndex", 0)}, p_cut = True)
+        return {}
+
+    def _paste(self, sheets:dict, source:dict, dest:dict, p_cut:bool):
+        src_sheet, rows, cols = self._grid_cells(sheets, source)
+        dst_sheet = self._sheet_by_id(sheets, dest.get("sheetId", 0))
+        row0 = dest.get("startRowIndex", 0)
+        col0 = dest.get("startColumnIndex", 0)
+        block = {(r - rows.start, c - cols.start): src_sheet.cells.get((r, c)) for r in rows for c in cols}
+        if p_cut:
+            for r in rows:
+                for c in cols:
+                    src_sheet.cells.pop((r, c), None)
+        for (r, c), val in block.items():
+            if val is None:
+                dst_sheet.cells.pop((row0 + r, col0 + c), None)
+            else:
+                dst_sheet.cells[(row0 + r, col0 + c)] = val
+
+    def _req_findReplace(self, sheets:dict, _, params:dict) -> dict:
+        find = params["find"]
+        replacement = params.get("replacement", "")
+        if params.get("allSheets"):
+            targets = [(sheet, None, None) for sheet in sheets.values()]
+        elif "range" in params:
+            # only the cells inside the bounds of the GridRange
+            targets = [self._grid_cells(sheets, params["range"])]
+        else:
+            targets = [(self._sheet_by_id(sheets, params.get("sheetId", 0)), None, None)]
+        changed = 0
+        for sheet, rows, cols in targets:
+            for (row, col), val in list(sheet.cells.items()):
+                if rows is not None and (row not in rows or col not in cols):
+                    continue
+                if find in val:
+                    changed += val.count(find)
+                    sheet.cells[(row, col)] = val.replace(find, replacement)
+        return {"findReplace": {"occurrencesChanged": changed}}
+# END class FakeSheetsBackend
+
+
+class _FakeRequest:
+    """Deferred call, like a googleapiclient HttpRequest: nothing happens until execute()."""
+    def __init__(self, backend:FakeSheetsBackend, method:str, spreadsheet_id:str, body:dict, handler, *args):
+        self.backend = backend
+        self.method = method
+        self.spreadsheet_id = spreadsheet_id
+        self.body = body
+        self._handler = handler
+        self._args = args
+
+    def execute(self, **_):
+        return self.backend.call(self.method, self.spreadsheet_id, self.body, self._handler, *self._args)
+
+
+class _FakeValues:
+    """Fake of service.spreadsheets().values()"""
+    def __init__(self, backend:FakeSheetsBackend):
+        self._backend = backend
+
+    def get(self, spreadsheetId:str, range:str, majorDimension:str = "ROWS", **_) -> _FakeRequest:
+        return _FakeRequest(self._backend, "values.get", spreadsheetId, None,
+                            lambda sheets: self._backend.read_range(sheets, range, majorDimension))
+
+    def batchGet(self, spreadsheetId:str, ranges:list, majorDimension:str = "ROWS", **_) -> _FakeRequest:
+        ranges = [ranges] if isinstance(ranges, str) else list(ranges)
+        return _FakeRequest(self._backend, "values.batchGet", spreadsheetId, None,
+                            lambda sheets: {"spreadsheetId": spreadsheetId, "valueRanges":
+                                            [self._backend.read_range(sheets, rng, majorDimension) for rng in ranges]})
+
+    def update(self, spreadsheetId:str, range:str, body:dict, **_) -> _FakeRequest:
+        return _FakeRequest(self._backend, "values.update", spreadsheetId, body,
+                            lambda sheets: dict(self._backend.write_range(sheets, range, body.get("values", []),
+                                                                          body.get("majorDimension", "ROWS")),
+                                                spreadsheetId = spreadsheetId))
+
+    def batchUpdate(self, spreadsheetId:str, body:dict, **_) -> _FakeRequest:
+        return _FakeRequest(self._backend, "values.batchUpdate", spreadsheetId, body,
+                            self._backend.batch_update_values, spreadsheetId, body)
+
+
+class _FakeSpreadsheets:
+    """Fake of service.spreadsheets()"""
+    def __init__(self, backend:FakeSheetsBackend):
+        self._backend = backend
+
+    def values(self) -> _FakeValues:
+        return _FakeValues(self._backend)
+
+    def get(self, spreadsheetId:str, **_) -> _FakeRequest:
+        return _FakeRequest(self._backend, "spreadsheets.get", spreadsheetId, None, self._backend.metadata, spreadsheetId)
+
+    def batchUpdate(self, spreadsheetId:str, body:dict, **_) -> _FakeRequest:
+        return _FakeRequest(self._backend, "spreadsheets.batchUpdate", spreadsheetId, body,
+                            self._backend.batch_update, spreadsheetId, body)
+
+
+class FakeSheetsTransport(SheetsTransport):
+    """Transport to an in-process FakeSheetsBackend instead of the Google servers."""
+    def __init__(self, backend:FakeSheetsBackend = None, **backend_args):
+        self.backend = backend if backend else FakeSheetsBackend(**backend_args)
+
+    def spreadsheets(self) -> _FakeSpreadsheets:
+        return _FakeSpreadsheets(self.backend)
+# END class FakeSheetsTransport
@@ -0,0 +1,161 @@
+##############################################################################################################################
+# coding=utf-8
+#
+# sheetWriteBehind.py -- queue of cell updates drained by a background thread when it is big enough or old enough
+#
+# Copyright (c) 2025 Mark Sattolo <epistemik@gmail.com>
+
+__author_name__    = "Mark Sattolo"
+__author_email__   = "epistemik@gmail.com"
+__python_version__ = "3.6+"
+__created__ = "2025-07-24"
+__updated__ = "2025-07-24"
+
+import threading
+import time
+from sys import path
+path.append("/home/marksa/git/Python/utils")
+from mhsUtils import lg
+
+# send when this many cells are queued
+WRITE_BEHIND_CELLS:int = 1000
+# ... or when the oldest queued cell has waited this many milliseconds
+WRITE_BEHIND_MS:int = 2000
+# put() waits for the flusher when this many cells are queued, e.g. while the network is down
+WRITE_BEHIND_MAX_QUEUED:int = 100_000
+
+
+class WriteBehindQueue:
+    """
+    Producers put() cell updates and return at once; a flusher thread sends them in batches.
+    A batch is dropped from memory only when send_fxn has acknowledged it:
+    entries that send_fxn returns, or all of the batch if send_fxn raises, go back to the front of the queue
+    and are tried again after max_delay_ms.
+    """
+    def __init__(self, send_fxn, max_cells:int = WRITE_BEHIND_CELLS, max_delay_ms:int = WRITE_BEHIND_MS,
+                 max_queued:int = WRITE_BEHIND_MAX_QUEUED, p_logger:lg.Logger = None):
+        """
+        :param     send_fxn: send_fxn(batch) sends a list of value ranges and returns the entries that were NOT accepted
+        :param    max_cells: send when this many entries are queued
+        :param max_delay_ms: send when the oldest entry has waited this long
+        :param   max_queued: put() blocks while this many entries are queued
+        """
+        self._send = send_fxn
+        self.max_cells = max_cells
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_queued = max(max_queued, max_cells)
+        self._lgr = p_logger if p_logger else lg.getLogger(self.__class__.__name__)
+        self._queue = list()
+        # time.monotonic() when the oldest queued entry was put, or re-queued after a failure
+        self._oldest = None
+        self._cond = threading.Condition(threading.Lock())
+        self._busy = False
+        self._flushing = 0
+        self._closed = False
+        self.batches = 0
+        self.sent = 0
+        self.failures = 0
+        self._thread = threading.Thread(target = self._run, name = "write-behind", daemon = True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def pending(self) -> list:
+        """Copy of the entries not yet acknowledged, NOT including a batch being sent."""
+        with self._cond:
+            return list(self._queue)
+
+    def put(self, entry:dict):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed!")
+            while len(self._queue) >= self.max_queued and not self._closed:
+                self._cond.wait()
+            self._queue.append(entry)
+            # the flusher needs a new timeout for the first entry, or must send now for the last one
+            if len(self._queue) == 1:
+                self._oldest = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._queue) >= self.max_cells:
+                self._cond.notify_all()
+
+    def _wait_time(self) -> float:
+        """Seconds until the queue is due to be sent: 0 if due now, None if empty."""
+        if not self._queue:
+            return None
+        if self._closed or self._flushing or len(self._queue) >= self.max_cells:
+            return 0.0
+        return max(0.0, self._oldest + self.max_delay - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                wait = self._wait_time()
+                while wait is None or wait > 0:
+                    if wait is None and self._closed:
+                        return
+                    self._cond.wait(wait)
+                    wait = self._wait_time()
+                batch, self._queue, self._oldest = self._queue, list(), None
+                self._busy = True
+                # room for producers waiting in put()
+                self._cond.notify_all()
+
+            try:
+                failed = self._send(batch) or []
+            except Exception as wbe:
+                self._lgr.error(F"write-behind batch of {len(batch)} entries FAILED: {wbe}")
+                failed = batch
+
+            with self._cond:
+                self._busy = False
+                self.batches += 1
+                self.sent += len(batch) - len(failed)
+                if failed:
+                    self.failures += 1
+                    self._queue[:0] = failed
+                    self._oldest = time.monotonic()
+                    if self._closed:
+                        self._lgr.error(F"closed with {len(self._queue)} entries NOT sent.")
+                        self._cond.notify_all()
+                        return
+                self._cond.notify_all()
+
+    def flush(self, p_timeout:float = None) -> bool:
+        """
+        SEND everything queued now and wait for it
+        :return: True if every entry was acknowledged; False after a failed send or at the timeout
+        """
+        deadline = None if p_timeout is None else time.monotonic() + p_timeout
+        with self._cond:
+            failures = self.failures
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while (self._queue or self._busy) and self.failures == failures and self._thread.is_alive():
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                return not self._queue and not self._busy
+            finally:
+                self._flushing -= 1
+
+    def close(self, p_timeout:float = None) -> bool:
+        """
+        SEND everything queued, then stop the flusher thread; entries that could not be sent stay in pending()
+        :return: True if every entry was acknowledged
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(p_timeout)
+        with self._cond:
+            return not self._queue and not self._busy
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._queue), "batches": self.batches, "sent": self.sent, "failures": self.failures,
+                    "closed": self._closed}
+# END class WriteBehindQueue
@@ -3,11 +3,12 @@
 #
 # @author Google
 # @modified Mark Sattolo <epistemik@gmail.com>
-# @revised 2019-03-12
+# @revised 2025-08-03
 # @version Python3.6
 #
 
 import pickle
+import sys
 import os.path as osp
 import json
 import datetime as dt
@@ -17,6 +18,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
 from mhs_google_config import *
+from doc_cache import DocCache
+from doc_text import open_document, extract_lines, write_text
 
 DOCUMENT_ID = READING_DOC
 CURRENT_SCOPE = DOCS_RW_SCOPE
@@ -28,6 +31,7 @@ now = dt.datetime.strftime(dt.datetime.now(), "%Y-%m-%dT%H-%M-%S")
 def main():
     """
     Get the title and/or body of a specified Google document
+    or, with argument 'text' or 'markdown', stream ONLY its text to a file
     """
     creds = None
     # The file token.pickle stores the user's access and refresh tokens, and is
@@ -47,16 +51,34 @@ def main():
         with open(TOKEN, 'wb') as token:
             pickle.dump(creds, token, pickle.HIGHEST_PROTOCOL)
 
+    if len(sys.argv) > 1 and sys.argv[1] in ('text', 'markdown'):
+        markdown = sys.argv[1] == 'markdown'
+        out_file = DOCUMENT_ID + '.' + now + ('.md' if markdown else '.txt')
+        stream = open_document(creds, DOCUMENT_ID, markdown)
+        try:
+            count = write_text(extract_lines(stream, markdown), out_file)
+        finally:
+            stream.close()
+        print("wrote {} lines to '{}'".format(count, out_file))
+        print('PROGRAM ENDED.')
+        return
+
     service = build('docs', 'v1', credentials=creds)
 
-    # Do a document "get" request and print the results as formatted JSON
-    document = service.documents().get(documentId = DOCUMENT_ID).execute()
+    # get the document: downloaded again only if its revision has changed since the last run
+    cache = DocCache()
+    document, doc_index = cache.get(service.documents(), DOCUMENT_ID)
+    print("{} document, revision {}".format('cached' if cache.hits else 'downloaded', document.get('revisionId')))
     # print(json.dumps(document, indent=4))
 
     doc_title = document.get('title')
     print("The title of the document is: {}".format(doc_title))
     # print('The body of the document is: {}'.format(document.get('body')))
 
+    # the outline, with the indices to insert after each heading
+    for head in doc_index.headings():
+        print("{:>8} {:>8}  {:<10} {}".format(head['start'], head['end'], head['style'], head['text']))
+
     # print document as json file -- add a timestamp to get a unique file name
     out_file = doc_title + '.' + now + ".json"
     print("out_file is '{}'".format(out_file))
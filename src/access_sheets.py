@@ -5,18 +5,28 @@
 # @revised Mark Sattolo <epistemik@gmail.com>
 # @version Python3.6
 # @created 2019-02-23
-# @updated 2019-03-12
+# @updated 2025-07-27
 
 import pickle
 import os.path as osp
 import json
+import gzip
+import sys
+import threading
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
 from mhs_google_config import *
+from snapshot_store import SnapshotStore
 
 SPREADSHEET_ID = BUDGET_QTRLY_SPRD_SHEET
 SHEET_RANGE    = BUDGET_QTRLY_READ_RANGE
@@ -25,6 +35,116 @@ TOKEN = SHEETS_EPISTEMIK_RW_TOKEN['P4']
 
 now = dt.datetime.strftime(dt.datetime.now(), "%Y-%m-%dT%H-%M-%S")
 
+# export: rows fetched with each request, so memory use is about one window per worker, NOT the whole workbook
+EXPORT_WINDOW_ROWS = 1000
+# sheets fetched at the same time
+EXPORT_WORKERS = 4
+# only what the export needs from the spreadsheet metadata and from each values().get
+EXPORT_SHEET_FIELDS  = 'properties.title,sheets.properties(sheetId,title,index,gridProperties(rowCount,columnCount))'
+EXPORT_VALUES_FIELDS = 'values'
+EXPORT_EXTENSIONS = {None: '', 'gz': '.gz', 'zst': '.zst'}
+# snapshot mode keeps the daily exports here, as deltas
+SNAPSHOT_DIR = 'snapshots'
+
+
+def open_export(out_file, compression=None):
+    """
+    Open a binary file for the export, compressed or not
+    :param compression: None, 'gz' or 'zst' -- zst needs the zstandard package
+    """
+    if compression == 'gz':
+        return gzip.open(out_file, 'wb', compresslevel=6)
+    if compression == 'zst':
+        if zstandard is None:
+            raise ValueError("zst compression needs the 'zstandard' package!")
+        return zstandard.ZstdCompressor().stream_writer(open(out_file, 'wb'), closefd=True)
+    if compression is not None:
+        raise ValueError("Unknown compression '{}'!".format(compression))
+    return open(out_file, 'wb')
+
+
+def fetch_sheets(srv_sheets, spreadsheet_id, on_rows, window_rows=EXPORT_WINDOW_ROWS, workers=EXPORT_WORKERS, execute=None,
+                 on_meta=None):
+    """
+    Fetch every sheet of a spreadsheet concurrently, each in windows of rows, and pass on each window as it arrives
+    :param  srv_sheets: service.spreadsheets()
+    :param     on_rows: on_rows(rows) gets the (sheet title, one-based row number, values) of the non-empty rows of a window;
+                        it is called from several threads, but only one at a time
+    :param     execute: execute(request) -> response, e.g. with a separate Http for each thread; default is request.execute()
+    :param     on_meta: on_meta(metadata) gets the spreadsheet metadata before any rows
+    :return: spreadsheet metadata and number of rows
+    """
+    run = execute if execute else (lambda req: req.execute())
+    meta = run(srv_sheets.get(spreadsheetId=spreadsheet_id, fields=EXPORT_SHEET_FIELDS))
+    sheets = [sh.get('properties', {}) for sh in meta.get('sheets', [])]
+    if on_meta:
+        on_meta(meta)
+    lock = threading.Lock()
+    counts = {}
+
+    def fetch_sheet(props):
+        title = props.get('title')
+        quoted = "'" + title.replace("'", "''") + "'"
+        row_count = props.get('gridProperties', {}).get('rowCount', 0)
+        counts[title] = 0
+        for start in range(1, row_count + 1, window_rows):
+            end = min(start + window_rows - 1, row_count)
+            result = run(srv_sheets.values().get(spreadsheetId=spreadsheet_id, range='{}!{}:{}'.format(quoted, start, end),
+                                                 majorDimension='ROWS', fields=EXPORT_VALUES_FIELDS))
+            rows = [(title, start + i, row) for i, row in enumerate(result.get('values', [])) if row]
+            if rows:
+                with lock:
+                    on_rows(rows)
+                counts[title] += len(rows)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sheets)))) as pool:
+        # list() to raise the first exception of any sheet
+        list(pool.map(fetch_sheet, sheets))
+    return meta, sum(counts.values())
+
+
+def export_sheets(srv_sheets, spreadsheet_id, out_base, compression=None, window_rows=EXPORT_WINDOW_ROWS,
+                  workers=EXPORT_WORKERS, execute=None):
+    """
+    Stream every sheet of a spreadsheet to ONE newline-delimited json file:
+    first a line with the spreadsheet id and title, and one with the properties of each sheet,
+    then a line for each non-empty row:
+        {"sheet": title, "row": one-based row number, "values": [...]}
+    the lines of one window of rows are never mixed with another.
+    :param    out_base: file name without extension
+    :return: name of the file and number of rows written
+    """
+    out_file = out_base + ".ndjson" + EXPORT_EXTENSIONS[compression]
+
+    def write_meta(meta):
+        lines = [{'spreadsheet': spreadsheet_id, 'title': meta.get('properties', {}).get('title')}] + \
+                [{'sheetProperties': sh.get('properties', {})} for sh in meta.get('sheets', [])]
+        ofp.write(''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines).encode('utf-8'))
+
+    def write_rows(rows):
+        ofp.write(''.join(json.dumps({'sheet': title, 'row': row, 'values': values}, separators=(',', ':')) + '\n'
+                          for title, row, values in rows).encode('utf-8'))
+
+    with open_export(out_file, compression) as ofp:
+        meta, count = fetch_sheets(srv_sheets, spreadsheet_id, write_rows, window_rows, workers, execute, write_meta)
+
+    print("\nExported {} rows of {} sheets to '{}'".format(count, len(meta.get('sheets', [])), out_file))
+    return out_file, count
+
+
+def snapshot_sheets(srv_sheets, spreadsheet_id, store_dir=SNAPSHOT_DIR, snapshot_id=now, execute=None):
+    """
+    Save a snapshot of every sheet of a spreadsheet in a SnapshotStore: only the rows changed since the previous snapshot are written
+    :return: counts of the rows in the snapshot and of those added, changed & removed
+    """
+    store = SnapshotStore(store_dir)
+    with store.begin(snapshot_id) as snap:
+        fetch_sheets(srv_sheets, spreadsheet_id, snap.add_rows, execute=execute)
+    stats = store.manifest['snapshots'][-1]
+    print("\nSnapshot '{}': {} rows, {} added, {} changed, {} removed".format(snapshot_id, stats['rows'], stats['added'],
+                                                                            stats['changed'], stats['removed']))
+    return stats
+
 
 def main():
     """
@@ -53,6 +173,31 @@ def main():
 
     # Call the Sheets API
     srv_sheets = service.spreadsheets()
+
+    # e.g. 'access_sheets.py export gz' -- stream all the rows instead of the usual json files
+    # or 'access_sheets.py snapshot [folder]' -- keep only the rows changed since the last snapshot
+    if len(sys.argv) > 1 and sys.argv[1] in ('export', 'snapshot'):
+        from google_auth_httplib2 import AuthorizedHttp
+        from httplib2 import Http
+        # httplib2 is NOT thread-safe: one Http for each export thread
+        local = threading.local()
+
+        def execute(request):
+            if not hasattr(local, 'http'):
+                local.http = AuthorizedHttp(creds, http=Http())
+            return request.execute(http=local.http)
+
+        if sys.argv[1] == 'snapshot':
+            snapshot_sheets(srv_sheets, SPREADSHEET_ID, sys.argv[2] if len(sys.argv) > 2 else SNAPSHOT_DIR, execute=execute)
+            print('\nPROGRAM ENDED.')
+            return
+
+        compression = sys.argv[2] if len(sys.argv) > 2 else None
+        meta = execute(srv_sheets.get(spreadsheetId=SPREADSHEET_ID, fields='properties.title'))
+        out_base = meta.get('properties', {}).get('title', 'MHS_Spreadsheet') + '.' + now
+        export_sheets(srv_sheets, SPREADSHEET_ID, out_base, compression, execute=execute)
+        print('\nPROGRAM ENDED.')
+        return
     sheet = srv_sheets.get(spreadsheetId=SPREADSHEET_ID).execute()
     props = sheet.get('properties')
 
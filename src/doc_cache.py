@@ -0,0 +1,181 @@
+#
+# doc_cache.py -- keep Google documents on disk by revision, with an index of the headings & paragraphs of each
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-08-01
+# @updated 2025-08-01
+
+import gzip
+import json
+import os
+import os.path as osp
+from bisect import bisect_right
+
+DOC_CACHE_FOLDER = 'cache/docs'
+# partial response with only the revision: a few bytes instead of the whole structure of the document
+REVISION_FIELDS = 'revisionId'
+HEADING_STYLES = ('TITLE', 'SUBTITLE', 'HEADING_1', 'HEADING_2', 'HEADING_3', 'HEADING_4', 'HEADING_5', 'HEADING_6')
+
+
+def paragraph_text(paragraph):
+    return ''.join(elem.get('textRun', {}).get('content', '') for elem in paragraph.get('elements', []))
+
+
+def walk_paragraphs(content, depth=0):
+    """(structural element, table depth) of each paragraph in content, in document order, including those in tables."""
+    for elem in content:
+        if 'paragraph' in elem:
+            yield elem, depth
+        elif 'table' in elem:
+            for row in elem['table'].get('tableRows', []):
+                for cell in row.get('tableCells', []):
+                    yield from walk_paragraphs(cell.get('content', []), depth + 1)
+        elif 'tableOfContents' in elem:
+            yield from walk_paragraphs(elem['tableOfContents'].get('content', []), depth + 1)
+
+
+class DocIndex:
+    """
+    Start & end index, text & named style of each paragraph of the body of a document, e.g. to find where to insert:
+        index.after('Notes') -> index just after the 'Notes' heading
+    """
+    def __init__(self, paragraphs):
+        """:param paragraphs: dicts with 'start', 'end', 'style', 'text' & 'depth', in document order"""
+        self.paragraphs = paragraphs
+        self._starts = [para['start'] for para in paragraphs]
+
+    @classmethod
+    def build(cls, document):
+        paragraphs = []
+        for elem, depth in walk_paragraphs(document.get('body', {}).get('content', [])):
+            para = elem['paragraph']
+            paragraphs.append({'start': elem.get('startIndex', 0), 'end': elem['endIndex'],
+                               'style': para.get('paragraphStyle', {}).get('namedStyleType', 'NORMAL_TEXT'),
+                               'text': paragraph_text(para).rstrip('\n'), 'depth': depth})
+        return cls(paragraphs)
+
+    def headings(self):
+        return [para for para in self.paragraphs if para['style'] in HEADING_STYLES]
+
+    def find(self, text, headings_only=False):
+        """First paragraph, or heading, whose text is text, after stripping; None if not found."""
+        text = text.strip()
+        for para in self.headings() if headings_only else self.paragraphs:
+            if para['text'].strip() == text:
+                return para
+        return None
+
+    def at(self, index):
+        """Paragraph that contains the character at index; None if not in a paragraph."""
+        i = bisect_right(self._starts, index) - 1
+        # paragraphs in tables are nested in order: the last one starting before index may not contain it
+        while i >= 0:
+            para = self.paragraphs[i]
+            if para['start'] <= index < para['end']:
+                return para
+            i -= 1
+            if self.paragraphs[i + 1]['depth'] == 0:
+                break
+        return None
+
+    def after(self, heading=None):
+        """
+        Index to insert a paragraph just after a heading
+        :param heading: text of the heading; default is the first paragraph of the document, e.g. the title
+        """
+        para = self.find(heading, headings_only=True) if heading is not None else (self.paragraphs[0] if self.paragraphs else None)
+        if para is None:
+            raise KeyError("No heading '{}'!".format(heading))
+        return para['end']
+
+    def section(self, heading):
+        """(start, end) of the paragraphs under a heading, up to the next heading of the same or a higher level."""
+        heads = self.headings()
+        para = self.find(heading, headings_only=True)
+        if para is None:
+            raise KeyError("No heading '{}'!".format(heading))
+        level = HEADING_STYLES.index(para['style'])
+        end = self.paragraphs[-1]['end']
+        for head in heads:
+            if head['start'] > para['start'] and HEADING_STYLES.index(head['style']) <= level:
+                end = head['start']
+                break
+        return para['end'], end
+
+    def to_json(self):
+        return self.paragraphs
+# END class DocIndex
+
+
+class DocCache:
+    """
+    Documents & their index, kept in a folder and re-used as long as the revision of the document is the same:
+    each get() costs one small request for the revision, and downloads the document only if it was changed.
+    """
+    def __init__(self, directory=DOC_CACHE_FOLDER):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, document_id):
+        return osp.join(self.directory, document_id + '.json.gz')
+
+    def _load(self, document_id):
+        entry = self._entries.get(document_id)
+        if entry is None and osp.exists(self._path(document_id)):
+            try:
+                with gzip.open(self._path(document_id), 'rt') as dfp:
+                    entry = json.load(dfp)
+            except (OSError, ValueError):
+                # a damaged file is only a miss
+                entry = None
+            if entry is not None:
+                self._entries[document_id] = entry
+        return entry
+
+    def _save(self, document_id, entry):
+        # atomically: a crash during a save leaves the previous file
+        path = self._path(document_id)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt') as dfp:
+            json.dump(entry, dfp, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        self._entries[document_id] = entry
+
+    def cached_revision(self, document_id):
+        entry = self._load(document_id)
+        return entry['revisionId'] if entry else None
+
+    def get(self, documents, document_id, execute=None):
+        """
+        GET a document, from the cache if its revision has not changed
+        :param   documents: documents() collection of a Docs v1 service
+        :param     execute: run a request, e.g. with a retry; default is request.execute()
+        :return: (document, DocIndex)
+        """
+        execute = execute or (lambda request: request.execute())
+        entry = self._load(document_id)
+        if entry is not None:
+            revision = execute(documents.get(documentId=document_id, fields=REVISION_FIELDS)).get('revisionId')
+            if revision is not None and revision == entry['revisionId']:
+                self.hits += 1
+                return entry['document'], DocIndex(entry['index'])
+        self.misses += 1
+        document = execute(documents.get(documentId=document_id))
+        return self.put(document)
+
+    def put(self, document):
+        """STORE a document just downloaded, e.g. after an update; :return: (document, DocIndex)"""
+        index = DocIndex.build(document)
+        self._save(document['documentId'], {'revisionId': document.get('revisionId'), 'document': document,
+                                            'index': index.to_json()})
+        return document, index
+
+    def invalidate(self, document_id):
+        self._entries.pop(document_id, None)
+        if osp.exists(self._path(document_id)):
+            os.remove(self._path(document_id))
+# END class DocCache
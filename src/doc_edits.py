@@ -0,0 +1,153 @@
+#
+# doc_edits.py -- plan edits of a Google document as ONE documents().batchUpdate, computing the shifted indices
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-07-31
+# @updated 2025-07-31
+
+import json
+
+TEXT_STYLE = 'updateTextStyle'
+PARAGRAPH_STYLE = 'updateParagraphStyle'
+STYLE_FIELDS = {TEXT_STYLE: 'textStyle', PARAGRAPH_STYLE: 'paragraphStyle'}
+
+
+def utf16_len(text):
+    """Length of text in the units of the Docs indices: UTF-16 code units, e.g. an emoji is 2."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def style_fields(style):
+    """Field mask of all the top-level fields of a style."""
+    return ','.join(sorted(style))
+
+
+class Insert:
+    """Text inserted by a DocEditPlan, at an index of the document BEFORE the edits."""
+    def __init__(self, anchor, text, order):
+        self.anchor = anchor
+        self.text = text
+        self.order = order
+
+    def offset(self, chars):
+        """Offset in the Docs units of the first chars characters of the text."""
+        return utf16_len(self.text[:chars])
+
+    def __len__(self):
+        return utf16_len(self.text)
+
+    def __repr__(self):
+        return 'Insert({}, {!r})'.format(self.anchor, self.text)
+# END class Insert
+
+
+class DocEditPlan:
+    """
+    Logical edits of a document, e.g.
+        plan = DocEditPlan()
+        name = plan.insert(27, '\tJohn Milton:\n')
+        plan.style_text(name, {'bold': True})
+        plan.style_paragraph(name, {'namedStyleType': 'HEADING_1'})
+        service.documents().batchUpdate(documentId=doc_id, body=plan.body()).execute()
+    Anchors and spans of existing text are indices of the document as it is BEFORE the edits;
+    styles of inserted text are given relative to the Insert, so no index has to be worked out by hand.
+    """
+    def __init__(self):
+        self.inserts = []
+        self.styles = []
+
+    def insert(self, anchor, text):
+        """
+        INSERT text before the character at index anchor; texts inserted at the same anchor stay in the order they were added
+        :return: Insert to use as the target of style_text() and style_paragraph()
+        """
+        if anchor < 1:
+            raise ValueError('Bad anchor {}: the body of a document starts at index 1!'.format(anchor))
+        ins = Insert(anchor, text, len(self.inserts))
+        if text:
+            self.inserts.append(ins)
+        return ins
+
+    def style_text(self, target, style, fields=None, start=0, end=None):
+        """
+        STYLE the text of target
+        :param target: Insert, with start & end as character offsets in its text; or (start, end) of existing text
+        :param  style: TextStyle
+        :param fields: field mask; default is all the fields of style
+        """
+        self.styles.append((TEXT_STYLE, target, start, end, style, fields or style_fields(style)))
+
+    def style_paragraph(self, target, style, fields=None, start=0, end=None):
+        """STYLE the paragraphs that overlap the text of target: see style_text()."""
+        self.styles.append((PARAGRAPH_STYLE, target, start, end, style, fields or style_fields(style)))
+
+    def _shift(self, index, before_order=None):
+        """Index after the inserts of an index before them; with before_order, only count those inserts at index."""
+        shift = 0
+        for ins in self.inserts:
+            if ins.anchor < index or (ins.anchor == index and (before_order is None or ins.order < before_order)):
+                shift += len(ins)
+        return index + shift
+
+    def _final_range(self, target, start, end):
+        """(start, end) after the inserts."""
+        if isinstance(target, Insert):
+            first = self._shift(target.anchor, target.order)
+            return first + target.offset(start), first + (len(target) if end is None else target.offset(end))
+        span_start, span_end = target
+        # existing text follows any text inserted before it
+        return self._shift(span_start), self._shift(span_end - 1) + 1
+
+    def requests(self):
+        """The requests of ONE batchUpdate: the inserts, from the end of the document, then the merged style updates."""
+        grouped = {}
+        for ins in self.inserts:
+            grouped.setdefault(ins.anchor, []).append(ins.text)
+        reqs = [{'insertText': {'location': {'index': anchor}, 'text': ''.join(grouped[anchor])}}
+                for anchor in sorted(grouped, reverse=True)]
+
+        updates = []
+        for kind, target, start, end, style, fields in self.styles:
+            first, last = self._final_range(target, start, end)
+            if last <= first:
+                continue
+            key = (kind, json.dumps(style, sort_keys=True), fields)
+            merge_styles(updates, key, first, last, style)
+        for key, first, last, style in updates:
+            kind, _, fields = key
+            reqs.append({kind: {'range': {'startIndex': first, 'endIndex': last}, STYLE_FIELDS[kind]: style,
+                                'fields': fields}})
+        return reqs
+
+    def body(self):
+        return {'requests': self.requests()}
+# END class DocEditPlan
+
+
+def merge_styles(updates, key, first, last, style):
+    """
+    ADD a style update to updates, merged with an identical update that touches or overlaps its range, and so on;
+    an update is NOT merged past a later update of the same kind that overlaps it, as the order of those matters
+    """
+    updates.append((key, first, last, style))
+    i = len(updates) - 1
+    while i > 0:
+        j = _mergeable(updates, i)
+        if j is None:
+            break
+        key, first, last, style = updates.pop(i)
+        _, jfirst, jlast, _ = updates[j]
+        updates[j] = (key, min(first, jfirst), max(last, jlast), style)
+        i = j
+
+
+def _mergeable(updates, i):
+    key, first, last, _ = updates[i]
+    for j in range(i - 1, -1, -1):
+        jkey, jfirst, jlast, _ = updates[j]
+        if jkey == key and jfirst <= last and first <= jlast:
+            return j
+        if jkey[0] == key[0] and jfirst < last and first < jlast:
+            return None
+    return None
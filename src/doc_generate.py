@@ -0,0 +1,214 @@
+#
+# doc_generate.py -- generate documents from a template: a Drive copy and ONE replaceAllText batch per document, in parallel
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-08-04
+# @updated 2025-08-06
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# the quotas & retries are the same as for the Sheets calls
+from sheetQuota import RateLimiter, WRITE
+
+# documents generated at the same time
+GENERATE_WORKERS = 8
+# default per-user quotas: Docs write requests & Drive queries per minute; 0 for no limit
+DOCS_WRITES_PER_MIN = 60
+DRIVE_CALLS_PER_MIN = 12000
+# retry a call that is throttled or fails on the server side, with exponential backoff
+GENERATE_TRIES = 5
+RETRY_BASE_DELAY = 1.0
+PLACEHOLDER = '{{{{{}}}}}'
+DRIVE = 'drive'
+DOCS = 'docs'
+
+
+def default_limiters(base_delay=RETRY_BASE_DELAY):
+    """{DRIVE: RateLimiter, DOCS: RateLimiter} with the usual quotas, for the calls of all the threads."""
+    return {DRIVE: RateLimiter(0, DRIVE_CALLS_PER_MIN, GENERATE_TRIES, base_delay),
+            DOCS: RateLimiter(0, DOCS_WRITES_PER_MIN, GENERATE_TRIES, base_delay)}
+
+
+def fill_requests(values):
+    """ONE replaceAllText request per placeholder: {{key}} is replaced by the value of key."""
+    return [{'replaceAllText': {'containsText': {'text': PLACEHOLDER.format(key), 'matchCase': True},
+                                'replaceText': str(value)}} for key, value in values.items()]
+
+
+def generate_documents(drive_files, documents, template_id, outputs, workers=GENERATE_WORKERS, limiters=None,
+                       execute=None, folder_id=None):
+    """
+    GENERATE a document from the template for each output, several at a time
+    :param drive_files: files() collection of a Drive v3 service
+    :param   documents: documents() collection of a Docs v1 service
+    :param     outputs: (name of the new document, {placeholder key: value}) for each document
+    :param    limiters: {DRIVE: RateLimiter, DOCS: RateLimiter}, shared by all the threads; default is default_limiters()
+    :param     execute: execute(request) -> response, e.g. with a separate Http for each thread; default is request.execute()
+    :param   folder_id: Drive folder of the new documents; default is the folder of the template
+    :return: for each output, in order: name, documentId, occurrences replaced, seconds to copy, to fill & in all, error
+    """
+    run = execute if execute else (lambda req: req.execute())
+    if limiters is None:
+        limiters = default_limiters()
+
+    def generate(output):
+        name, values = output
+        result = {'name': name, 'documentId': None, 'occurrences': 0, 'copy_secs': None, 'fill_secs': None, 'error': None}
+        start = time.perf_counter()
+        try:
+            body = {'name': name}
+            if folder_id:
+                body['parents'] = [folder_id]
+            # a copy sent again after a server error may make a second document: only retry it if throttled
+            copy = limiters[DRIVE].call(WRITE, lambda: run(drive_files.copy(fileId=template_id, body=body, fields='id')),
+                                        idempotent=False)
+            result['documentId'] = copy['id']
+            copied = time.perf_counter()
+            result['copy_secs'] = copied - start
+            requests = fill_requests(values)
+            if requests:
+                # once replaced, a placeholder is NOT found again: the fill can be retried
+                reply = limiters[DOCS].call(WRITE, lambda: run(documents.batchUpdate(documentId=copy['id'],
+                                                                                     body={'requests': requests})))
+                result['occurrences'] = sum(rep.get('replaceAllText', {}).get('occurrencesChanged', 0)
+                                            for rep in reply.get('replies', []))
+            result['fill_secs'] = time.perf_counter() - copied
+        except Exception as exc:
+            # one failed document does NOT stop the others
+            result['error'] = repr(exc)
+        result['secs'] = time.perf_counter() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(outputs)))) as pool:
+        return list(pool.map(generate, outputs))
+
+
+def latency_summary(results):
+    """Count, failures & percentiles of the seconds per document."""
+    secs = sorted(res['secs'] for res in results)
+    if not secs:
+        return {'documents': 0}
+    return {'documents': len(secs), 'failed': sum(1 for res in results if res['error']),
+            'p50': secs[len(secs) // 2], 'p90': secs[min(len(secs) - 1, int(len(secs) * 0.9))], 'max': secs[-1]}
+
+
+class FakeResponse(dict):
+    """Headers & status of a failed call, like the resp of a googleapiclient HttpError."""
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    """Raised by FakeDocsBackend: is retried or not like an HttpError with the same status."""
+    def __init__(self, status, headers=None):
+        self.resp = FakeResponse(status, headers)
+        super().__init__('<FakeHttpError {}>'.format(status))
+
+
+class FakeRequest:
+    def __init__(self, backend, fxn):
+        self._backend = backend
+        self._fxn = fxn
+
+    def execute(self, http=None):
+        return self._backend.execute(self._fxn)
+
+
+class FakeDocsBackend:
+    """
+    Drive copy and Docs get & batchUpdate(replaceAllText) on documents of plain text kept in memory,
+    with a latency for each call and, optionally, a 429 error every fail_every calls.
+    Use files() & documents() in place of those of the Drive & Docs services.
+    """
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.texts = {}
+        self.names = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add_document(self, document_id, text, name=None):
+        self.texts[document_id] = text
+        self.names[document_id] = name or document_id
+
+    def execute(self, fxn):
+        with self._lock:
+            self.calls += 1
+            fail = self.fail_every and self.calls % self.fail_every == 0
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeHttpError(429)
+        with self._lock:
+            return fxn()
+
+    def files(self):
+        return self
+
+    def documents(self):
+        return self
+
+    # Drive files()
+    def copy(self, fileId, body=None, fields=None):
+        def run():
+            if fileId not in self.texts:
+                raise FakeHttpError(404)
+            new_id = '{}-copy-{}'.format(fileId, len(self.texts))
+            self.add_document(new_id, self.texts[fileId], (body or {}).get('name'))
+            return {'id': new_id}
+        return FakeRequest(self, run)
+
+    # Docs documents()
+    def get(self, documentId, fields=None):
+        def run():
+            if documentId not in self.texts:
+                raise FakeHttpError(404)
+            text = self.texts[documentId]
+            return {'documentId': documentId, 'title': self.names[documentId],
+                    'body': {'content': [{'startIndex': 1, 'endIndex': 1 + len(text),
+                                          'paragraph': {'elements': [{'textRun': {'content': text}}]}}]}}
+        return FakeRequest(self, run)
+
+    def batchUpdate(self, documentId, body):
+        def run():
+            if documentId not in self.texts:
+                raise FakeHttpError(404)
+            replies = []
+            for req in body['requests']:
+                rat = req['replaceAllText']
+                old = rat['containsText']['text']
+                text = self.texts[documentId]
+                replies.append({'replaceAllText': {'occurrencesChanged': text.count(old)}})
+                self.texts[documentId] = text.replace(old, rat['replaceText'])
+            return {'documentId': documentId, 'replies': replies}
+        return FakeRequest(self, run)
+# END class FakeDocsBackend
+
+
+def bench_generate(documents=48, latency=0.05):
+    """Generate quarterly reports on the fake backend, one at a time vs GENERATE_WORKERS at a time, with some 429s."""
+    template = 'Quarterly report {{quarter}} {{year}}\nIncome: {{income}}\nExpenses: {{expenses}}\n{{quarter}} ends.\n'
+    outputs = [('Report {}-Q{}'.format(2000 + num // 4, num % 4 + 1),
+                {'quarter': 'Q{}'.format(num % 4 + 1), 'year': 2000 + num // 4, 'income': num * 100, 'expenses': num * 50})
+               for num in range(documents)]
+    results = {}
+    for label, workers in (('sequential', 1), ('parallel', GENERATE_WORKERS)):
+        backend = FakeDocsBackend(latency, fail_every=17)
+        backend.add_document('template', template)
+        limiters = {DRIVE: RateLimiter(0, 0, GENERATE_TRIES, 0.01), DOCS: RateLimiter(0, 0, GENERATE_TRIES, 0.01)}
+        start = time.perf_counter()
+        generated = generate_documents(backend.files(), backend.documents(), 'template', outputs, workers, limiters)
+        results[label] = dict(latency_summary(generated), secs=time.perf_counter() - start,
+                              retries=sum(limiter.retries for limiter in limiters.values()),
+                              occurrences=sum(res['occurrences'] for res in generated))
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(bench_generate(), indent=4))
@@ -0,0 +1,186 @@
+#
+# doc_sync.py -- make the body of a Google document match a text with the fewest deletes & inserts, in ONE batchUpdate
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-08-02
+# @updated 2025-08-06
+
+import re
+from difflib import SequenceMatcher
+
+from doc_edits import utf16_len
+
+# stands for each index of an element of a paragraph that is NOT text, e.g. an image: never deleted by a sync
+OBJECT_CHAR = '\ufffc'
+# a changed block of paragraphs bigger than this, in characters, is replaced whole instead of diffed by character
+MAX_CHAR_DIFF = 20000
+# changes of a block closer than this, in characters, are sent as one replacement
+MIN_EQUAL_CHARS = 16
+PARAGRAPH_RE = re.compile(r'[^\n]*\n|[^\n]+$')
+
+
+def split_paragraphs(text):
+    """Paragraphs of text, each with its newline."""
+    return PARAGRAPH_RE.findall(text)
+
+
+def document_text(document):
+    """
+    Text of the body of a document, from index 1: an OBJECT_CHAR for each index of an element that is not text
+    :raise ValueError: if the body has tables or a table of contents, which can NOT be synced as text
+    """
+    parts = []
+    for elem in document.get('body', {}).get('content', []):
+        if 'sectionBreak' in elem:
+            # only the first section break, before index 1, is NOT in the text of the body
+            if 'startIndex' in elem and elem['endIndex'] > 1:
+                parts.append(OBJECT_CHAR * (elem['endIndex'] - elem['startIndex']))
+            continue
+        if 'paragraph' not in elem:
+            raise ValueError('Can only sync a document of paragraphs: found {} at index {}!'
+                             .format(sorted(set(elem) - {'startIndex', 'endIndex'}), elem.get('startIndex')))
+        for pelem in elem['paragraph'].get('elements', []):
+            run = pelem.get('textRun')
+            if run is not None:
+                parts.append(run.get('content', ''))
+            else:
+                parts.append(OBJECT_CHAR * (pelem['endIndex'] - pelem['startIndex']))
+    return ''.join(parts)
+
+
+def desired_text(desired):
+    """The text to sync to, from a string or a list of paragraphs; ends with a newline, as every body does."""
+    if not isinstance(desired, str):
+        return ''.join(para + '\n' for para in desired)
+    return desired if desired.endswith('\n') else desired + '\n'
+
+
+def text_edits(current, desired):
+    """
+    COMPARE two texts, by paragraph then by character inside each changed block of paragraphs
+    :return: (start, end, new text) replacements of character ranges of current, in increasing order
+    """
+    old_paras = split_paragraphs(current)
+    new_paras = split_paragraphs(desired)
+    old_starts = [0]
+    for para in old_paras:
+        old_starts.append(old_starts[-1] + len(para))
+    new_starts = [0]
+    for para in new_paras:
+        new_starts.append(new_starts[-1] + len(para))
+
+    edits = []
+    matcher = SequenceMatcher(None, old_paras, new_paras, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        old_start, old_end = old_starts[i1], old_starts[i2]
+        new_block = desired[new_starts[j1]:new_starts[j2]]
+        if tag != 'replace' or old_end - old_start + len(new_block) > MAX_CHAR_DIFF:
+            edits.append((old_start, old_end, new_block))
+            continue
+        # e.g. a word changed in a paragraph: only replace the word
+        old_block = current[old_start:old_end]
+        chars = SequenceMatcher(None, old_block, new_block, autojunk=False)
+        block_edits = []
+        for ctag, c1, c2, d1, d2 in chars.get_opcodes():
+            if ctag == 'equal':
+                continue
+            if block_edits and c1 - block_edits[-1][1] < MIN_EQUAL_CHARS:
+                # keeping a few characters between two changes is NOT worth two more requests
+                first_c, _, first_d, _ = block_edits[-1]
+                block_edits[-1] = (first_c, c2, first_d, d2)
+            else:
+                block_edits.append((c1, c2, d1, d2))
+        edits.extend((old_start + c1, old_start + c2, new_block[d1:d2]) for c1, c2, d1, d2 in block_edits)
+    return edits
+
+
+def keep_objects(current, edits):
+    """
+    SPLIT the edits around the OBJECT_CHARs of current that they would delete, e.g. an image or a footnote reference:
+    the desired text can NOT contain those elements, so the text around them is replaced and they are left in place
+    """
+    kept = []
+    for start, end, text in edits:
+        first = start
+        for pos in range(start, end):
+            if current[pos] == OBJECT_CHAR:
+                # e.g. a section break: there is no paragraph to insert into just before an element at the start of a line
+                at_line_start = pos == 0 or current[pos - 1] == '\n'
+                if at_line_start and pos > first:
+                    # nor can the newline before a section break be deleted: keep it, at worst as an empty paragraph
+                    text = text[:-1] if text.endswith('\n') else text
+                    if pos - 1 > first or text:
+                        kept.append((first, pos - 1, text))
+                    text = ''
+                elif pos > first or (text and not at_line_start):
+                    kept.append((first, pos, text))
+                    text = ''
+                first = pos + 1
+        if end > first or text:
+            kept.append((first, end, text))
+    return kept
+
+
+def sync_requests(document, desired):
+    """
+    The deleteContentRange & insertText requests that make the body of document match desired,
+    from the end of the body so each request leaves the indices of the ones after it valid;
+    the elements that are NOT text stay, after any text inserted in their place, or before it at the start of a line
+    :param desired: text, or list of paragraphs
+    """
+    current = document_text(document)
+    target = desired_text(desired)
+    if not current.endswith('\n'):
+        current += '\n'
+    # the last newline of the body can NOT be deleted: leave it out of the comparison
+    edits = keep_objects(current, text_edits(current[:-1], target[:-1]))
+    if not edits:
+        return []
+
+    # index of each character of current: 1 + UTF-16 units before it
+    if len(current) == utf16_len(current):
+        def to_index(offset):
+            return 1 + offset
+    else:
+        indices = [1]
+        for char in current:
+            indices.append(indices[-1] + utf16_len(char))
+
+        def to_index(offset):
+            return indices[offset]
+
+    requests = []
+    for start, end, text in reversed(edits):
+        if end > start:
+            requests.append({'deleteContentRange': {'range': {'startIndex': to_index(start), 'endIndex': to_index(end)}}})
+        if text:
+            requests.append({'insertText': {'location': {'index': to_index(start)}, 'text': text}})
+    return requests
+
+
+def sync_document(documents, document_id, desired, cache=None, execute=None):
+    """
+    SYNC the body of a document to desired in ONE batchUpdate, which fails if the document was changed in between
+    :param documents: documents() collection of a Docs v1 service
+    :param     cache: DocCache to get the document from; default is to download it
+    :param   execute: run a request, e.g. with a retry; default is request.execute()
+    :return: (number of requests sent, reply or None if the document already matched)
+    """
+    execute = execute or (lambda request: request.execute())
+    if cache is not None:
+        document, _ = cache.get(documents, document_id, execute)
+    else:
+        document = execute(documents.get(documentId=document_id))
+    requests = sync_requests(document, desired)
+    if not requests:
+        return 0, None
+    body = {'requests': requests}
+    if document.get('revisionId'):
+        body['writeControl'] = {'requiredRevisionId': document['revisionId']}
+    reply = execute(documents.batchUpdate(documentId=document_id, body=body))
+    if cache is not None:
+        cache.invalidate(document_id)
+    return len(requests), reply
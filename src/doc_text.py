@@ -0,0 +1,254 @@
+#
+# doc_text.py -- stream the text of a Google document as plain text or Markdown, one paragraph at a time
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-08-03
+# @updated 2025-08-03
+
+import codecs
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+DOCS_API_URL = 'https://docs.googleapis.com/v1/documents/'
+READ_CHUNK = 1 << 16
+# partial responses: only what is needed for the text, NOT the layout & styles of every run
+PLAIN_FIELDS = ('body(content(paragraph(elements(textRun(content))),'
+                'table(tableRows(tableCells(content(paragraph(elements(textRun(content)))))))))')
+MARKDOWN_FIELDS = ('body(content(paragraph(elements(textRun(content,textStyle(bold,italic,link(url)))),'
+                   'paragraphStyle(namedStyleType),bullet(nestingLevel)),'
+                   'table(tableRows(tableCells(content(paragraph(elements(textRun(content)))))))))')
+HEADING_MARKS = {'TITLE': '#', 'SUBTITLE': '##', 'HEADING_1': '#', 'HEADING_2': '##', 'HEADING_3': '###',
+                 'HEADING_4': '####', 'HEADING_5': '#####', 'HEADING_6': '######'}
+CONTENT_PATH = ('body', 'content')
+
+
+class JsonArrayStream:
+    """
+    Decode the items of ONE array in a JSON stream, e.g. body.content of a document, one at a time:
+    only the current item and a chunk of the stream are in memory, whatever the size of the whole response.
+    """
+    def __init__(self, fp, chunk_size=READ_CHUNK):
+        """:param fp: binary or text file-like object, e.g. a file or the raw body of an http response"""
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        data = self._fp.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            data = b''
+        text = self._decoder.decode(data, final=self._eof) if isinstance(data, bytes) else data
+        # drop what has been decoded
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+
+    def _peek(self):
+        """Next character that is NOT whitespace; '' at the end."""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            self._pos = pos
+            if pos < len(buf) or self._eof:
+                return buf[pos] if pos < len(buf) else ''
+            self._fill()
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError("Expected one of '{}' but found '{}' in the JSON stream!".format(chars, char))
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Decode the next value: read more of the stream until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # a number may go on in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def items(self, path):
+        """
+        YIELD the items of the array at path, e.g. ('body', 'content'); nothing if there is no such array
+        """
+        depth = 0
+        while depth < len(path):
+            self._expect('{')
+            found = False
+            while self._peek() != '}':
+                key = self._value()
+                self._expect(':')
+                if key == path[depth]:
+                    found = True
+                    break
+                self._value()
+                if self._peek() == ',':
+                    self._pos += 1
+            if not found:
+                return
+            depth += 1
+        self._expect('[')
+        while self._peek() != ']':
+            yield self._value()
+            if self._peek() == ',':
+                self._pos += 1
+# END class JsonArrayStream
+
+
+def run_text(elem, markdown=False):
+    run = elem.get('textRun')
+    if run is None:
+        return ''
+    text = run.get('content', '')
+    if not markdown:
+        return text
+    body = text.rstrip('\n')
+    tail = text[len(body):]
+    style = run.get('textStyle', {})
+    if body.strip():
+        if style.get('bold'):
+            body = '**' + body + '**'
+        if style.get('italic'):
+            body = '_' + body + '_'
+        url = style.get('link', {}).get('url')
+        if url:
+            body = '[' + body + '](' + url + ')'
+    return body + tail
+
+
+def paragraph_lines(paragraph, markdown=False):
+    text = ''.join(run_text(elem, markdown) for elem in paragraph.get('elements', [])).rstrip('\n')
+    if not markdown:
+        return text
+    mark = HEADING_MARKS.get(paragraph.get('paragraphStyle', {}).get('namedStyleType'))
+    if mark and text:
+        return mark + ' ' + text
+    bullet = paragraph.get('bullet')
+    if bullet is not None:
+        return '  ' * bullet.get('nestingLevel', 0) + '- ' + text
+    return text
+
+
+def cell_text(cell):
+    return ' '.join(paragraph_lines(elem['paragraph']) for elem in cell.get('content', []) if 'paragraph' in elem)
+
+
+def element_lines(elem, markdown=False):
+    """Lines of text of a structural element of the body."""
+    if 'paragraph' in elem:
+        yield paragraph_lines(elem['paragraph'], markdown)
+    elif 'table' in elem:
+        for num, row in enumerate(elem['table'].get('tableRows', [])):
+            cells = [cell_text(cell) for cell in row.get('tableCells', [])]
+            if not markdown:
+                yield '\t'.join(cells)
+                continue
+            yield '| ' + ' | '.join(cell.replace('|', '\\|') for cell in cells) + ' |'
+            if num == 0:
+                yield '|' + ' --- |' * len(cells)
+
+
+def extract_lines(fp, markdown=False, chunk_size=READ_CHUNK):
+    """
+    YIELD the text of a document, one line per paragraph or table row, from a stream of its JSON
+    :param fp: the document, e.g. the response of open_document()
+    """
+    for elem in JsonArrayStream(fp, chunk_size).items(CONTENT_PATH):
+        yield from element_lines(elem, markdown)
+
+
+def open_document(credentials, document_id, markdown=False):
+    """
+    OPEN a stream of the JSON of a document with ONLY the fields needed for the text
+    :return: raw body of the response, to read from; close it when done
+    """
+    from google.auth.transport.requests import AuthorizedSession
+    session = AuthorizedSession(credentials)
+    response = session.get(DOCS_API_URL + document_id, params={'fields': MARKDOWN_FIELDS if markdown else PLAIN_FIELDS},
+                           stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response.raw
+
+
+def write_text(lines, out_file):
+    """Write lines to a file, atomically; :return: number of lines."""
+    count = 0
+    tmp_file = out_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as ofp:
+        for line in lines:
+            ofp.write(line + '\n')
+            count += 1
+    os.replace(tmp_file, out_file)
+    return count
+
+
+def synthetic_document(paragraphs):
+    """A document with the structure of a real one: styles & layout for every paragraph & run."""
+    run_style = {'weightedFontFamily': {'fontFamily': 'Arial', 'weight': 400}, 'fontSize': {'magnitude': 11, 'unit': 'PT'},
+                 'foregroundColor': {'color': {'rgbColor': {'red': 0.1, 'green': 0.1, 'blue': 0.1}}}}
+    para_style = {'namedStyleType': 'NORMAL_TEXT', 'direction': 'LEFT_TO_RIGHT', 'lineSpacing': 115,
+                  'spaceAbove': {'magnitude': 0, 'unit': 'PT'}, 'spaceBelow': {'magnitude': 6, 'unit': 'PT'}}
+    content = [{'endIndex': 1, 'sectionBreak': {'sectionStyle': {'columnSeparatorStyle': 'NONE'}}}]
+    index = 1
+    for num in range(paragraphs):
+        text = 'Paragraph {} of a long reading list: author, title & notes.\n'.format(num)
+        heading = num % 50 == 0
+        style = dict(para_style, namedStyleType='HEADING_2') if heading else para_style
+        content.append({'startIndex': index, 'endIndex': index + len(text),
+                        'paragraph': {'elements': [{'startIndex': index, 'endIndex': index + len(text),
+                                                    'textRun': {'content': text, 'textStyle': dict(run_style, bold=heading)}}],
+                                      'paragraphStyle': style}})
+        index += len(text)
+    return {'title': 'Synthetic', 'documentId': 'synthetic', 'revisionId': 'r1', 'body': {'content': content}}
+
+
+def bench_extract(paragraphs=200000):
+    """Time & peak memory to get the Markdown of a big document: json.load() of the whole file vs the stream."""
+    folder = tempfile.mkdtemp()
+    doc_file = os.path.join(folder, 'synthetic.json')
+    with open(doc_file, 'w') as dfp:
+        json.dump(synthetic_document(paragraphs), dfp, indent=2)
+    results = {'json_mb': os.path.getsize(doc_file) / 2 ** 20}
+
+    def whole():
+        with open(doc_file, 'rb') as dfp:
+            document = json.load(dfp)
+        return sum(1 for elem in document['body']['content'] for _ in element_lines(elem, True))
+
+    def streamed():
+        with open(doc_file, 'rb') as dfp:
+            return sum(1 for _ in extract_lines(dfp, True))
+
+    for label, fxn in (('json_load', whole), ('stream', streamed)):
+        start = time.perf_counter()
+        lines = fxn()
+        results[label] = {'secs': time.perf_counter() - start, 'lines': lines}
+        tracemalloc.start()
+        fxn()
+        results[label]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    os.remove(doc_file)
+    os.rmdir(folder)
+    return results
+
+
+if __name__ == '__main__':
+    print(json.dumps(bench_extract(), indent=4))
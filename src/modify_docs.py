@@ -3,13 +3,15 @@
 #
 # @author Google
 # @modified Mark Sattolo <epistemik@gmail.com>
-# @revised 2019-03-12
+# @revised 2025-08-06
 # @version Python3.6
 #
 
 import pickle
+import sys
 import os.path as osp
 import json
+import threading
 import datetime as dt
 
 from googleapiclient.discovery import build
@@ -17,180 +19,118 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
 from mhs_google_config import *
+from doc_edits import DocEditPlan
+from doc_cache import DocCache
+from doc_sync import sync_document
+from doc_generate import generate_documents, latency_summary
 
 DOCUMENT_ID = READING_DOC
 CURRENT_SCOPE = DOCS_RW_SCOPE
 TOKEN = DOCS_EPISTEMIK_RW_TOKEN['P4']
+# generate mode copies the template with Drive: needs a token with both scopes
+GENERATE_SCOPE = DOCS_RW_SCOPE + DRIVE_RW_SCOPE
+GENERATE_TOKEN = DOCS_DRIVE_EPISTEMIK_RW_TOKEN['P4']
 
 now = dt.datetime.strftime(dt.datetime.now(), "%Y-%m-%dT%H-%M-%S")
 
-# simple test data
-extra_text = [
-    {
-        'insertText': {
-            'location': {
-                'index': 27,
-            },
-            'text': "\tForeign Secretary for the Commonwealth\n\n\n\n"
-        }
-    },
-    {
-        'insertText': {
-            'location': {
-                'index': 27,
-            },
-            'text': "\tauthor of Paradise Lost\n"
-        }
-    },
-    {
-        'insertText': {
-            'location': {
-                'index': 27,
-            },
-            'text': "\t1608 - 1674\n"
-        }
+# insert the test data after this heading; None to insert after the first paragraph, e.g. the title
+ANCHOR_HEADING = None
+
+# simple test data, in the order it will appear in the document
+lines = ["\t{}\n".format(now), "\tJohn Milton:\n", "\t1608 - 1674\n", "\tauthor of Paradise Lost\n",
+         "\tForeign Secretary for the Commonwealth\n\n\n\n"]
+
+# example text format changes, by line
+text_styles = {
+    0: {
+        'bold': True,
+        'italic': True
     },
-    {
-        'insertText': {
-            'location': {
-                'index': 27,
-            },
-            'text': "\tJohn Milton:\n"
+    1: {
+        'weightedFontFamily': {
+            'fontFamily': 'Times New Roman'
+        },
+        'fontSize': {
+            'magnitude': 14,
+            'unit': 'PT'
+        },
+        'foregroundColor': {
+            'color': {
+                'rgbColor': {
+                    'blue': 0.0,
+                    'green': 1.0,
+                    'red': 0.0
+                }
+            }
         }
     },
-    {
-        'insertText': {
-            'location': {
-                'index': 27,
-            },
-            'text': "\t{}\n".format(now)
+    2: {
+        'link': {
+            'url': 'www.example.com'
         }
     }
-]
-
-# example text format changes
-text_style_updates = [
-    {
-        'updateTextStyle': {
-            'range': {
-                'startIndex': 27,
-                'endIndex': 48
-            },
-            'textStyle': {
-                'bold': True,
-                'italic': True
-            },
-            'fields': 'bold,italic'
+}
+
+# example paragraph style changes, by line, with the field mask
+pgraph_styles = {
+    3: ({
+        'namedStyleType': 'HEADING_1',
+        'spaceAbove': {
+            'magnitude': 10.0,
+            'unit': 'PT'
+        },
+        'spaceBelow': {
+            'magnitude': 10.0,
+            'unit': 'PT'
         }
-    },
-    {
-        'updateTextStyle': {
-            'range': {
-                'startIndex': 48,
-                'endIndex': 62
-            },
-            'textStyle': {
-                'weightedFontFamily': {
-                    'fontFamily': 'Times New Roman'
-                },
-                'fontSize': {
-                    'magnitude': 14,
-                    'unit': 'PT'
-                },
-                'foregroundColor': {
-                    'color': {
-                        'rgbColor': {
-                            'blue': 0.0,
-                            'green': 1.0,
-                            'red': 0.0
-                        }
+    }, 'namedStyleType,spaceAbove,spaceBelow'),
+    4: ({
+        'borderLeft': {
+            'color': {
+                'color': {
+                    'rgbColor': {
+                        'blue': 0.0,
+                        'green': 0.0,
+                        'red': 1.0
                     }
                 }
             },
-            'fields': 'foregroundColor,weightedFontFamily,fontSize'
-        }
-    },
-    {
-        'updateTextStyle': {
-            'range': {
-                'startIndex': 62,
-                'endIndex': 75
+            'dashStyle': 'DASH',
+            'padding': {
+                'magnitude': 20.0,
+                'unit': 'PT'
             },
-            'textStyle': {
-                'link': {
-                    'url': 'www.example.com'
-                }
+            'width': {
+                'magnitude': 15.0,
+                'unit': 'PT'
             },
-            'fields': 'link'
         }
-    }
-]
-
-# example paragraph style changes
-pgraph_style_updates = [
-    {
-        'updateParagraphStyle': {
-            'range': {
-                'startIndex': 75,
-                'endIndex': 100
-            },
-            'paragraphStyle': {
-                'namedStyleType': 'HEADING_1',
-                'spaceAbove': {
-                    'magnitude': 10.0,
-                    'unit': 'PT'
-                },
-                'spaceBelow': {
-                    'magnitude': 10.0,
-                    'unit': 'PT'
-                }
-            },
-            'fields': 'namedStyleType,spaceAbove,spaceBelow'
-        }
-    },
-    {
-        'updateParagraphStyle': {
-            'range': {
-                'startIndex': 100,
-                'endIndex': 140
-            },
-            'paragraphStyle': {
-                'borderLeft': {
-                    'color': {
-                        'color': {
-                            'rgbColor': {
-                                'blue': 0.0,
-                                'green': 0.0,
-                                'red': 1.0
-                            }
-                        }
-                    },
-                    'dashStyle': 'DASH',
-                    'padding': {
-                        'magnitude': 20.0,
-                        'unit': 'PT'
-                    },
-                    'width': {
-                        'magnitude': 15.0,
-                        'unit': 'PT'
-                    },
-                }
-            },
-            'fields': 'borderLeft,borderRight'
-        }
-    }
-]
+    }, 'borderLeft,borderRight')
+}
 
 
-def modify_docs_main():
+def plan_edits(anchor):
     """
-    Modify the text and/or styles of a specified Google document
+    The test data and its styles as ONE batchUpdate body: the indices of the styles are computed by the plan
+    :param anchor: index in the document BEFORE the edits
     """
+    plan = DocEditPlan()
+    inserts = [plan.insert(anchor, text) for text in lines]
+    for line, style in text_styles.items():
+        plan.style_text(inserts[line], style)
+    for line, (style, fields) in pgraph_styles.items():
+        # up to the first newline after the text: the empty paragraphs that follow a line keep their style
+        text = lines[line]
+        plan.style_paragraph(inserts[line], style, fields, end=min(len(text), len(text.rstrip('\n')) + 1))
+    return plan.body()
+
+
+def get_credentials(token_file, scope):
     creds = None
     # The file token.pickle stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first time.
-    if osp.exists(TOKEN):
-        with open(TOKEN, 'rb') as token:
+    if osp.exists(token_file):
+        with open(token_file, 'rb') as token:
             creds = pickle.load(token)
 
     # If there are no (valid) credentials available, let the user log in.
@@ -198,28 +138,78 @@ def modify_docs_main():
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS, CURRENT_SCOPE)
+            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS, scope)
             creds = flow.run_local_server()
         # Save the credentials for the next run
-        with open(TOKEN, 'wb') as token:
+        with open(token_file, 'wb') as token:
             pickle.dump(creds, token, pickle.HIGHEST_PROTOCOL)
 
-    service = build('docs', 'v1', credentials=creds)
+    return creds
 
-    # send the extra text
-    t_reply = service.documents().batchUpdate(documentId=DOCUMENT_ID, body={'requests': extra_text}).execute()
-    # show the reply message
-    print("The reply of the document update operation is: {}".format(json.dumps(t_reply, indent=4)))
 
-    # send the text formatting changes
-    f_reply = service.documents().batchUpdate(documentId=DOCUMENT_ID, body={'requests': text_style_updates}).execute()
-    # show the reply message
-    print("The reply of the text formatting operation is: {}".format(json.dumps(f_reply, indent=4)))
+def generate_main(spec_file):
+    """
+    Generate documents from a template, as given in a json file:
+        {"template": id, "folder": optional Drive folder id, "outputs": [{"name": ..., "values": {placeholder key: value}}, ...]}
+    """
+    from google_auth_httplib2 import AuthorizedHttp
+    from httplib2 import Http
+
+    with open(spec_file, encoding='utf-8') as sfp:
+        spec = json.load(sfp)
+    creds = get_credentials(GENERATE_TOKEN, GENERATE_SCOPE)
+    drive = build('drive', 'v3', credentials=creds)
+    docs = build('docs', 'v1', credentials=creds)
+
+    # httplib2 is NOT thread-safe: one Http for each thread
+    local = threading.local()
+
+    def execute(request):
+        if not hasattr(local, 'http'):
+            local.http = AuthorizedHttp(creds, http=Http())
+        return request.execute(http=local.http)
+
+    outputs = [(out['name'], out.get('values', {})) for out in spec['outputs']]
+    results = generate_documents(drive.files(), docs.documents(), spec['template'], outputs, execute=execute,
+                                 folder_id=spec.get('folder'))
+    for res in results:
+        print("{:<40} {:<46} {:>4} replaced {:8.3f}s {}".format(res['name'], str(res['documentId']), res['occurrences'],
+                                                                res['secs'], res['error'] or ''))
+    print("latency: {}".format(latency_summary(results)))
+    print('\n >>> PROGRAM ENDED.')
+
+
+def modify_docs_main():
+    """
+    Modify the text and/or styles of a specified Google document
+    or, with arguments 'sync <text file>', make its text the same as the file with the fewest edits
+    or, with arguments 'generate <json file>', generate documents from a template: see generate_main()
+    """
+    if len(sys.argv) > 2 and sys.argv[1] == 'generate':
+        generate_main(sys.argv[2])
+        return
+
+    creds = get_credentials(TOKEN, CURRENT_SCOPE)
+    service = build('docs', 'v1', credentials=creds)
 
-    # send the paragraph formatting changes
-    p_reply = service.documents().batchUpdate(documentId=DOCUMENT_ID, body={'requests': pgraph_style_updates}).execute()
+    cache = DocCache()
+    if len(sys.argv) > 2 and sys.argv[1] == 'sync':
+        with open(sys.argv[2], encoding='utf-8') as tfp:
+            desired = tfp.read()
+        num_requests, reply = sync_document(service.documents(), DOCUMENT_ID, desired, cache)
+        print("sync sent {} edit request(s); reply = {}".format(num_requests, json.dumps(reply, indent=4)))
+        print('\n >>> PROGRAM ENDED.')
+        return
+
+    # find where to insert from the index of the document, downloaded again only if it has changed
+    _, doc_index = cache.get(service.documents(), DOCUMENT_ID)
+    anchor = doc_index.after(ANCHOR_HEADING)
+    print("insert at index {}".format(anchor))
+
+    # send the extra text and the formatting changes in one request
+    reply = service.documents().batchUpdate(documentId=DOCUMENT_ID, body=plan_edits(anchor)).execute()
     # show the reply message
-    print("The reply of the paragraph formatting operation is: {}".format(json.dumps(p_reply, indent=4)))
+    print("The reply of the document update operation is: {}".format(json.dumps(reply, indent=4)))
 
     print('\n >>> PROGRAM ENDED.')
 
@@ -0,0 +1,206 @@
+#
+# snapshot_store.py -- keep daily exports of a spreadsheet as deltas of changed rows, found by hashing each row
+#
+# @author Mark Sattolo <epistemik@gmail.com>
+# @version Python3.6
+# @created 2025-07-27
+# @updated 2025-08-06
+
+import gzip
+import hashlib
+import json
+import os
+import os.path as osp
+import threading
+
+MANIFEST_FILE = 'manifest.json'
+# hash of each row of a snapshot, so the next one is compared WITHOUT rebuilding it; found through the manifest
+INDEX_SUFFIX = '.index.json.gz'
+# write a full snapshot after this many deltas, so rebuilding a snapshot never replays more than this many files
+FULL_EVERY = 30
+
+
+def row_hash(values):
+    """Content hash of the values of a row."""
+    return hashlib.blake2b(json.dumps(values, separators=(',', ':')).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def row_key(sheet, row):
+    return sheet + '\t' + str(row)
+
+
+class SnapshotStore:
+    """
+    Snapshots of the rows of a spreadsheet in a directory:
+      - the first snapshot, and one in every FULL_EVERY, has all the rows
+      - every other snapshot has only the rows added, changed or removed since the previous one
+    A row is identified by its sheet and one-based row number.
+    """
+    def __init__(self, directory, full_every=FULL_EVERY):
+        self.directory = directory
+        self.full_every = full_every
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._load_json(MANIFEST_FILE, {'snapshots': []})
+        self._index = None
+
+    def _load_json(self, name, default):
+        path = osp.join(self.directory, name)
+        if not osp.exists(path):
+            return default
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rt') as jfp:
+            return json.load(jfp)
+
+    def _save_json(self, name, data):
+        # atomically: a crash during a save leaves the previous file
+        path = osp.join(self.directory, name)
+        tmp_path = path + '.tmp'
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(tmp_path, 'wt') as jfp:
+            json.dump(data, jfp, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def snapshot_ids(self):
+        return [snap['id'] for snap in self.manifest['snapshots']]
+
+    def index(self):
+        """Row key -> hash of the latest snapshot in the manifest."""
+        if self._index is None:
+            snaps = self.manifest['snapshots']
+            if not snaps:
+                self._index = {}
+            elif snaps[-1].get('index') and osp.exists(osp.join(self.directory, snaps[-1]['index'])):
+                self._index = self._load_json(snaps[-1]['index'], {})
+            else:
+                # e.g. a store from before the index of each snapshot was kept
+                self._index = {row_key(sheet, row): row_hash(values)
+                               for (sheet, row), values in self.rebuild(snaps[-1]['id']).items()}
+        return self._index
+
+    def begin(self, snapshot_id):
+        """
+        Start a new snapshot, e.g.
+            with store.begin(now) as snap:
+                snap.add_rows([(sheet, row, values), ...])
+        the snapshot is saved when the 'with' block ends without an exception.
+        """
+        if snapshot_id in self.snapshot_ids():
+            raise ValueError("Snapshot '{}' already exists!".format(snapshot_id))
+        return SnapshotWriter(self, snapshot_id)
+
+    def _commit(self, writer, index, stats):
+        # the manifest is the commit point: a crash before it is saved leaves files that no snapshot refers to
+        index_file = writer.snapshot_id + INDEX_SUFFIX
+        self._save_json(index_file, index)
+        snaps = self.manifest['snapshots']
+        previous = snaps[-1].get('index') if snaps else None
+        snaps.append(dict(stats, id=writer.snapshot_id, file=writer.file_name, full=writer.full, index=index_file))
+        self._save_json(MANIFEST_FILE, self.manifest)
+        self._index = index
+        # only the index of the latest snapshot is needed
+        if previous and osp.exists(osp.join(self.directory, previous)):
+            os.remove(osp.join(self.directory, previous))
+
+    def _read_file(self, file_name):
+        with gzip.open(osp.join(self.directory, file_name), 'rt') as sfp:
+            for line in sfp:
+                yield json.loads(line)
+
+    def rebuild(self, snapshot_id):
+        """
+        REBUILD a past snapshot: replay the changes from the last full snapshot before it
+        :return: dict of (sheet, row) -> values
+        """
+        snaps = self.manifest['snapshots']
+        ids = self.snapshot_ids()
+        if snapshot_id not in ids:
+            raise KeyError("No snapshot '{}'!".format(snapshot_id))
+        last = ids.index(snapshot_id)
+        first = max(i for i in range(last + 1) if snaps[i]['full'])
+        rows = {}
+        for snap in snaps[first:last + 1]:
+            for line in self._read_file(snap['file']):
+                key = (line['sheet'], line['row'])
+                if line['op'] == 'del':
+                    rows.pop(key, None)
+                else:
+                    rows[key] = line['values']
+        return rows
+
+    def diff(self, old_id, new_id):
+        """
+        COMPARE two snapshots
+        :return: dict with the sorted (sheet, row) keys of the rows 'added', 'changed' and 'removed' from old to new
+        """
+        old = self.rebuild(old_id)
+        new = self.rebuild(new_id)
+        return {'added': sorted(key for key in new if key not in old),
+                'changed': sorted(key for key in new if key in old and new[key] != old[key]),
+                'removed': sorted(key for key in old if key not in new)}
+# END class SnapshotStore
+
+
+class SnapshotWriter:
+    """Write ONE snapshot: rows can be added from several threads, in any order."""
+    def __init__(self, store, snapshot_id):
+        self.store = store
+        self.snapshot_id = snapshot_id
+        snaps = store.manifest['snapshots']
+        deltas = 0
+        for snap in reversed(snaps):
+            if snap['full']:
+                break
+            deltas += 1
+        self.full = not snaps or deltas + 1 >= store.full_every
+        self.file_name = snapshot_id + ('.full' if self.full else '.delta') + '.ndjson.gz'
+        self._previous = {} if self.full else store.index()
+        self._index = {}
+        self._stats = {'rows': 0, 'added': 0, 'changed': 0, 'removed': 0}
+        self._lock = threading.Lock()
+        self._tmp_path = osp.join(store.directory, self.file_name + '.tmp')
+        self._out = None
+
+    def __enter__(self):
+        self._out = gzip.open(self._tmp_path, 'wt')
+        return self
+
+    def add_rows(self, rows):
+        """
+        ADD rows of the snapshot; only new or changed rows are written to a delta
+        :param rows: (sheet, one-based row number, values) tuples
+        """
+        lines = []
+        with self._lock:
+            for sheet, row, values in rows:
+                key = row_key(sheet, row)
+                digest = row_hash(values)
+                self._index[key] = digest
+                self._stats['rows'] += 1
+                old = self._previous.get(key)
+                if old == digest:
+                    continue
+                self._stats['added' if old is None else 'changed'] += 1
+                lines.append({'op': 'set', 'sheet': sheet, 'row': row, 'values': values})
+            if lines:
+                self._out.write(''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines))
+
+    def __exit__(self, exc_type, *_):
+        try:
+            if exc_type is None:
+                # rows of the previous snapshot that are not in this one
+                for key in self._previous:
+                    if key not in self._index:
+                        sheet, _, row = key.rpartition('\t')
+                        self._out.write(json.dumps({'op': 'del', 'sheet': sheet, 'row': int(row)}) + '\n')
+                        self._stats['removed'] += 1
+            self._out.close()
+        except Exception:
+            os.remove(self._tmp_path)
+            raise
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return False
+        os.replace(self._tmp_path, osp.join(self.store.directory, self.file_name))
+        self.store._commit(self, self._index, self._stats)
+        return False
+# END class SnapshotWriter
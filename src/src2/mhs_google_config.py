@@ -26,6 +26,11 @@ DOCS_EPISTEMIK_RW_TOKEN = {
     'P4' : 'secrets/token.docs.epistemik.rw.pickle4'
 }
 
+# documents & Drive, e.g. to copy a template
+DOCS_DRIVE_EPISTEMIK_RW_TOKEN = {
+    'P4' : 'secrets/token.docs.drive.epistemik.rw.pickle4'
+}
+
 SHEETS_SAMPLE_RW_TOKEN_P2 = 'secrets/token.sheets.sample.rw.pickle2'
 
 SHEETS_EPISTEMIK_RW_TOKEN = {